@@ -8,6 +8,10 @@ import time
 import re
 from typing import List, Dict, Any
 
+import persistence_writer
+import record_store
+import snapshot_cache
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DADOSEND = os.path.join(BASE_DIR, "dadosend.json")
 ENCOMENDASEND = os.path.join(BASE_DIR, "encomendasend.json")
@@ -16,25 +20,31 @@ ANALISES = os.path.join(BASE_DIR, "analises.json")
 DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
 
 def atomic_save(path: str, obj: Any):
+    # coalescido pelo escritor em segundo plano quando ele está ativo (main); senão grava na hora
+    persistence_writer.submit(path, obj, _write_document)
+
+def _write_document(path: str, obj: Any):
+    if record_store.uses_repository(path):
+        record_store.save_document(path, obj)
+        return
     dirn = os.path.dirname(path) or "."
     os.makedirs(dirn, exist_ok=True)
     fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_", suffix=os.path.splitext(path)[1] or ".json")
     try:
         with os.fdopen(fd, "w", encoding="utf-8") as f:
             json.dump(obj, f, ensure_ascii=False, indent=2)
+            f.flush()
+            st = os.fstat(f.fileno())
         os.replace(tmp, path)
+        snapshot_cache.store(path, obj, st)
     finally:
         if os.path.exists(tmp):
             try: os.remove(tmp)
             except: pass
 
-def _read_json(path: str):
-    if not os.path.exists(path):
-        return None
-
+def _read_json_retry(path: str):
     # Em ambientes com múltiplas threads/processos, pode haver leitura no meio da escrita.
     # Fazemos retries curtos antes de concluir corrupção para evitar falso positivo.
-    last_raw = ""
     for attempt in range(5):
         try:
             with open(path, "r", encoding="utf-8") as f:
@@ -42,8 +52,7 @@ def _read_json(path: str):
             if not raw or not raw.strip():
                 return None
             return json.loads(raw)
-        except json.JSONDecodeError:
-            last_raw = raw if 'raw' in locals() else ""
+        except ValueError:
             if attempt < 4:
                 time.sleep(0.05)
                 continue
@@ -54,6 +63,15 @@ def _read_json(path: str):
             return None
     return None
 
+def _read_json(path: str):
+    try:
+        return record_store.load_document(path, fallback=_read_json_retry)
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"[analises] Erro ao ler {path}: {e}")
+        return None
+
 def _parse_datetime(s: str):
     if not s:
         return None
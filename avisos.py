@@ -9,11 +9,23 @@ import re
 import unicodedata
 from typing import Any, Dict, List, Optional
 
+import id_sequence
+import persistence_writer
+import record_store
+import snapshot_cache
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ANALISES = os.path.join(BASE_DIR, "analises.json")
 AVISOS = os.path.join(BASE_DIR, "avisos.json")
 
 def atomic_save(path: str, obj: Any):
+    # coalescido pelo escritor em segundo plano quando ele está ativo (main); senão grava na hora
+    persistence_writer.submit(path, obj, _write_document)
+
+def _write_document(path: str, obj: Any):
+    if record_store.uses_repository(path):
+        record_store.save_document(path, obj)
+        return
     dirn = os.path.dirname(path) or "."
     os.makedirs(dirn, exist_ok=True)
     fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_", suffix=os.path.splitext(path)[1] or ".json")
@@ -25,6 +37,7 @@ def atomic_save(path: str, obj: Any):
                 os.fsync(f.fileno())
             except Exception:
                 pass
+            st = os.fstat(f.fileno())
 
         last_err = None
         for _ in range(6):
@@ -37,6 +50,7 @@ def atomic_save(path: str, obj: Any):
                 time.sleep(0.05)
         if last_err:
             raise last_err
+        snapshot_cache.store(path, obj, st)
     finally:
         if os.path.exists(tmp):
             try:
@@ -44,16 +58,16 @@ def atomic_save(path: str, obj: Any):
             except Exception:
                 pass
 
+def _json_invalido(path: str):
+    print(f"[avisos] JSON inválido em {path}; usando fallback sem criar .corrupted")
+    return None
+
 def _read_json(path: str):
-    if not os.path.exists(path):
-        return None
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"[avisos] JSON inválido em {path}; usando fallback sem criar .corrupted")
+        return record_store.load_document(path, fallback=_json_invalido)
+    except FileNotFoundError:
         return None
-    except Exception as e:
+    except OSError as e:
         print(f"[avisos] Erro ao ler {path}: {e}")
         return None
 
@@ -98,20 +112,21 @@ def _compare_fields(a: dict, b: dict, keys: List[str]):
         out[k] = (va, vb, va == vb)
     return out
 
-def _next_aviso_id(existing_avisos: List[dict]) -> str:
-    if not existing_avisos:
-        return "AVISO-000001"
-    maxn = 0
-    for a in existing_avisos:
-        aid = a.get("id_aviso") or ""
-        m = re.match(r"AVISO-(\d+)", aid)
-        if m:
-            try:
-                v = int(m.group(1))
-                if v > maxn: maxn = v
-            except:
-                pass
-    return f"AVISO-{(maxn+1):06d}"
+def _reserve_aviso_ids(existing_avisos: List[dict], count: int, out_path: Optional[str] = None) -> List[str]:
+    """``count`` próximos AVISO-nnnnnn; com ``out_path`` reserva o bloco na sequência persistente (uma gravação)."""
+    if count <= 0:
+        return []
+    maior = id_sequence.max_prefixed_id((a.get("id_aviso") for a in existing_avisos or []), "AVISO-")
+    if out_path:
+        # piso = maior aviso já gravado: contador velho ou restaurado não reemite IDs
+        numeros = id_sequence.reserve(out_path, count, floor=maior)
+    else:
+        numeros = range(maior + 1, maior + count + 1)
+    return [f"AVISO-{n:06d}" for n in numeros]
+
+def _next_aviso_id(existing_avisos: List[dict], out_path: Optional[str] = None) -> str:
+    """Próximo AVISO-nnnnnn; com ``out_path`` usa a sequência persistente (O(1) por aviso)."""
+    return _reserve_aviso_ids(existing_avisos, 1, out_path)[0]
 
 def _registro_event_id(rec: Dict[str, Any]) -> Any:
     if not isinstance(rec, dict):
@@ -433,6 +448,8 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
     existing_list = avisos.get("registros", []) or []
 
     created = 0
+    novos: List[dict] = []
+    ultimo_ativo = None
 
     # avisos de encomendas múltiplas por BLOCO/APARTAMENTO (1 ou mais encomendas)
     current_encomenda_ids = set()
@@ -478,11 +495,10 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
             st = aviso.setdefault("status", {})
             st["ativo"] = True
             st["fechado_pelo_usuario"] = False
-            avisos["ultimo_aviso_ativo"] = aviso.get("id_aviso")
+            ultimo_ativo = aviso
         else:
-            id_aviso = _next_aviso_id(existing_list)
             aviso = {
-                "id_aviso": id_aviso,
+                "id_aviso": None,  # numerado no fim do build, num bloco só
                 "identidade": identidade,
                 "tipo": tipo,
                 "nivel": "warn",
@@ -513,7 +529,8 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
                 }
             }
             existing_list.append(aviso)
-            avisos["ultimo_aviso_ativo"] = id_aviso
+            novos.append(aviso)
+            ultimo_ativo = aviso
             created += 1
 
     _close_stale_encomenda_avisos(existing_list, current_encomenda_ids)
@@ -530,9 +547,8 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
                 ultimo_id = _registro_event_id(rec)
                 if _reactivate_existing_aviso(existing_list, identidade, ultimo_id, tipo):
                     continue
-                id_aviso = _next_aviso_id(existing_list)
                 aviso = {
-                    "id_aviso": id_aviso,
+                    "id_aviso": None,  # numerado no fim do build, num bloco só
                     "identidade": identidade,
                     "tipo": tipo,
                     "nivel": nivel,
@@ -559,7 +575,8 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
                     }
                 }
                 existing_list.append(aviso)
-                avisos["ultimo_aviso_ativo"] = id_aviso
+                novos.append(aviso)
+                ultimo_ativo = aviso
                 created += 1
         if len(regs) < 2:
             continue
@@ -608,9 +625,8 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
             if _reactivate_existing_aviso(existing_list, identidade, ultimo_id, tipo):
                 continue
 
-            id_aviso = _next_aviso_id(existing_list)
             aviso = {
-                "id_aviso": id_aviso,
+                "id_aviso": None,  # numerado no fim do build, num bloco só
                 "identidade": identidade,
                 "tipo": tipo,
                 "nivel": nivel,
@@ -640,9 +656,16 @@ def build_avisos(analises_path: str = ANALISES, out_path: str = AVISOS) -> Dict[
                 }
             }
             existing_list.append(aviso)
-            avisos["ultimo_aviso_ativo"] = id_aviso
+            novos.append(aviso)
+            ultimo_ativo = aviso
             created += 1
 
+    # uma reserva de IDs por build, em vez de uma gravação da sequência por aviso
+    for aviso, id_aviso in zip(novos, _reserve_aviso_ids(existing_list, len(novos), out_path)):
+        aviso["id_aviso"] = id_aviso
+    if ultimo_ativo is not None:
+        avisos["ultimo_aviso_ativo"] = ultimo_ativo.get("id_aviso")
+
     avisos["registros"] = existing_list
     # sempre gravar (mesmo vazio)
     try:
@@ -6,6 +6,7 @@ import hashlib
 import json
 import os
 import re
+import time
 import traceback
 import unicodedata
 from datetime import datetime
@@ -13,6 +14,8 @@ from difflib import SequenceMatcher
 from typing import Any
 
 import ia
+import llm_client
+import record_store
 
 SYSTEM_PROMPT = (
     "Você é um assistente útil e objetivo. "
@@ -81,6 +84,10 @@ STOPWORDS_PT = {
     "sobre",
 }
 
+# streaming: o texto parcial vai para a UI conforme chega (ACCESS_CHAT_STREAM=0 desliga)
+STREAM_ENABLED = os.getenv("ACCESS_CHAT_STREAM", "1").strip().lower() in ("1", "true", "yes", "on")
+CANCELED_NOTICE = "[RESPOSTA INTERROMPIDA PELO USUÁRIO]"
+
 _CONSOLIDATED_CACHE: dict[str, Any] = {"mtimes": None, "value": None}
 _LAST_CONTEXT_META: dict[str, Any] = {}
 
@@ -129,13 +136,13 @@ def _to_records(raw: Any) -> list:
     return []
 
 
-def _load_all_sources() -> dict:
+def _load_all_sources(include_archive: bool = False) -> dict:
     base_dir = os.path.dirname(os.path.abspath(__file__))
     sources = {}
     for filename in DB_FILES:
         path = os.path.join(base_dir, filename)
         try:
-            raw = ia.carregar(path).get("registros", [])
+            raw = ia.carregar(path, include_archive=include_archive).get("registros", [])
             sources[filename] = _to_records(raw)
         except Exception:
             sources[filename] = []
@@ -260,9 +267,11 @@ def _source_mtimes(base_dir: str) -> tuple:
     for filename in DB_FILES:
         path = os.path.join(base_dir, filename)
         try:
-            values.append((filename, os.path.getmtime(path)))
+            mtime = os.path.getmtime(path)
         except OSError:
-            values.append((filename, None))
+            mtime = None
+        # journal/SQLite recebem escritas sem tocar no mtime do JSON
+        values.append((filename, mtime, record_store.change_token(path)))
     return tuple(values)
 
 
@@ -275,9 +284,9 @@ def _save_consolidated_context(data: dict) -> None:
         print(f"[chat] aviso: falha ao salvar {CONSOLIDATED_FILE}: {exc}")
 
 
-def _get_cached_or_build_consolidated(full_sources: dict) -> dict:
+def _get_cached_or_build_consolidated(full_sources: dict, include_archive: bool = False) -> dict:
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    mtimes = _source_mtimes(base_dir)
+    mtimes = (_source_mtimes(base_dir), include_archive)
     if _CONSOLIDATED_CACHE.get("mtimes") == mtimes and isinstance(_CONSOLIDATED_CACHE.get("value"), dict):
         return _CONSOLIDATED_CACHE["value"]
 
@@ -455,10 +464,11 @@ def _build_query_context_with_fallback(user_query: str, full_sources: dict, forc
 
 
 def _load_db_sources(user_query: str) -> dict:
-    full_sources = _load_all_sources()
-    consolidated = _get_cached_or_build_consolidated(full_sources)
-
     force_audit = _is_full_audit_query(user_query) or _intent_score(user_query) >= 2.0
+    # histórico completo: inclui os meses arquivados (record_archive) só quando pedido
+    full_sources = _load_all_sources(include_archive=force_audit)
+    consolidated = _get_cached_or_build_consolidated(full_sources, include_archive=force_audit)
+
     query_context, mode = _build_query_context_with_fallback(user_query, full_sources, force_audit)
 
     return {
@@ -546,12 +556,52 @@ def deactivate_chat_mode() -> None:
     ia.set_chat_mode(False)
 
 
+def stream_enabled() -> bool:
+    return bool(STREAM_ENABLED) and ia.client is not None
+
+
+def _chunk_text(chunk: Any) -> str:
+    try:
+        content = chunk.choices[0].delta.content
+    except (AttributeError, IndexError, TypeError):
+        return ""
+    return content if isinstance(content, str) else ""
+
+
+def _consume_stream(stream: Any, on_delta, cancel_event) -> tuple[str, bool]:
+    """Lê o iterador do SDK repassando cada pedaço; para (e fecha a conexão) se cancelarem."""
+    parts: list[str] = []
+    canceled = False
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                canceled = True
+                break
+            piece = _chunk_text(chunk)
+            if piece:
+                parts.append(piece)
+                on_delta(piece)
+    finally:
+        close = getattr(stream, "close", None)
+        if canceled and callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+    return "".join(parts), canceled
+
+
 def respond_chat(
     user_query: str,
     *,
     model: str = "llama-3.3-70b-versatile",
     temperature: float = 0.2,
+    on_delta=None,
+    cancel_event=None,
 ) -> str:
+    """Responde a pergunta livre. Com ``on_delta`` (e streaming ligado) cada pedaço
+    do texto é entregue assim que chega; ``cancel_event.set()`` interrompe a
+    geração e devolve o que já veio seguido de ``CANCELED_NOTICE``."""
     if not user_query:
         return ""
 
@@ -560,6 +610,8 @@ def respond_chat(
 
     try:
         user_msg = _build_user_message(user_query)
+        stream = on_delta is not None and STREAM_ENABLED
+        started = time.monotonic()
         resposta = ia.client.chat.completions.create(
             model=model,
             messages=[
@@ -568,7 +620,24 @@ def respond_chat(
             ],
             temperature=temperature,
             max_tokens=800,
+            **({"stream": True} if stream else {}),
         )
+        if stream:
+            first: dict[str, float] = {}
+
+            def _delta(piece: str) -> None:
+                if "ttft_ms" not in first:
+                    first["ttft_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+                on_delta(piece)
+
+            content, canceled = _consume_stream(resposta, _delta, cancel_event)
+            meta = dict(_LAST_CONTEXT_META, stream=True, ttft_ms=first.get("ttft_ms"),
+                        total_ms=round((time.monotonic() - started) * 1000.0, 1))
+            if canceled:
+                _emit_telemetry("cancelado", meta)
+                return f"{content}\n\n{CANCELED_NOTICE}".strip()
+            _emit_telemetry("sucesso", meta)
+            return ia._apply_agent_prompt_template(content)
         content = (
             resposta.choices[0].message.content
             if hasattr(resposta, "choices") and resposta.choices
@@ -585,7 +654,12 @@ def respond_chat(
         traceback.print_exc()
         if "invalid_api_key" in err_msg or "401" in err_msg:
             ia._disable_client_due_to_auth()
-        if "413" in err_msg or "request too large" in err_msg or "tokens per minute" in err_msg:
+        if isinstance(e, llm_client.LLMRateLimitError) and "429" in err_msg:
+            return (
+                "A IA atingiu o limite de requisições por minuto da conta. "
+                "Aguarde alguns segundos e tente novamente."
+            )
+        if isinstance(e, llm_client.LLMRequestTooLargeError) or "413" in err_msg or "request too large" in err_msg or "tokens per minute" in err_msg:
             return (
                 "A pergunta não pôde ser processada porque o contexto enviado para a IA ficou grande demais "
                 "para o limite atual da conta/modelo. Tente uma pergunta mais específica ou reduza o volume "
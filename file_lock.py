@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Lock de arquivo entre threads e processos, com modos compartilhado/exclusivo.
+
+Substitui os lock files ``O_EXCL`` com ``sleep`` em loop de ``ia.acquire_lock``
+e ``interfaceone._acquire_db_lock``:
+
+- dentro do processo, as threads esperam numa ``threading.Condition`` (sem
+  polling) e vários leitores compartilham a mesma posse do arquivo;
+- entre processos usa ``fcntl.flock`` (LOCK_SH/LOCK_EX). A espera é bloqueante
+  no kernel; com timeout, a chamada bloqueante roda numa thread auxiliar e, se o
+  prazo vencer, quem conseguir o lock depois o devolve na hora. O kernel solta o
+  flock quando o processo morre, então não existe lock "velho";
+- sem ``fcntl`` (Windows) cai no comportamento anterior: ``O_EXCL`` com polling
+  e remoção do arquivo após ``stale_seconds``.
+
+Cada lock acumula métricas de espera (``metrics()``/``lock_metrics()``).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+FALLBACK_POLL_SECONDS = 0.05
+
+_LOCKS_GUARD = threading.Lock()
+_LOCKS: Dict[str, "FileLock"] = {}
+
+
+def flock_available() -> bool:
+    return fcntl is not None
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def _flock_with_timeout(path: str, shared: bool, timeout: Optional[float]) -> Optional[int]:
+    """Abre ``path`` e obtém o flock; devolve o fd (dono do lock) ou None no timeout."""
+    op = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, op | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        pass
+    except Exception:
+        os.close(fd)
+        raise
+    if timeout is None:
+        fcntl.flock(fd, op)
+        return fd
+    if timeout <= 0:
+        os.close(fd)
+        return None
+
+    done = threading.Event()
+    guard = threading.Lock()
+    state = {"got": False, "abandoned": False}
+
+    def _waiter():
+        try:
+            fcntl.flock(fd, op)
+            got = True
+        except OSError:
+            got = False
+        with guard:
+            if state["abandoned"]:
+                # quem pediu desistiu: devolve o lock e fecha o fd
+                try:
+                    if got:
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+            else:
+                state["got"] = got
+            done.set()
+
+    threading.Thread(target=_waiter, name="file-lock-wait", daemon=True).start()
+    done.wait(timeout)
+    with guard:
+        if done.is_set():
+            if state["got"]:
+                return fd
+            os.close(fd)
+            return None
+        state["abandoned"] = True
+        return None
+
+
+class FileLock:
+    def __init__(self, path: str, *, stale_seconds: float = 30.0):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._busy = False
+        self._fd: Optional[int] = None
+        self._stats = {
+            "aquisicoes": 0,
+            "contendidas": 0,
+            "timeouts": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+        }
+
+    # ---------- nível do SO ----------
+    def _os_acquire(self, shared: bool, deadline: Optional[float]) -> bool:
+        if fcntl is not None:
+            fd = _flock_with_timeout(self.path, shared, _remaining(deadline))
+            if fd is None:
+                return False
+            self._fd = fd
+            return True
+        return self._excl_acquire(deadline)
+
+    def _os_release(self) -> None:
+        if fcntl is not None:
+            fd, self._fd = self._fd, None
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+            return
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except Exception:
+            pass
+
+    def _excl_acquire(self, deadline: Optional[float]) -> bool:
+        # fallback sem flock: comportamento histórico (O_EXCL + polling + lock velho)
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                try:
+                    os.write(fd, f"{os.getpid()} {time.time()}".encode("utf-8"))
+                except Exception:
+                    pass
+                os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) >= self.stale_seconds:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                except Exception:
+                    pass
+                remaining = _remaining(deadline)
+                if remaining is not None and remaining <= 0:
+                    return False
+                time.sleep(FALLBACK_POLL_SECONDS if remaining is None else min(FALLBACK_POLL_SECONDS, remaining))
+            except Exception:
+                return False
+
+    # ---------- API ----------
+    def acquire(self, timeout: Optional[float] = None, shared: bool = False) -> bool:
+        """Obtém o lock (``shared`` = leitura). ``timeout=None`` espera indefinidamente."""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + max(0.0, float(timeout))
+        if shared and fcntl is None:
+            shared = False  # O_EXCL não tem modo compartilhado
+        with self._cond:
+            if shared:
+                ready = lambda: not self._writer and not self._busy
+            else:
+                ready = lambda: not self._writer and self._readers == 0 and not self._busy
+            contended = not ready()
+            if not self._cond.wait_for(ready, _remaining(deadline)):
+                self._record(start, contended=True, ok=False)
+                return False
+            if shared and self._readers > 0:
+                # o processo já tem o flock compartilhado: só conta mais um leitor
+                self._readers += 1
+                self._record(start, contended=contended, ok=True)
+                return True
+            self._busy = True
+        ok = False
+        try:
+            ok = self._os_acquire(shared, deadline)
+        finally:
+            with self._cond:
+                self._busy = False
+                if ok:
+                    if shared:
+                        self._readers += 1
+                    else:
+                        self._writer = True
+                self._cond.notify_all()
+        self._record(start, contended=contended or not ok, ok=ok)
+        return ok
+
+    def release(self) -> None:
+        with self._cond:
+            if self._writer:
+                self._writer = False
+                self._os_release()
+            elif self._readers > 0:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._os_release()
+            elif fcntl is None:
+                # compatível com o release histórico: remove o lock file mesmo sem posse
+                self._os_release()
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    # ---------- métricas ----------
+    def _record(self, start: float, *, contended: bool, ok: bool) -> None:
+        waited_ms = (time.monotonic() - start) * 1000.0
+        with self._cond:
+            st = self._stats
+            if ok:
+                st["aquisicoes"] += 1
+            else:
+                st["timeouts"] += 1
+            if contended:
+                st["contendidas"] += 1
+            st["espera_total_ms"] += waited_ms
+            st["espera_max_ms"] = max(st["espera_max_ms"], waited_ms)
+        if not ok:
+            report_status("file_lock", "WARNING", stage="lock_timeout", details={"path": self.path, "espera_ms": round(waited_ms, 1)})
+
+    def metrics(self) -> dict:
+        with self._cond:
+            st = dict(self._stats)
+        total = st["aquisicoes"] + st["timeouts"]
+        st["espera_media_ms"] = round(st["espera_total_ms"] / total, 3) if total else 0.0
+        st["backend"] = "flock" if fcntl is not None else "o_excl"
+        return st
+
+
+def lock_for(path: str, *, stale_seconds: Optional[float] = None) -> FileLock:
+    """Lock compartilhado por todo o processo para ``path`` (uma instância por arquivo)."""
+    key = os.path.abspath(path)
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = FileLock(path)
+            _LOCKS[key] = lock
+    if stale_seconds is not None:
+        lock.stale_seconds = stale_seconds
+    return lock
+
+
+def lock_metrics() -> Dict[str, dict]:
+    with _LOCKS_GUARD:
+        locks = list(_LOCKS.values())
+    return {lk.path: lk.metrics() for lk in locks}
@@ -3,13 +3,15 @@
 import json
 import re
 import os
+import queue
 import sys
-import tempfile
 import time
 import threading
 import traceback
 import unicodedata
-from typing import Optional, Tuple, Any, Dict, Iterable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Any, Dict, Iterable, List
 from datetime import datetime
 
 # fuzzy matching
@@ -26,11 +28,23 @@ except Exception:
 
 from preprocessor import (
     extrair_tudo_consumo,
+    ExtratorLote,
     VEICULOS_MAP,
     remover_status,
     corrigir_token_nome,
+    pontuar_confianca,
+    detectar_modelo_canonico,
+    modelos_da_variante,
+    MODELO_VARIANTES,
 )
 from logger import log_forense
+import file_lock
+import id_sequence
+import input_cursor
+import llm_cache
+import llm_client
+import record_index
+import record_store
 
 try:
     from runtime_status import report_status, report_log
@@ -96,7 +110,8 @@ if GROQ_API_KEY and not GROQ_API_KEY.startswith("gsk_"):
 client = None
 if GROQ_API_KEY and Groq is not None:
     try:
-        client = Groq(api_key=GROQ_API_KEY)
+        # orçamento RPM/TPM por modelo + backoff, compartilhado com o chat (usa ia.client)
+        client = llm_client.wrap(Groq(api_key=GROQ_API_KEY))
     except Exception as e:
         print(f"[ia.py] Erro ao criar cliente Groq: {e}")
         client = None
@@ -110,6 +125,35 @@ AGENT_PROMPT_PATH = os.path.join(BASE_DIR, "prompts", "prompt_agente.txt")
 LOCK_FILE = os.path.join(BASE_DIR, "process.lock")
 RETRY_DELAY_SECONDS = 1.0
 LOCK_STALE_SECONDS = 30.0
+# group commit do processar: grava saídas + flags "processado" a cada N registros ou T ms
+try:
+    COMMIT_BATCH_SIZE = max(1, int(os.getenv("ACCESS_IA_COMMIT_BATCH", "20")))
+except ValueError:
+    COMMIT_BATCH_SIZE = 20
+try:
+    COMMIT_INTERVAL_MS = max(0, int(os.getenv("ACCESS_IA_COMMIT_INTERVAL_MS", "500")))
+except ValueError:
+    COMMIT_INTERVAL_MS = 500
+IA_MODEL = "llama-3.1-8b-instant"
+# chamadas simultâneas ao LLM no processar (1 = serial, comportamento histórico)
+try:
+    LLM_MAX_IN_FLIGHT = max(1, int(os.getenv("ACCESS_IA_MAX_IN_FLIGHT", "1")))
+except ValueError:
+    LLM_MAX_IN_FLIGHT = 1
+# registros por prompt no processar (1 = um prompt por registro, comportamento histórico)
+try:
+    LLM_BATCH_SIZE = max(1, int(os.getenv("ACCESS_IA_LLM_BATCH", "1")))
+except ValueError:
+    LLM_BATCH_SIZE = 1
+# fast path: pula o LLM quando nome, veículo e unidade saem do pré-processamento
+# com confiança >= FAST_PATH_MIN_CONFIDENCE (o LLM seria sobrescrito por eles de qualquer forma)
+FAST_PATH_ENABLED = os.getenv("ACCESS_IA_FAST_PATH", "").strip().lower() in ("1", "true", "yes", "on")
+try:
+    FAST_PATH_MIN_CONFIDENCE = float(os.getenv("ACCESS_IA_FAST_PATH_MIN_CONFIDENCE", "0.8"))
+except ValueError:
+    FAST_PATH_MIN_CONFIDENCE = 0.8
+_FAST_PATH_LOCK = threading.Lock()
+_FAST_PATH_STATS = {"avaliados": 0, "bypass": 0}
 _RETRY_STATE_LOCK = threading.Lock()
 _RETRY_SCHEDULED = False
 
@@ -179,15 +223,14 @@ def _apply_agent_prompt_template(response_text: str) -> str:
 # =========================
 # Utilitários IO
 # =========================
-def carregar(path: str) -> Dict[str, Any]:
+def carregar(path: str, include_archive: bool = False) -> Dict[str, Any]:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return {"registros": data}
-            if isinstance(data, dict) and "registros" in data:
-                return data
-            return {"registros": []}
+        data = record_store.load_document(path, include_archive=include_archive)
+        if isinstance(data, list):
+            return {"registros": data}
+        if isinstance(data, dict) and "registros" in data:
+            return data
+        return {"registros": []}
     except FileNotFoundError:
         return {"registros": []}
     except json.JSONDecodeError:
@@ -198,26 +241,55 @@ def carregar(path: str) -> Dict[str, Any]:
         return {"registros": []}
 
 def salvar_atomico(path: str, dados):
-    os.makedirs(os.path.dirname(path) or BASE_DIR, exist_ok=True)
-    tmp = None
+    # snapshot completo: record_store também descarta o journal já incorporado
+    record_store.save_document(path, dados, indent=4, fsync=True)
+
+def _chave_registro_entrada(rec: Dict[str, Any]):
+    """Identidade do registro de entrada na releitura: id; sem id, (texto, data_hora)."""
+    rid = rec.get("id") if rec.get("id") is not None else rec.get("ID")
+    if rid is not None:
+        return ("id", str(rid))
+    texto = rec.get("texto") or rec.get("texto_original") or ""
+    return ("texto", texto, rec.get("data_hora") or rec.get("DATA_HORA") or "")
+
+def marcar_processados(path: str, regs: list) -> None:
+    """Marca ``processado`` em ``regs`` e grava o arquivo de entrada sem perder anexos.
+
+    O documento lido no início do ``processar`` fica velho enquanto a IA trabalha
+    (``save_text`` anexa registros, ``input_cursor.compactar`` arquiva o prefixo),
+    então a gravação sempre relê o arquivo sob o mesmo lock usado pelo
+    ``interfaceone`` e aplica as flags por id, ou por (texto, data_hora) nos
+    registros sem id. Quem não for achado na releitura fica sem flag.
+    """
+    faltando: Dict[Any, List[dict]] = {}
+    for r in regs:
+        faltando.setdefault(_chave_registro_entrada(r), []).append(r)
+    marcados = []
+    with file_lock.lock_for(path + ".lock"):
+        atual = carregar(path)
+        for rec in atual.get("registros") or []:
+            if not isinstance(rec, dict):
+                continue
+            fila = faltando.get(_chave_registro_entrada(rec))
+            if fila:
+                rec["processado"] = True
+                marcados.append(fila.pop(0))
+        if marcados:
+            salvar_atomico(path, atual)
+    # só marca em memória depois de gravado: o input_cursor trata quem ficou sem flag como lacuna
+    for r in marcados:
+        r["processado"] = True
+
+def _avancar_cursor(path: str, candidatos: list) -> None:
+    """Atualiza o cursor de ``path`` e compacta o prefixo processado; falha aqui não derruba a rodada."""
+    if not candidatos:
+        return
     try:
-        with tempfile.NamedTemporaryFile(
-            mode="w",
-            encoding="utf-8",
-            dir=os.path.dirname(path),
-            prefix=".tmp_",
-            suffix=".json",
-            delete=False,
-        ) as f:
-            tmp = f.name
-            json.dump(dados, f, ensure_ascii=False, indent=4)
-            f.flush()
-            os.fsync(f.fileno())
-        os.replace(tmp, path)
-    except Exception:
-        if tmp and os.path.exists(tmp):
-            os.remove(tmp)
-        raise
+        input_cursor.avancar(path, candidatos)
+        input_cursor.compactar(path)
+    except Exception as e:
+        report_status("ia_pipeline", "ERROR", stage="cursor_failed", details={"path": path, "error": str(e)})
+        _log_ia("ERROR", "cursor_failed", "Falha ao atualizar cursor de entrada", path=path, error=str(e))
 
 def carregar_prompt():
     try:
@@ -229,10 +301,29 @@ def carregar_prompt():
             '{ "NOME": "", "SOBRENOME": "", "MODELO": "", "COR": "" }'
         )
 
-def extrair_json_seguro(texto: str):
+def _extrair_lista_json(texto_limpo: str):
+    inicio = texto_limpo.find("[")
+    fim = texto_limpo.rfind("]")
+    if inicio < 0 or fim <= inicio:
+        return None
+    try:
+        dados = json.loads(texto_limpo[inicio:fim + 1])
+    except json.JSONDecodeError:
+        return None
+    return dados if isinstance(dados, list) else None
+
+def extrair_json_seguro(texto: str, aceitar_lista: bool = False):
+    """
+    Extrai o último objeto JSON válido da resposta do LLM. Com ``aceitar_lista``
+    tenta antes um array JSON (prompts em lote) e devolve a lista.
+    """
     if not texto:
         return None
     texto_limpo = re.sub(r"```(?:json)?", "", texto)
+    if aceitar_lista:
+        lista = _extrair_lista_json(texto_limpo)
+        if lista is not None:
+            return lista
     blocos = re.findall(r"\{[\s\S]*?\}", texto_limpo)
     if not blocos:
         return None
@@ -244,37 +335,15 @@ def extrair_json_seguro(texto: str):
     return None
 
 # =========================
-# Lock simples (arquivo)
+# Lock do pipeline (flock; O_EXCL como fallback)
 # =========================
 def acquire_lock(timeout: int = 10) -> bool:
-    start = time.time()
-    while True:
-        try:
-            fd = os.open(LOCK_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            try:
-                os.write(fd, str(os.getpid()).encode("utf-8"))
-            except Exception:
-                pass
-            os.close(fd)
-            return True
-        except FileExistsError:
-            try:
-                age = time.time() - os.path.getmtime(LOCK_FILE)
-                if age >= LOCK_STALE_SECONDS:
-                    os.remove(LOCK_FILE)
-                    continue
-            except FileNotFoundError:
-                continue
-            except Exception:
-                pass
-            if (time.time() - start) > timeout:
-                return False
-            time.sleep(0.1)
+    # espera bloqueante no kernel (sem polling); sem fcntl mantém O_EXCL + lock velho
+    return file_lock.lock_for(LOCK_FILE, stale_seconds=LOCK_STALE_SECONDS).acquire(timeout=timeout)
 
 def release_lock():
     try:
-        if os.path.exists(LOCK_FILE):
-            os.remove(LOCK_FILE)
+        file_lock.lock_for(LOCK_FILE).release()
     except Exception:
         pass
 
@@ -299,6 +368,111 @@ def _schedule_process_retry(reason: str = "lock_not_acquired") -> bool:
     report_status("ia_pipeline", "STARTED", stage="retry_scheduled", details={"reason": reason, "delay_s": RETRY_DELAY_SECONDS})
     return True
 
+class PipelineWorker:
+    """
+    Worker de longa duração que substitui a thread-por-gravação da interface.
+    As gravações só enfileiram o ID de entrada (O(1)); o worker drena a fila,
+    coalesce todos os gatilhos acumulados numa única execução do processar
+    (que já varre todos os pendentes) e, se outro processo estiver com o
+    process.lock, tenta de novo após RETRY_DELAY_SECONDS sem perder o gatilho.
+    """
+
+    _STOP = object()
+
+    def __init__(self, retry_delay: float = RETRY_DELAY_SECONDS):
+        self.retry_delay = retry_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._guard = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"enfileirados": 0, "execucoes": 0, "coalescidos": 0, "retries": 0}
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._guard:
+            if self.running():
+                return
+            self._thread = threading.Thread(target=self._loop, name="ia-pipeline-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        with self._guard:
+            t = self._thread
+        if t is None:
+            return
+        self._queue.put(self._STOP)
+        t.join(timeout)
+        with self._guard:
+            if self._thread is t and not t.is_alive():
+                self._thread = None
+
+    def enqueue(self, entrada_id=None, source: str = "") -> None:
+        self._queue.put((entrada_id, source))
+        with self._guard:
+            self.stats["enfileirados"] += 1
+        self.start()
+
+    def _drain(self, first):
+        lote = [first]
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return lote, False
+            if item is self._STOP:
+                return lote, True
+            lote.append(item)
+
+    def _loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            lote, parar = self._drain(item)
+            with self._guard:
+                self.stats["execucoes"] += 1
+                self.stats["coalescidos"] += len(lote) - 1
+            report_status(
+                "ia_pipeline",
+                "STARTED",
+                stage="worker_drain",
+                details={"gatilhos": len(lote), "entrada_ids": [eid for eid, _src in lote if eid is not None][:50]},
+            )
+            try:
+                executou = processar(agendar_retry=False)
+            except Exception as e:
+                executou = True
+                report_status("ia_pipeline", "ERROR", stage="worker_failed", details={"error": str(e)})
+                _log_ia("ERROR", "worker_failed", "Falha no worker do pipeline", error=str(e))
+                traceback.print_exc()
+            if executou is False and not is_chat_mode_active() and not parar:
+                # process.lock com outro processo: reenfileira um gatilho e espera
+                with self._guard:
+                    self.stats["retries"] += 1
+                time.sleep(self.retry_delay)
+                self._queue.put((None, "retry"))
+            if parar:
+                return
+
+    def metrics(self) -> dict:
+        with self._guard:
+            out = dict(self.stats)
+        out["fila"] = self._queue.qsize()
+        return out
+
+
+_PIPELINE_WORKER = PipelineWorker()
+
+
+def pipeline_worker() -> PipelineWorker:
+    return _PIPELINE_WORKER
+
+
+def enqueue_processing(entrada_id=None, source: str = "") -> None:
+    """Pede processamento ao worker do pipeline (não bloqueia)."""
+    _PIPELINE_WORKER.enqueue(entrada_id, source)
+
 # =========================
 # Helpers para SAIDA (dadosend.json)
 # =========================
@@ -329,23 +503,12 @@ def _find_by_entrada_id(regs, entrada_id):
     return None
 
 def _next_saida_id(regs):
-    maxid = 0
-    for r in regs:
-        try:
-            v = int(r.get("ID") or r.get("id") or 0)
-            if v > maxid: maxid = v
-        except:
-            pass
-    return maxid + 1
+    # sequência persistente; a varredura só semeia a coleção na primeira alocação
+    return id_sequence.allocate(SAIDA, seed=lambda: id_sequence.max_numeric_id(regs))
 
-def append_or_update_saida(dados: dict, entrada_id=None):
-    """
-    Busca por registro existente com _entrada_id == entrada_id.
-    - Se achar, faz merge (preenche campos faltantes) e não cria novo ID.
-    - Se não achar, cria novo registro com novo ID e opcionalmente grava _entrada_id.
-    """
-    regs = _load_saida()
-    found = _find_by_entrada_id(regs, entrada_id)
+def _merge_or_insert_saida(idx, dados: dict, entrada_id=None):
+    """Aplica ``dados`` ao índice (merge por _entrada_id ou registro novo); retorna (op, registro)."""
+    found = idx.find_by_entrada_id(entrada_id)
     if found:
         for k in ("MODELO","COR","PLACA","NOME","SOBRENOME","BLOCO","APARTAMENTO","STATUS"):
             incoming = dados.get(k)
@@ -354,20 +517,62 @@ def append_or_update_saida(dados: dict, entrada_id=None):
         if not found.get("DATA_HORA") and dados.get("DATA_HORA"):
             found["DATA_HORA"] = dados.get("DATA_HORA")
         if not found.get("ID"):
-            found["ID"] = _next_saida_id(regs)
-        _save_saida(regs)
-        return True
-    else:
-        rec = dict(dados)
-        rec.pop("texto", None); rec.pop("texto_original", None)
-        rec["_entrada_id"] = entrada_id
-        if not rec.get("ID"):
-            rec["ID"] = _next_saida_id(regs)
-        if not rec.get("DATA_HORA"):
-            rec["DATA_HORA"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-        regs.append(rec)
-        _save_saida(regs)
+            found["ID"] = id_sequence.allocate(SAIDA, floor=idx.max_id())
+        idx.touch(found)
+        return "upsert", found
+    rec = dict(dados)
+    rec.pop("texto", None); rec.pop("texto_original", None)
+    rec["_entrada_id"] = entrada_id
+    if not rec.get("ID"):
+        rec["ID"] = id_sequence.allocate(SAIDA, floor=idx.max_id())
+    if not rec.get("DATA_HORA"):
+        rec["DATA_HORA"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    idx.add(rec)
+    return "append", rec
+
+def append_or_update_saida_many(items) -> bool:
+    """
+    Versão em lote de append_or_update_saida: ``items`` é uma lista de (dados, entrada_id).
+    Todos os merges/inserts são aplicados ao índice e persistidos numa única escrita
+    (um snapshot no modo JSON, uma transação SQLite ou um fsync do journal).
+    Retorna se a gravação realmente aconteceu.
+    """
+    items = list(items or [])
+    if not items:
         return True
+    idx = record_index.index_for(SAIDA)
+    incremental = record_store.supports_incremental(SAIDA)
+    with idx.lock:
+        regs = idx.refresh()
+        ops = {}
+        for dados, entrada_id in items:
+            op, rec = _merge_or_insert_saida(idx, dados, entrada_id)
+            # o mesmo registro tocado duas vezes no lote vira uma operação só (estado final)
+            ops.setdefault(id(rec), (op, rec))
+        try:
+            if incremental:
+                ok = record_store.apply_batch(SAIDA, list(ops.values()))
+            else:
+                ok = _save_saida(regs)
+        except Exception:
+            idx.invalidate()
+            raise
+        if ok:
+            idx.mark_saved()
+        else:
+            idx.invalidate()
+    return bool(ok)
+
+def append_or_update_saida(dados: dict, entrada_id=None):
+    """
+    Busca por registro existente com _entrada_id == entrada_id.
+    - Se achar, faz merge (preenche campos faltantes) e não cria novo ID.
+    - Se não achar, cria novo registro com novo ID e opcionalmente grava _entrada_id.
+    A busca e o próximo ID vêm do índice em memória (record_index), sem varrer o histórico.
+    """
+    ok = append_or_update_saida_many([(dados, entrada_id)])
+    # no modo JSON o contrato histórico é sempre retornar True
+    return ok if record_store.supports_incremental(SAIDA) else True
 
 _ENCOMENDA_TIPO_MAP = {
     "ENCOMENDA": "ENCOMENDA",
@@ -715,15 +920,8 @@ def _save_encomendas_saida(regs):
             return False
 
 def _next_encomenda_id(regs):
-    maxid = 0
-    for r in regs:
-        try:
-            v = int(r.get("ID") or r.get("id") or 0)
-            if v > maxid:
-                maxid = v
-        except Exception:
-            pass
-    return maxid + 1
+    # piso = maior ID já gravado (sidecar/SQLite): contador velho ou restaurado não reemite IDs
+    return id_sequence.allocate(ENCOMENDAS_SAIDA, floor=record_store.max_record_id(ENCOMENDAS_SAIDA))
 
 def append_or_update_encomendas(dados: dict, entrada_id=None):
     regs = _load_encomendas_saida()
@@ -782,33 +980,24 @@ def validar_modelo_str(s: str) -> Optional[str]:
     s_original = str(s).strip()
     s_norm = re.sub(r"[^\w\d\s\-]", " ", s_original).upper()
 
-    # 1) mapeamento direto via VEICULOS_MAP (chaves e abreviações)
+    # 1) mapeamento direto via VEICULOS_MAP (chaves e abreviações, índice do preprocessor)
     try:
-        for modelo_key, abrevs in VEICULOS_MAP.items():
-            if re.search(rf"\b{re.escape(modelo_key.upper())}\b", s_norm):
-                return modelo_key
-            for ab in abrevs:
-                if re.search(rf"\b{re.escape(ab.upper())}\b", s_norm):
-                    return modelo_key
+        modelo_key = detectar_modelo_canonico(s_norm)
+        if modelo_key:
+            return modelo_key
     except Exception:
         pass
 
     # 2) fuzzy match usando rapidfuzz (se disponível)
     try:
-        if rf_process and VEICULOS_MAP:
-            candidates = []
-            for modelo_key, abrevs in VEICULOS_MAP.items():
-                candidates.append(modelo_key.upper())
-                for ab in abrevs:
-                    candidates.append(str(ab).upper())
-            candidates = list(dict.fromkeys(candidates))
-            best = rf_process.extractOne(s_original.upper(), candidates, scorer=rf_fuzz.WRatio)
+        if rf_process and MODELO_VARIANTES:
+            best = rf_process.extractOne(s_original.upper(), MODELO_VARIANTES, scorer=rf_fuzz.WRatio)
             if best and len(best) >= 2:
                 value, score, _ = best
                 if score >= 80:
-                    for modelo_key, abrevs in VEICULOS_MAP.items():
-                        if value.upper() == modelo_key.upper() or value.upper() in [a.upper() for a in abrevs]:
-                            return modelo_key
+                    chaves = modelos_da_variante(value)
+                    if chaves:
+                        return chaves[0]
     except Exception:
         pass
 
@@ -990,200 +1179,431 @@ def _fill_nome_from_raw(dados: dict, nome_raw: str) -> None:
 # =========================
 # PROCESSAMENTO PRINCIPAL
 # =========================
-def processar():
-    if is_chat_mode_active():
-        report_status("ia_pipeline", "SKIPPED", stage="chat_mode_active")
-        _log_ia("INFO", "chat_mode_active", "Modo chat ativo. Processamento IA suspenso.")
-        return
-    if not acquire_lock(timeout=5):
-        report_status("ia_pipeline", "SKIPPED", stage="lock_not_acquired")
-        _log_ia("WARNING", "lock_not_acquired", "Outro processo em execução. Abortando.")
-        _schedule_process_retry("lock_not_acquired")
-        return
+def _commit_saida_batch(pending) -> int:
+    """
+    Flush do group commit: grava as saídas do lote numa única escrita e só depois
+    marca os registros de ENTRADA como processados (um único salvar_atomico).
+    Se a saída falhar nenhum registro é marcado; numa queda entre as duas escritas o
+    reprocessamento faz merge por _entrada_id, sem duplicar. Retorna quantos foram marcados.
+    """
+    if not pending:
+        return 0
+    entrada_ids = [entrada_id for _r, _dados, entrada_id in pending]
+    try:
+        ok = append_or_update_saida_many([(dados, entrada_id) for _r, dados, entrada_id in pending])
+    except Exception as e:
+        report_status("ia_pipeline", "ERROR", stage="save_saida_exception", details={"entrada_ids": entrada_ids, "error": str(e)})
+        _log_ia("ERROR", "save_saida_exception", "Erro ao anexar/atualizar registros em SAIDA", entrada_ids=entrada_ids, error=str(e))
+        traceback.print_exc()
+        return 0
+
+    for _r, dados, entrada_id in pending:
+        if not ok:
+            report_status("ia_pipeline", "ERROR", stage="save_saida_failed", details={"entrada_id": entrada_id})
+            _log_ia("ERROR", "save_saida_failed", "Falha ao anexar/atualizar registro em SAIDA", entrada_id=entrada_id)
+        else:
+            report_status("ia_pipeline", "OK", stage="save_saida_ok", details={"entrada_id": entrada_id, "placa": dados.get("PLACA"), "modelo": dados.get("MODELO")})
+            _log_ia("OK", "save_saida_ok", "Registro processado", entrada_id=entrada_id, placa=dados.get("PLACA"), modelo=dados.get("MODELO"), cor=dados.get("COR"))
+    if not ok:
+        return 0
 
     try:
-        report_status("ia_pipeline", "STARTED", stage="load_inputs")
-        entrada = carregar(ENTRADA)
-        prompt_base = carregar_prompt()
+        marcar_processados(ENTRADA, [r for r, _dados, _entrada_id in pending])
+    except Exception as e:
+        # sem a flag o registro vira lacuna do cursor e é refeito na próxima rodada (upsert na saída)
+        report_status("ia_pipeline", "ERROR", stage="save_entrada_failed", details={"entrada_ids": entrada_ids, "error": str(e)})
+        _log_ia("ERROR", "save_entrada_failed", "Falha ao salvar ENTRADA", entrada_ids=entrada_ids, error=str(e))
+    report_status("ia_pipeline", "OK", stage="commit_batch", details={"registros": len(pending)})
+    return len(pending)
 
-        for r in entrada.get("registros", []):
-            if r.get("processado"):
-                continue
-            report_status("ia_pipeline", "STARTED", stage="process_registro", details={"entrada_id": r.get("id") or r.get("ID")})
+def _preprocess_registro(r: dict, prompt_base: str, extrator=None) -> dict:
+    """Etapa 1 (ordenada): pré-processamento determinístico e montagem do prompt.
 
-            texto_original = r.get("texto", "") or r.get("texto_original", "") or ""
-            try:
-                pre = extrair_tudo_consumo(texto_original)
-            except Exception as e:
-                report_status("ia_pipeline", "ERROR", stage="preprocess_failed", details={"entrada_id": r.get("id") or r.get("ID"), "error": str(e)})
-                _log_ia("ERROR", "preprocess_failed", "Erro ao extrair dados", entrada_id=r.get("id"), error=str(e))
-                traceback.print_exc()
-                pre = {
-                    "TEXTO_LIMPO": texto_original or "",
-                    "COR": "",
-                    "PLACA": "",
-                    "BLOCO": "",
-                    "APARTAMENTO": "",
-                    "MODELOS": [],
-                    "NOME_RAW": "",
-                }
-
-            status = pre.get("STATUS", "DESCONHECIDO")
-            modelos_pre = pre.get("MODELOS", []) or []
-            endereco = {
-                "BLOCO": pre.get("BLOCO", ""),
-                "APARTAMENTO": pre.get("APARTAMENTO", ""),
-                "PLACA": pre.get("PLACA", ""),
-            }
-            cor_pre = pre.get("COR", "") or ""
-            if isinstance(cor_pre, list):
-                cor_pre = next((c for c in cor_pre if isinstance(c, str) and c.strip()), " ".join(map(str, cor_pre)))
-            cor_pre = str(cor_pre).strip()
-
-            texto_limpo = pre.get("TEXTO_LIMPO") or pre.get("NOME_RAW") or remover_status(texto_original)
-
-            prompt = (
-                prompt_base
-                + "\n\nTexto:\n"
-                + texto_limpo
-                + "\n\nResponda SOMENTE com JSON válido seguindo o schema:\n"
-                '{ "NOME": "", "SOBRENOME": "", "MODELO": "", "COR": "" }'
-            )
+    ``extrator`` (preprocessor.ExtratorLote) reaproveita etiquetas/modelos entre os
+    registros da mesma rodada; sem ele cada texto é extraído do zero.
+    """
+    report_status("ia_pipeline", "STARTED", stage="process_registro", details={"entrada_id": r.get("id") or r.get("ID")})
 
-            dados_ia = None
-            conteudo = ""
-
-            if client:
-                try:
-                    resposta = client.chat.completions.create(
-                        model="llama-3.1-8b-instant",
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=0,
-                    )
-                    conteudo = (
-                        resposta.choices[0].message.content
-                        if hasattr(resposta, "choices") and resposta.choices
-                        else str(resposta)
-                    )
-                    dados_ia = extrair_json_seguro(conteudo)
-                    if isinstance(dados_ia, dict):
-                        dados_ia = uppercase_dict_values(dados_ia)
-                except Exception as e:
-                    err_msg = str(e).lower()
-                    report_status("ia_pipeline", "ERROR", stage="llm_call_failed", details={"entrada_id": r.get("id") or r.get("ID"), "error": str(e)})
-                    _log_ia("ERROR", "llm_call_failed", "Falha IA (fallback ativo)", entrada_id=r.get("id") or r.get("ID"), error=str(e))
-                    traceback.print_exc()
-                    if "invalid_api_key" in err_msg or "401" in err_msg:
-                        _disable_client_due_to_auth()
-
-            dados = {
-                "NOME": "-",
-                "SOBRENOME": "-",
-                "MODELO": "-",
-                "COR": "-",
-            }
-            if dados_ia:
-                if isinstance(dados_ia.get("NOME"), str) and dados_ia.get("NOME").strip():
-                    dados["NOME"] = dados_ia.get("NOME").upper()
-                if isinstance(dados_ia.get("SOBRENOME"), str) and dados_ia.get("SOBRENOME").strip():
-                    dados["SOBRENOME"] = dados_ia.get("SOBRENOME").upper()
-                ia_modelo = dados_ia.get("MODELO") if isinstance(dados_ia.get("MODELO"), str) else ""
-                modelo_validado = validar_modelo_str(ia_modelo) if ia_modelo else None
-                if modelo_validado:
-                    dados["MODELO"] = modelo_validado.upper()
-                cor_ia = dados_ia.get("COR") if isinstance(dados_ia.get("COR"), str) else ""
-                if cor_ia:
-                    dados["COR"] = cor_ia.upper()
-
-            # fallback: se IA não deu modelo, usar parser preprocessor
-            if modelos_pre:
-                candidato = modelos_pre[0]
-                if candidato:
-                    candidato_val = validar_modelo_str(candidato)
-                    if candidato_val:
-                        dados["MODELO"] = candidato_val.upper()
-                    else:
-                        dados["MODELO"] = str(candidato).upper()
-            else:
-                mpre = pre.get("MODELO") or ""
-                if mpre:
-                    mv = validar_modelo_str(mpre) or mpre
-                    dados["MODELO"] = str(mv).upper()
+    texto_original = r.get("texto", "") or r.get("texto_original", "") or ""
+    try:
+        pre = extrator(texto_original) if extrator is not None else extrair_tudo_consumo(texto_original)
+    except Exception as e:
+        report_status("ia_pipeline", "ERROR", stage="preprocess_failed", details={"entrada_id": r.get("id") or r.get("ID"), "error": str(e)})
+        _log_ia("ERROR", "preprocess_failed", "Erro ao extrair dados", entrada_id=r.get("id"), error=str(e))
+        traceback.print_exc()
+        pre = {
+            "TEXTO_LIMPO": texto_original or "",
+            "COR": "",
+            "PLACA": "",
+            "BLOCO": "",
+            "APARTAMENTO": "",
+            "MODELOS": [],
+            "NOME_RAW": "",
+        }
 
-            if cor_pre:
-                dados["COR"] = cor_pre.upper()
+    texto_limpo = pre.get("TEXTO_LIMPO") or pre.get("NOME_RAW") or remover_status(texto_original)
 
-            nome_raw = pre.get("NOME_RAW", "") or ""
-            if nome_raw:
-                _fill_nome_from_raw(dados, nome_raw)
+    prompt = (
+        prompt_base
+        + "\n\nTexto:\n"
+        + texto_limpo
+        + "\n\nResponda SOMENTE com JSON válido seguindo o schema:\n"
+        '{ "NOME": "", "SOBRENOME": "", "MODELO": "", "COR": "" }'
+    )
+    confianca = pontuar_confianca(pre)
+    bypass = FAST_PATH_ENABLED and confianca["GERAL"] >= FAST_PATH_MIN_CONFIDENCE
+    if FAST_PATH_ENABLED:
+        with _FAST_PATH_LOCK:
+            _FAST_PATH_STATS["avaliados"] += 1
+            if bypass:
+                _FAST_PATH_STATS["bypass"] += 1
+    return {
+        "registro": r,
+        "entrada_id": r.get("id") or r.get("ID"),
+        "confianca": confianca,
+        "bypass_llm": bypass,
+        "texto_original": texto_original,
+        "texto_limpo": texto_limpo,
+        "pre": pre,
+        "prompt": prompt,
+        "prompt_base": prompt_base,
+        "prompt_versao": llm_cache.prompt_version(prompt_base),
+    }
 
-            dados["PLACA"] = (endereco.get("PLACA", "") or "-").upper()
-            dados["BLOCO"] = (endereco.get("BLOCO", "") or "-").upper()
-            dados["APARTAMENTO"] = (endereco.get("APARTAMENTO", "") or "-").upper()
-            dados["STATUS"] = (status or "DESCONHECIDO").upper()
+def _llm_atalho(ctx: dict) -> Tuple[bool, Optional[dict], Optional[str]]:
+    """(resolvido, dados_ia, chave_cache): fast path e acerto no llm_cache não vão à rede."""
+    if ctx.get("bypass_llm"):
+        report_status("ia_pipeline", "OK", stage="llm_bypass", details={"entrada_id": ctx["entrada_id"], "confianca": ctx["confianca"]})
+        return True, None, None
+    cache_key = None
+    if llm_cache.cache_enabled():
+        cache_key = llm_cache.make_key(ctx["prompt_versao"], ctx["texto_limpo"], IA_MODEL)
+        hit = llm_cache.cache().get(cache_key)
+        if hit is not None:
+            report_status("ia_pipeline", "OK", stage="llm_cache_hit", details={"entrada_id": ctx["entrada_id"]})
+            return True, hit, cache_key
+    return False, None, cache_key
+
+def _llm_request(cli, prompt: str) -> str:
+    resposta = cli.chat.completions.create(
+        model=IA_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+    )
+    return (
+        resposta.choices[0].message.content
+        if hasattr(resposta, "choices") and resposta.choices
+        else str(resposta)
+    )
 
-            for k in ["NOME","SOBRENOME","BLOCO","APARTAMENTO","PLACA","MODELO","COR","STATUS"]:
-                v = dados.get(k)
-                if v is None or (isinstance(v, str) and v.strip() == ""):
-                    dados[k] = "-"
-                elif isinstance(v, str):
-                    dados[k] = v.upper()
+def _llm_failed(stage: str, entrada_ids, e: Exception) -> None:
+    err_msg = str(e).lower()
+    report_status("ia_pipeline", "ERROR", stage=stage, details={"entrada_id": entrada_ids, "error": str(e)})
+    _log_ia("ERROR", stage, "Falha IA (fallback ativo)", entrada_id=entrada_ids, error=str(e))
+    traceback.print_exc()
+    if "invalid_api_key" in err_msg or "401" in err_msg:
+        _disable_client_due_to_auth()
+
+def _call_llm(ctx: dict, consultar_cache: bool = True) -> Optional[dict]:
+    """Etapa 2: chamada ao LLM (ou acerto no llm_cache). Pode rodar em paralelo."""
+    cache_key = None
+    if consultar_cache:
+        resolvido, dados_ia, cache_key = _llm_atalho(ctx)
+        if resolvido:
+            return dados_ia
+    elif llm_cache.cache_enabled():
+        cache_key = llm_cache.make_key(ctx["prompt_versao"], ctx["texto_limpo"], IA_MODEL)
+    cli = client
+    if not cli:
+        return None
+    try:
+        dados_ia = extrair_json_seguro(_llm_request(cli, ctx["prompt"]))
+        if isinstance(dados_ia, dict):
+            dados_ia = uppercase_dict_values(dados_ia)
+            if cache_key:
+                llm_cache.cache().put(cache_key, dados_ia)
+        return dados_ia
+    except Exception as e:
+        _llm_failed("llm_call_failed", ctx["entrada_id"], e)
+        return None
 
-            # keep entrada id for matching
-            entrada_id = r.get("id") or r.get("ID")
-            if entrada_id is not None:
-                try:
-                    dados["_entrada_id"] = entrada_id
-                except:
-                    pass
+def _refs_lote(ctxs) -> list:
+    """Rótulo de cada registro no prompt em lote: o ID de entrada, ou a posição se faltar/repetir."""
+    refs = [str(ctx["entrada_id"]) if ctx.get("entrada_id") is not None else "" for ctx in ctxs]
+    if "" in refs or len(set(refs)) != len(refs):
+        refs = [f"R{i}" for i in range(len(ctxs))]
+    return refs
+
+def _build_batch_prompt(ctxs, refs) -> str:
+    linhas = [f"[{ref}] {ctx['texto_limpo']}" for ref, ctx in zip(refs, ctxs)]
+    return (
+        ctxs[0]["prompt_base"]
+        + "\n\nTextos (um por linha, cada um precedido do seu ENTRADA_ID entre colchetes):\n"
+        + "\n".join(linhas)
+        + "\n\nResponda SOMENTE com um array JSON válido, um objeto por texto, seguindo o schema:\n"
+        '[{ "ENTRADA_ID": "", "NOME": "", "SOBRENOME": "", "MODELO": "", "COR": "" }]'
+    )
 
-            dh = r.get("DATA_HORA") or r.get("data_hora")
-            if isinstance(dh, str) and dh.strip():
-                dados["DATA_HORA"] = dh.strip()
+def _call_llm_many(ctxs) -> list:
+    """
+    Etapa 2 em lote: um único prompt para vários registros, resposta em array JSON
+    indexada por ENTRADA_ID. Registros ausentes ou malformados na resposta (ou o
+    lote inteiro, se a chamada falhar) são refeitos um a um com ``_call_llm``.
+    """
+    if len(ctxs) == 1:
+        return [_call_llm(ctxs[0])]
+    resultados: list = [None] * len(ctxs)
+    chaves: Dict[int, Optional[str]] = {}
+    pendentes = []
+    for i, ctx in enumerate(ctxs):
+        resolvido, dados_ia, cache_key = _llm_atalho(ctx)
+        if resolvido:
+            resultados[i] = dados_ia
+        else:
+            chaves[i] = cache_key
+            pendentes.append(i)
+    cli = client
+    if not cli or not pendentes:
+        return resultados
+    if len(pendentes) == 1:
+        resultados[pendentes[0]] = _call_llm(ctxs[pendentes[0]], consultar_cache=False)
+        return resultados
+
+    lote = [ctxs[i] for i in pendentes]
+    refs = _refs_lote(lote)
+    itens = None
+    try:
+        itens = extrair_json_seguro(_llm_request(cli, _build_batch_prompt(lote, refs)), aceitar_lista=True)
+    except Exception as e:
+        _llm_failed("llm_batch_failed", [ctx["entrada_id"] for ctx in lote], e)
+    por_ref = {}
+    if isinstance(itens, list):
+        for item in itens:
+            if isinstance(item, dict) and item.get("ENTRADA_ID") is not None:
+                por_ref[str(item.get("ENTRADA_ID")).strip().strip("[]")] = item
+
+    refazer = []
+    for ref, i in zip(refs, pendentes):
+        item = por_ref.get(ref)
+        if not isinstance(item, dict):
+            refazer.append(i)
+            continue
+        dados_ia = uppercase_dict_values({k: v for k, v in item.items() if k != "ENTRADA_ID"})
+        resultados[i] = dados_ia
+        if chaves.get(i):
+            llm_cache.cache().put(chaves[i], dados_ia)
+    report_status(
+        "ia_pipeline",
+        "OK" if not refazer else "WARNING",
+        stage="llm_batch",
+        details={"registros": len(lote), "respondidos": len(lote) - len(refazer), "refeitos": len(refazer)},
+    )
+    for i in refazer:
+        resultados[i] = _call_llm(ctxs[i], consultar_cache=False)
+    return resultados
+
+def _finalize_registro(ctx: dict, dados_ia: Optional[dict]) -> dict:
+    """Etapa 3 (ordenada): combina LLM + pré-processamento e valida o registro de saída."""
+    r = ctx["registro"]
+    pre = ctx["pre"]
+    texto_original = ctx["texto_original"]
+
+    status = pre.get("STATUS", "DESCONHECIDO")
+    modelos_pre = pre.get("MODELOS", []) or []
+    endereco = {
+        "BLOCO": pre.get("BLOCO", ""),
+        "APARTAMENTO": pre.get("APARTAMENTO", ""),
+        "PLACA": pre.get("PLACA", ""),
+    }
+    cor_pre = pre.get("COR", "") or ""
+    if isinstance(cor_pre, list):
+        cor_pre = next((c for c in cor_pre if isinstance(c, str) and c.strip()), " ".join(map(str, cor_pre)))
+    cor_pre = str(cor_pre).strip()
+
+    dados = {
+        "NOME": "-",
+        "SOBRENOME": "-",
+        "MODELO": "-",
+        "COR": "-",
+    }
+    if dados_ia:
+        if isinstance(dados_ia.get("NOME"), str) and dados_ia.get("NOME").strip():
+            dados["NOME"] = dados_ia.get("NOME").upper()
+        if isinstance(dados_ia.get("SOBRENOME"), str) and dados_ia.get("SOBRENOME").strip():
+            dados["SOBRENOME"] = dados_ia.get("SOBRENOME").upper()
+        ia_modelo = dados_ia.get("MODELO") if isinstance(dados_ia.get("MODELO"), str) else ""
+        modelo_validado = validar_modelo_str(ia_modelo) if ia_modelo else None
+        if modelo_validado:
+            dados["MODELO"] = modelo_validado.upper()
+        cor_ia = dados_ia.get("COR") if isinstance(dados_ia.get("COR"), str) else ""
+        if cor_ia:
+            dados["COR"] = cor_ia.upper()
+
+    # fallback: se IA não deu modelo, usar parser preprocessor
+    if modelos_pre:
+        candidato = modelos_pre[0]
+        if candidato:
+            candidato_val = validar_modelo_str(candidato)
+            if candidato_val:
+                dados["MODELO"] = candidato_val.upper()
             else:
-                dados["DATA_HORA"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+                dados["MODELO"] = str(candidato).upper()
+    else:
+        mpre = pre.get("MODELO") or ""
+        if mpre:
+            mv = validar_modelo_str(mpre) or mpre
+            dados["MODELO"] = str(mv).upper()
+
+    if cor_pre:
+        dados["COR"] = cor_pre.upper()
+
+    nome_raw = pre.get("NOME_RAW", "") or ""
+    if nome_raw:
+        _fill_nome_from_raw(dados, nome_raw)
+
+    dados["PLACA"] = (endereco.get("PLACA", "") or "-").upper()
+    dados["BLOCO"] = (endereco.get("BLOCO", "") or "-").upper()
+    dados["APARTAMENTO"] = (endereco.get("APARTAMENTO", "") or "-").upper()
+    dados["STATUS"] = (status or "DESCONHECIDO").upper()
+
+    for k in ["NOME","SOBRENOME","BLOCO","APARTAMENTO","PLACA","MODELO","COR","STATUS"]:
+        v = dados.get(k)
+        if v is None or (isinstance(v, str) and v.strip() == ""):
+            dados[k] = "-"
+        elif isinstance(v, str):
+            dados[k] = v.upper()
 
-            # mark entrada as processed
-            r["processado"] = True
-            try:
-                salvar_atomico(ENTRADA, entrada)
-            except Exception as e:
-                report_status("ia_pipeline", "ERROR", stage="save_entrada_failed", details={"entrada_id": entrada_id, "error": str(e)})
-                _log_ia("ERROR", "save_entrada_failed", "Falha ao salvar ENTRADA", entrada_id=entrada_id, error=str(e))
+    # keep entrada id for matching
+    entrada_id = ctx["entrada_id"]
+    if entrada_id is not None:
+        try:
+            dados["_entrada_id"] = entrada_id
+        except:
+            pass
 
-            # última validação: limpa NOME/SOBRENOME de tokens de MODELO/COR/PLACA
-            try:
-                post_validate_and_clean_record(
-                    dados,
-                    modelos_hint=[dados.get("MODELO")] if dados.get("MODELO") and dados.get("MODELO") != "-" else [],
-                    cores_hint=[dados.get("COR")] if dados.get("COR") and dados.get("COR") != "-" else []
-                )
-            except Exception as e:
-                _log_ia("WARNING", "validation_failed", "Falha na validação final (não bloqueante)", entrada_id=entrada_id, error=str(e))
+    dh = r.get("DATA_HORA") or r.get("data_hora")
+    if isinstance(dh, str) and dh.strip():
+        dados["DATA_HORA"] = dh.strip()
+    else:
+        dados["DATA_HORA"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
 
-            if nome_raw:
-                _fill_nome_from_raw(dados, nome_raw)
+    # última validação: limpa NOME/SOBRENOME de tokens de MODELO/COR/PLACA
+    try:
+        post_validate_and_clean_record(
+            dados,
+            modelos_hint=[dados.get("MODELO")] if dados.get("MODELO") and dados.get("MODELO") != "-" else [],
+            cores_hint=[dados.get("COR")] if dados.get("COR") and dados.get("COR") != "-" else []
+        )
+    except Exception as e:
+        _log_ia("WARNING", "validation_failed", "Falha na validação final (não bloqueante)", entrada_id=entrada_id, error=str(e))
 
-            # Append or update SAIDA (merge por _entrada_id)
-            try:
-                ok = append_or_update_saida(dados, entrada_id=entrada_id)
-                if not ok:
-                    report_status("ia_pipeline", "ERROR", stage="save_saida_failed", details={"entrada_id": entrada_id})
-                    _log_ia("ERROR", "save_saida_failed", "Falha ao anexar/atualizar registro em SAIDA", entrada_id=entrada_id)
-                else:
-                    report_status("ia_pipeline", "OK", stage="save_saida_ok", details={"entrada_id": entrada_id, "placa": dados.get("PLACA"), "modelo": dados.get("MODELO")})
-                    _log_ia("OK", "save_saida_ok", "Registro processado", entrada_id=entrada_id, placa=dados.get("PLACA"), modelo=dados.get("MODELO"), cor=dados.get("COR"))
-            except Exception as e:
-                report_status("ia_pipeline", "ERROR", stage="save_saida_exception", details={"entrada_id": entrada_id, "error": str(e)})
-                _log_ia("ERROR", "save_saida_exception", "Erro ao anexar/atualizar registro em SAIDA", entrada_id=entrada_id, error=str(e))
-                traceback.print_exc()
+    if nome_raw:
+        _fill_nome_from_raw(dados, nome_raw)
+
+    log_forense(r.get("id"), texto_original, dados.get("STATUS"), "ia.py")
+    return dados
+
+def fast_path_metrics() -> dict:
+    """Acumulado do processo: registros avaliados, quantos pularam o LLM e a taxa."""
+    with _FAST_PATH_LOCK:
+        out = dict(_FAST_PATH_STATS)
+    out["taxa_bypass"] = round(out["bypass"] / out["avaliados"], 4) if out["avaliados"] else 0.0
+    return out
+
+def _iter_llm_results(registros, prompt_base: str):
+    """
+    Gera ``(ctx, dados_ia)`` na ordem dos registros. Os registros são agrupados em
+    lotes de LLM_BATCH_SIZE (um prompt por lote); com LLM_MAX_IN_FLIGHT > 1 os
+    lotes se sobrepõem num pool de threads, com no máximo N em voo. O
+    pré-processamento e a entrega (finalização + group commit) seguem em ordem.
+    """
+    max_in_flight = max(1, int(LLM_MAX_IN_FLIGHT or 1))
+    tamanho_lote = max(1, int(LLM_BATCH_SIZE or 1))
+
+    def _lotes():
+        extrator = ExtratorLote()
+        lote = []
+        for r in registros:
+            lote.append(_preprocess_registro(r, prompt_base, extrator))
+            if len(lote) >= tamanho_lote:
+                yield lote
+                lote = []
+        if lote:
+            yield lote
+
+    if max_in_flight <= 1 or not client or len(registros) <= tamanho_lote:
+        for lote in _lotes():
+            yield from zip(lote, _call_llm_many(lote))
+        return
 
-            log_forense(r.get("id"), texto_original, dados.get("STATUS"), "ia.py")
+    started = time.monotonic()
+    em_voo = deque()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="ia-llm") as pool:
+        for lote in _lotes():
+            em_voo.append((lote, pool.submit(_call_llm_many, lote)))
+            if len(em_voo) >= max_in_flight:
+                lote_pronto, fut = em_voo.popleft()
+                yield from zip(lote_pronto, fut.result())
+        while em_voo:
+            lote_pronto, fut = em_voo.popleft()
+            yield from zip(lote_pronto, fut.result())
+    report_status(
+        "ia_pipeline",
+        "OK",
+        stage="llm_pool_drained",
+        details={"registros": len(registros), "max_in_flight": max_in_flight, "lote": tamanho_lote, "duracao_ms": round((time.monotonic() - started) * 1000.0, 1)},
+    )
+
+def processar(agendar_retry: bool = True) -> bool:
+    """
+    Processa os pendentes de ENTRADA e ENCOMENDAS_ENTRADA. Retorna False se foi
+    pulado (modo chat ou process.lock ocupado). ``agendar_retry=False`` deixa a
+    nova tentativa por conta de quem chamou (PipelineWorker).
+    """
+    if is_chat_mode_active():
+        report_status("ia_pipeline", "SKIPPED", stage="chat_mode_active")
+        _log_ia("INFO", "chat_mode_active", "Modo chat ativo. Processamento IA suspenso.")
+        return False
+    if not acquire_lock(timeout=5):
+        report_status("ia_pipeline", "SKIPPED", stage="lock_not_acquired")
+        _log_ia("WARNING", "lock_not_acquired", "Outro processo em execução. Abortando.")
+        if agendar_retry:
+            _schedule_process_retry("lock_not_acquired")
+        return False
+
+    try:
+        report_status("ia_pipeline", "STARTED", stage="load_inputs")
+        entrada = carregar(ENTRADA)
+        prompt_base = carregar_prompt()
+        pending = []
+        batch_started = time.monotonic()
+
+        registros = input_cursor.pendentes(ENTRADA, entrada.get("registros", []))
+        for ctx, dados_ia in _iter_llm_results(registros, prompt_base):
+            dados = _finalize_registro(ctx, dados_ia)
+            r, entrada_id = ctx["registro"], ctx["entrada_id"]
+
+            # group commit: a saída e a flag "processado" só são gravadas no flush do lote
+            if not pending:
+                batch_started = time.monotonic()
+            pending.append((r, dados, entrada_id))
+            elapsed_ms = (time.monotonic() - batch_started) * 1000.0
+            if len(pending) >= COMMIT_BATCH_SIZE or elapsed_ms >= COMMIT_INTERVAL_MS:
+                _commit_saida_batch(pending)
+                pending = []
+
+        _commit_saida_batch(pending)
+        _avancar_cursor(ENTRADA, registros)
+        if registros and FAST_PATH_ENABLED:
+            report_status("ia_pipeline", "OK", stage="fast_path_stats", details=fast_path_metrics())
+        if registros and isinstance(client, llm_client.RateLimitedClient):
+            report_status("ia_pipeline", "OK", stage="llm_client_stats", details=llm_client.metrics(client))
+        if registros and llm_cache.cache_enabled():
+            report_status("ia_pipeline", "OK", stage="llm_cache_stats", details=llm_cache.cache().metrics())
 
         encomendas = carregar(ENCOMENDAS_ENTRADA)
-        for r in encomendas.get("registros", []):
-            if r.get("processado"):
-                continue
+        encomendas_pendentes = input_cursor.pendentes(ENCOMENDAS_ENTRADA, encomendas.get("registros", []))
+        for r in encomendas_pendentes:
             report_status("ia_pipeline", "STARTED", stage="process_encomenda", details={"entrada_id": r.get("id") or r.get("ID")})
 
             texto_original = r.get("texto", "") or r.get("texto_original", "") or ""
@@ -1212,9 +1632,8 @@ def processar():
                     _log_ia("ERROR", "save_encomendas_saida_failed", "Falha ao anexar/atualizar encomenda em ENCOMENDAS_SAIDA", entrada_id=entrada_id)
                 else:
                     report_status("ia_pipeline", "OK", stage="save_encomendas_saida_ok", details={"entrada_id": entrada_id, "bloco": dados.get("BLOCO"), "apartamento": dados.get("APARTAMENTO")})
-                    r["processado"] = True
                     try:
-                        salvar_atomico(ENCOMENDAS_ENTRADA, encomendas)
+                        marcar_processados(ENCOMENDAS_ENTRADA, [r])
                     except Exception as e:
                         report_status("ia_pipeline", "ERROR", stage="save_encomendas_entrada_failed", details={"entrada_id": entrada_id, "error": str(e)})
                         _log_ia("ERROR", "save_encomendas_entrada_failed", "Falha ao salvar ENCOMENDAS_ENTRADA", entrada_id=entrada_id, error=str(e))
@@ -1222,29 +1641,71 @@ def processar():
                 report_status("ia_pipeline", "ERROR", stage="save_encomendas_saida_exception", details={"entrada_id": entrada_id, "error": str(e)})
                 _log_ia("ERROR", "save_encomendas_saida_exception", "Erro ao anexar/atualizar encomenda", entrada_id=entrada_id, error=str(e))
                 traceback.print_exc()
+        _avancar_cursor(ENCOMENDAS_ENTRADA, encomendas_pendentes)
 
     finally:
+        if llm_cache.cache_enabled():
+            llm_cache.flush()
         report_status("ia_pipeline", "FINISHED", stage="release_lock")
         release_lock()
+    return True
 
 # =========================
 # respond_query and IA utilities (mantidos)
 # =========================
+def _fit_query_context(db_sources: Dict[str, list], max_chars: int) -> Tuple[str, int]:
+    """Serializa ``db_sources`` em até ``max_chars``, guardando os registros mais recentes.
+
+    Cada fonte fica com uma fatia do orçamento (as menores primeiro, e a sobra
+    passa para as seguintes); dentro da fonte corta do início da lista, que é
+    onde estão os registros mais antigos. Devolve o JSON e quantos registros
+    ficaram de fora.
+    """
+    db_json = json.dumps(db_sources, ensure_ascii=False)
+    if len(db_json) <= max_chars:
+        return db_json, 0
+    fontes = sorted(db_sources.items(), key=lambda kv: len(json.dumps(kv[1], ensure_ascii=False)))
+    restante = max(0, max_chars - len(json.dumps({k: [] for k in db_sources}, ensure_ascii=False)))
+    cortado: Dict[str, list] = {}
+    omitidos = 0
+    for i, (nome, regs) in enumerate(fontes):
+        regs = regs if isinstance(regs, list) else []
+        fatia = restante // (len(fontes) - i)
+        mantidos: List[Any] = []
+        usado = 0
+        for reg in reversed(regs):
+            tam = len(json.dumps(reg, ensure_ascii=False)) + 2
+            if usado + tam > fatia:
+                break
+            mantidos.append(reg)
+            usado += tam
+        mantidos.reverse()
+        omitidos += len(regs) - len(mantidos)
+        restante -= usado
+        cortado[nome] = mantidos
+    return json.dumps({k: cortado[k] for k in db_sources}, ensure_ascii=False), omitidos
+
+
 def respond_query(user_query: str, db_path: str = SAIDA, model: str = "llama-3.1-8b-instant", temperature: float = 0.0, timeout: int = 15) -> str:
     if db_path and db_path != SAIDA:
         db_sources = {os.path.basename(db_path): carregar(db_path).get("registros", [])}
     else:
         db_sources = {
-            "dadosinit.json": carregar(ENTRADA).get("registros", []),
+            "dadosinit.json": carregar(ENTRADA, include_archive=True).get("registros", []),
             "dadosend.json": carregar(SAIDA).get("registros", []),
             "analises.json": carregar(os.path.join(BASE_DIR, "analises.json")).get("registros", []),
             "avisos.json": carregar(os.path.join(BASE_DIR, "avisos.json")).get("registros", []),
         }
 
+    # a base inteira não cabe no TPM do modelo: sem o corte o llm_client
+    # recusaria o pedido com 413 local em qualquer base de tamanho real
+    max_chars = llm_client.max_prompt_chars(model) - len(user_query or "") - 200
     try:
-        db_json = json.dumps(db_sources, ensure_ascii=False)
+        db_json, omitidos = _fit_query_context(db_sources, max_chars)
     except Exception:
-        db_json = str(db_sources)[:20000]
+        db_json, omitidos = str(db_sources)[:max(0, max_chars)], 0
+    if omitidos:
+        db_json += f"\n[CONTEXTO TRUNCADO: {omitidos} registros mais antigos omitidos]"
 
     user_msg = (
         f"{db_json}\n\n"
@@ -1273,6 +1734,10 @@ def respond_query(user_query: str, db_path: str = SAIDA, model: str = "llama-3.1
             traceback.print_exc()
             if "invalid_api_key" in err_msg or "401" in err_msg:
                 _disable_client_due_to_auth()
+            if isinstance(e, llm_client.LLMRequestTooLargeError):
+                return "A PERGUNTA FICOU GRANDE DEMAIS PARA O LIMITE ATUAL DO MODELO. TENTE UMA PERGUNTA MAIS CURTA."
+            if isinstance(e, llm_client.LLMRateLimitError):
+                return "A IA ATINGIU O LIMITE DE REQUISIÇÕES POR MINUTO. AGUARDE ALGUNS SEGUNDOS E TENTE NOVAMENTE."
             return f"ERRO AO CONSULTAR IA REMOTA: {e}"
 
     return "IA REMOTA NAO ESTA DISPONIVEL NO MOMENTO. VERIFIQUE A CHAVE E A CONECTIVIDADE PARA CONTINUAR."
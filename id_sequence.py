@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Sequências persistentes de ID, uma por coleção (arquivo de dados).
+
+Substitui o cálculo "maior ID + 1" feito varrendo todos os registros. Cada
+diretório de dados tem um ``id_sequences.json`` com o último ID entregue por
+coleção (nome do arquivo, ex.: ``dadosend.json``). A alocação é O(1),
+monotônica, sobrevive a reinícios e é serializada por lock de arquivo, então
+UI, threads da IA e outros processos nunca recebem o mesmo ID. Quem precisa
+de vários IDs de uma vez usa ``reserve`` (uma gravação por bloco).
+
+Na primeira alocação de uma coleção sem contador, ``seed`` (valor ou função)
+fornece o maior ID já existente — a única varredura. ``floor`` permite a quem
+já conhece o maior ID barato (ex.: ``record_index``) garantir que a sequência
+nunca fique atrás de registros gravados por fora do alocador.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+import file_lock
+
+SEQUENCES_FILENAME = "id_sequences.json"
+
+_STORES_LOCK = threading.Lock()
+_STORES: Dict[str, "SequenceStore"] = {}
+
+Seed = Union[int, Callable[[], int], None]
+
+
+def max_numeric_id(regs: Iterable[dict], keys=("ID", "id")) -> int:
+    """Maior ID inteiro em ``regs`` (usado só para semear uma sequência nova)."""
+    maxid = 0
+    for r in regs or []:
+        if not isinstance(r, dict):
+            continue
+        raw = None
+        for k in keys:
+            raw = r.get(k)
+            if raw:
+                break
+        try:
+            v = int(raw or 0)
+        except (TypeError, ValueError):
+            continue
+        if v > maxid:
+            maxid = v
+    return maxid
+
+
+def max_prefixed_id(values: Iterable[Any], prefix: str) -> int:
+    """Maior número em IDs textuais no formato ``<prefix><n>`` (ex.: AVISO-000012)."""
+    pattern = re.compile(re.escape(prefix) + r"(\d+)")
+    maxn = 0
+    for value in values or []:
+        m = pattern.match(str(value or ""))
+        if m:
+            n = int(m.group(1))
+            if n > maxn:
+                maxn = n
+    return maxn
+
+
+class SequenceStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, int]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        seqs = data.get("sequencias") if isinstance(data, dict) else None
+        out: Dict[str, int] = {}
+        for name, value in (seqs or {}).items():
+            try:
+                out[str(name)] = int(value)
+            except (TypeError, ValueError):
+                continue
+        return out
+
+    def _write(self, counters: Dict[str, int]) -> None:
+        dirn = os.path.dirname(self.path) or "."
+        os.makedirs(dirn, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_seq_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"sequencias": counters}, f, ensure_ascii=False, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except Exception:
+                    pass
+
+    def reserve(self, name: str, count: int = 1, *, seed: Seed = None, floor: int = 0) -> range:
+        """Reserva ``count`` IDs consecutivos de ``name`` com uma só gravação.
+
+        A releitura e a gravação do contador ficam sob o lock de arquivo
+        (``id_sequences.json.lock``), então outro processo não lê o mesmo valor.
+        Se a gravação falhar o ``OSError`` sobe e nenhum ID é entregue: devolver
+        um valor não persistido faria ele ser reemitido depois de um reinício.
+        """
+        count = max(1, int(count))
+        with self._lock, file_lock.lock_for(self.path + ".lock"):
+            counters = self._read()
+            current = counters.get(name)
+            if current is None:
+                current = int((seed() if callable(seed) else seed) or 0)
+            current = max(current, int(floor or 0))
+            counters[name] = current + count
+            self._write(counters)
+        return range(current + 1, current + count + 1)
+
+    def allocate(self, name: str, *, seed: Seed = None, floor: int = 0) -> int:
+        return self.reserve(name, 1, seed=seed, floor=floor)[0]
+
+    def peek(self, name: str) -> Optional[int]:
+        with self._lock:
+            return self._read().get(name)
+
+
+def store_for(data_path: str) -> SequenceStore:
+    dirn = os.path.dirname(os.path.abspath(data_path))
+    with _STORES_LOCK:
+        store = _STORES.get(dirn)
+        if store is None:
+            store = SequenceStore(os.path.join(dirn, SEQUENCES_FILENAME))
+            _STORES[dirn] = store
+        return store
+
+
+def allocate(data_path: str, *, seed: Seed = None, floor: int = 0) -> int:
+    """Próximo ID da coleção ``data_path`` (sequência nomeada pelo arquivo)."""
+    return store_for(data_path).allocate(os.path.basename(data_path), seed=seed, floor=floor)
+
+
+def reserve(data_path: str, count: int, *, seed: Seed = None, floor: int = 0) -> range:
+    """Bloco de ``count`` IDs consecutivos da coleção ``data_path`` (uma gravação só)."""
+    return store_for(data_path).reserve(os.path.basename(data_path), count, seed=seed, floor=floor)
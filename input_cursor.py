@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Cursor persistente dos arquivos de entrada da IA (dadosinit/encomendasinit).
+
+``ia.processar`` percorria todos os registros de entrada só para pular os que
+já tinham ``processado: true``, e esses arquivos nunca encolhiam. Cada arquivo
+de entrada agora tem um cursor em ``ia_cursor.json`` (no mesmo diretório)::
+
+    {"cursores": {"dadosinit.json": {"ultimo_id": 812, "lacunas": [790]}}}
+
+- ``ultimo_id``: maior ID já visto pelo processar (marca d'água);
+- ``lacunas``: IDs abaixo da marca que falharam e precisam de nova tentativa.
+
+``pendentes`` devolve as lacunas mais a cauda depois do último registro já
+processado (o arquivo é só de anexos, com IDs crescentes), sem olhar o prefixo.
+``compactar`` move o prefixo inteiramente processado para o histórico
+(``record_archive``, lido com ``include_archive=True``) quando ele passa de
+``ACCESS_INPUT_COMPACT_MIN`` registros (padrão 200). O último registro sempre
+fica no arquivo quente para a sequência de IDs continuar tendo semente.
+
+A compactação só roda com o histórico ligado (``ACCESS_HISTORY_ARCHIVE=1``,
+o mesmo opt-in do ``record_archive``); sem ele o arquivo de entrada fica
+inteiro. Desligue o cursor com ``ACCESS_INPUT_CURSOR=0`` (volta à varredura
+completa) ou só a compactação com ``ACCESS_INPUT_COMPACT=0``.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import file_lock
+import record_archive
+import record_store
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+CURSOR_FILENAME = "ia_cursor.json"
+CURSOR_ENABLED = os.getenv("ACCESS_INPUT_CURSOR", "1").strip().lower() in ("1", "true", "yes", "on")
+COMPACT_ENABLED = os.getenv("ACCESS_INPUT_COMPACT", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    COMPACT_MIN_RECORDS = max(1, int(os.getenv("ACCESS_INPUT_COMPACT_MIN", "200")))
+except ValueError:
+    COMPACT_MIN_RECORDS = 200
+
+_STORES_LOCK = threading.Lock()
+_STORES: Dict[str, "CursorStore"] = {}
+
+
+def cursor_enabled() -> bool:
+    return bool(CURSOR_ENABLED)
+
+
+def _rec_id(rec: Any) -> Optional[int]:
+    if not isinstance(rec, dict):
+        return None
+    raw = rec.get("id") if rec.get("id") is not None else rec.get("ID")
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+class CursorStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        cursores = data.get("cursores") if isinstance(data, dict) else None
+        return cursores if isinstance(cursores, dict) else {}
+
+    def _write(self, cursores: Dict[str, dict]) -> None:
+        dirn = os.path.dirname(self.path) or "."
+        os.makedirs(dirn, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_cursor_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"cursores": cursores}, f, ensure_ascii=False, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        finally:
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except Exception:
+                    pass
+
+    def get(self, name: str) -> dict:
+        with self._lock:
+            cur = self._read().get(name)
+        if not isinstance(cur, dict):
+            return {"ultimo_id": 0, "lacunas": []}
+        try:
+            ultimo = int(cur.get("ultimo_id") or 0)
+        except (TypeError, ValueError):
+            ultimo = 0
+        lacunas = []
+        for v in cur.get("lacunas") or []:
+            try:
+                lacunas.append(int(v))
+            except (TypeError, ValueError):
+                continue
+        return {"ultimo_id": ultimo, "lacunas": sorted(set(lacunas))}
+
+    def set(self, name: str, ultimo_id: int, lacunas) -> None:
+        with self._lock:
+            cursores = self._read()
+            cursores[name] = {
+                "ultimo_id": int(ultimo_id),
+                "lacunas": sorted({int(v) for v in lacunas}),
+                "atualizado_em": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+            }
+            try:
+                self._write(cursores)
+            except OSError as e:
+                print(f"[input_cursor] Falha ao persistir cursor {name}: {e}")
+
+
+def store_for(data_path: str) -> CursorStore:
+    dirn = os.path.dirname(os.path.abspath(data_path))
+    with _STORES_LOCK:
+        store = _STORES.get(dirn)
+        if store is None:
+            store = CursorStore(os.path.join(dirn, CURSOR_FILENAME))
+            _STORES[dirn] = store
+        return store
+
+
+def cursor(data_path: str) -> dict:
+    return store_for(data_path).get(os.path.basename(data_path))
+
+
+def pendentes(data_path: str, regs: List[dict]) -> List[dict]:
+    """Registros não processados a partir do cursor (lacunas + cauda), em ordem do arquivo.
+
+    Só a cauda depois da marca d'água é filtrada; as lacunas são buscadas por
+    ID andando para trás a partir dela e a busca para assim que todas foram
+    achadas ou o ID fica abaixo da menor lacuna (IDs crescem com os anexos).
+    """
+    regs = regs or []
+    if not cursor_enabled():
+        return [r for r in regs if isinstance(r, dict) and not r.get("processado")]
+    cur = cursor(data_path)
+    ultimo, lacunas = cur["ultimo_id"], set(cur["lacunas"])
+
+    # cauda: tudo depois do último registro processado que está abaixo da marca
+    inicio = len(regs)
+    while inicio > 0:
+        r = regs[inicio - 1]
+        if isinstance(r, dict) and r.get("processado"):
+            rid = _rec_id(r)
+            if rid is None or rid <= ultimo:
+                break
+        inicio -= 1
+    cauda = [r for r in regs[inicio:] if isinstance(r, dict) and not r.get("processado")]
+
+    achadas: List[dict] = []
+    faltam = set(lacunas)
+    menor = min(faltam) if faltam else None
+    i = inicio
+    while faltam and i > 0:
+        i -= 1
+        rid = _rec_id(regs[i])
+        if rid is None:
+            continue
+        if rid < menor:
+            break
+        if rid in faltam:
+            faltam.discard(rid)
+            if not regs[i].get("processado"):
+                achadas.append(regs[i])
+    achadas.reverse()
+    out = achadas + cauda
+    report_status(
+        "ia_cursor",
+        "OK",
+        stage="pendentes",
+        details={"path": os.path.basename(data_path), "registros": len(regs), "ignorados": inicio, "pendentes": len(out), "lacunas": len(lacunas)},
+    )
+    return out
+
+
+def avancar(data_path: str, candidatos: List[dict]) -> dict:
+    """Move a marca d'água depois de uma rodada; quem ficou sem ``processado`` vira lacuna."""
+    if not cursor_enabled():
+        return {}
+    cur = cursor(data_path)
+    ultimo = cur["ultimo_id"]
+    lacunas = set()
+    for r in candidatos or []:
+        rid = _rec_id(r)
+        if rid is None:
+            continue
+        ultimo = max(ultimo, rid)
+        if not r.get("processado"):
+            lacunas.add(rid)
+    if ultimo != cur["ultimo_id"] or lacunas != set(cur["lacunas"]):
+        store_for(data_path).set(os.path.basename(data_path), ultimo, lacunas)
+    return {"ultimo_id": ultimo, "lacunas": sorted(lacunas)}
+
+
+def compactar(data_path: str, *, min_registros: Optional[int] = None) -> int:
+    """Arquiva o prefixo já processado de ``data_path``. Retorna quantos registros saíram."""
+    if not (cursor_enabled() and COMPACT_ENABLED and record_archive.archive_enabled()):
+        return 0
+    minimo = COMPACT_MIN_RECORDS if min_registros is None else max(1, int(min_registros))
+    cur = cursor(data_path)
+    ultimo, lacunas = cur["ultimo_id"], set(cur["lacunas"])
+    with file_lock.lock_for(data_path + ".lock"):
+        try:
+            doc = record_store.load_document(data_path)
+        except FileNotFoundError:
+            return 0
+        if isinstance(doc, list):
+            doc = {"registros": doc}
+        if not isinstance(doc, dict):
+            return 0
+        regs = doc.get("registros") or []
+        fim = 0
+        # o último registro nunca sai: semente da sequência de IDs se id_sequences.json sumir
+        while fim < len(regs) - 1:
+            r = regs[fim]
+            rid = _rec_id(r)
+            if not (isinstance(r, dict) and r.get("processado") and rid is not None and rid <= ultimo and rid not in lacunas):
+                break
+            fim += 1
+        # sem data legível o registro não vai para o histórico; não conta para o mínimo
+        if sum(1 for r in regs[:fim] if record_archive.record_month(r)) < minimo:
+            return 0
+        sem_data = record_archive.archive_records(data_path, regs[:fim])
+        # só depois do segmento e do manifesto duráveis o arquivo de entrada encolhe
+        hot = dict(doc)
+        hot["registros"] = list(sem_data) + list(regs[fim:])
+        record_store.save_document(data_path, hot, indent=4, fsync=True)
+    movidos = fim - len(sem_data)
+    report_status(
+        "ia_cursor",
+        "OK",
+        stage="compactar",
+        details={"path": os.path.basename(data_path), "arquivados": movidos, "restantes": len(hot["registros"])},
+    )
+    return movidos
@@ -16,6 +16,12 @@ from datetime import datetime, timedelta
 from collections import Counter
 from typing import List, Iterable
 
+import file_lock
+import id_sequence
+import persistence_writer
+import record_index
+import record_store
+
 try:
     import tkinter as tk
     import tkinter.font as tkfont
@@ -423,42 +429,40 @@ def _is_encomenda_text(text: str, parsed: dict = None) -> bool:
         return True
     return False
 
-def _save_encomenda_init(txt: str, now_str: str) -> None:
-    try:
-        existing = _read_json(ENCOMENDAS_IN_FILE)
-        if isinstance(existing, dict) and "registros" in existing:
-            regs = existing.get("registros") or []
-        elif isinstance(existing, list):
-            regs = existing
-        else:
-            regs = []
-    except Exception:
-        regs = []
-
-    nid = _compute_next_in_id(regs)
+def _save_encomenda_init(txt: str, now_str: str):
+    nid = _compute_next_in_id(None, ENCOMENDAS_IN_FILE)
     new_rec = {
         "id": nid,
         "texto": txt,
         "processado": False,
         "data_hora": now_str,
     }
-    regs.append(new_rec)
     try:
-        atomic_save(ENCOMENDAS_IN_FILE, {"registros": regs})
+        _append_input_record(ENCOMENDAS_IN_FILE, new_rec)
     except Exception as e:
         print("Erro save (ENCOMENDAS_IN_FILE):", e)
+        return None
+    return nid
 
 
-def _start_ia_pipeline(source: str) -> None:
+def _start_ia_pipeline(source: str, entrada_id=None) -> None:
     """
     Dispara o pipeline da IA em background.
 
+    Com ``ia.enqueue_processing`` disponível só enfileira o ID para o worker de
+    longa duração do ia (sem thread por gravação nem disputa pelo process.lock);
+    senão cai na thread avulsa histórica.
+
     Observação operacional: registros de dados/encomendas devem seguir o fluxo
     normalmente mesmo com chat ativo.
     """
     if not (HAS_IA_MODULE and hasattr(ia_module, "processar")):
         return
     try:
+        if hasattr(ia_module, "enqueue_processing"):
+            ia_module.enqueue_processing(entrada_id=entrada_id, source=source)
+            report_status("ia_pipeline", "STARTED", stage="enqueued", details={"source": source, "entrada_id": entrada_id})
+            return
         threading.Thread(target=ia_module.processar, daemon=True).start()
         report_status("ia_pipeline", "STARTED", stage="thread_started", details={"source": source})
     except Exception as e:
@@ -503,7 +507,7 @@ def _save_structured_text(path: str, txt: str, now_str: str, tipo: str, decision
     except Exception:
         regs = []
 
-    nid = _compute_next_in_id(regs)
+    nid = _compute_next_in_id(regs, path)
     strict, inferred = build_structured_fields(txt) if build_structured_fields else ({}, {})
     merged = {k: list(dict.fromkeys((strict.get(k, []) + inferred.get(k, [])))) for k in (strict.keys() or ["BLOCO","APARTAMENTO","NOME","SOBRENOME","HORARIO","VEICULO","COR","PLACA"])}
     rec = {
@@ -547,7 +551,7 @@ def _save_for_review(txt: str, now_str: str, decision_meta: dict = None) -> None
         fila = {"registros": []}
 
     regs = fila.get("registros") or []
-    nid = _compute_next_in_id(regs)
+    nid = _compute_next_in_id(regs, REVIEW_QUEUE_FILE)
     regs.append(
         {
             "id": nid,
@@ -619,18 +623,9 @@ def tokens(text):
     return re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9\-]+", str(text or ""))
 
 def atomic_save(path, obj):
-    dirn = os.path.dirname(path) or "."
-    os.makedirs(dirn, exist_ok=True)
-    fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_", suffix=os.path.splitext(path)[1] or ".json")
-    try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, path)
-    finally:
-        if os.path.exists(tmp):
-            try: os.remove(tmp)
-            except Exception:
-                pass
+    # escrita direta vence qualquer snapshot ainda na fila do escritor (ex.: avisos.json)
+    persistence_writer.discard(path)
+    record_store.save_document(path, obj, indent=2, fsync=False)
 
 # helper: garante data_hora válida e salva o DB (uso centralizado para evitar nulls)
 def sanitize_and_save_db(regs):
@@ -666,10 +661,34 @@ def sanitize_and_save_db(regs):
 
 def _read_json(path):
     try:
-        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+        return record_store.load_document(path)
     except Exception:
         return None
 
+def _append_input_record(path, new_rec):
+    """Anexa ``new_rec`` ao arquivo de entrada (dadosinit/encomendasinit).
+
+    Com journal ou SQLite (``record_store.supports_incremental``) é uma linha do
+    journal / um INSERT, sem ler nem regravar o histórico. No JSON puro relê e
+    regrava o documento. Nos dois casos sob o lock do arquivo: o ``ia`` marca
+    ``processado`` no mesmo documento (``ia.marcar_processados``) e uma
+    regravação fora do lock apagaria o registro recém-anexado ou a flag do outro lado.
+    """
+    with file_lock.lock_for(path + ".lock"):
+        if record_store.supports_incremental(path):
+            if not record_store.append_record(path, new_rec):
+                raise OSError(f"falha ao anexar registro em {path}")
+            return
+        existing = _read_json(path)
+        if isinstance(existing, dict) and "registros" in existing:
+            regs = existing.get("registros") or []
+        elif isinstance(existing, list):
+            regs = existing
+        else:
+            regs = []
+        regs.append(new_rec)
+        atomic_save(path, {"registros": regs})
+
 def parse_datetime(ds: str):
     if not ds: return None
     s = (ds or "").strip()
@@ -979,35 +998,15 @@ def _identity_key(rec: dict) -> str:
 
 # ---------- file lock ----------
 def _acquire_db_lock(timeout=5.0, poll=0.05):
-    start = time.time()
-    while True:
-        try:
-            fd = os.open(_DB_LOCKFILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
-            try: os.write(fd, f"{os.getpid()} {time.time()}".encode("utf-8"))
-            except Exception:
-                pass
-            try: os.close(fd)
-            except Exception:
-                pass
-            return True
-        except FileExistsError:
-            if (time.time() - start) >= timeout:
-                try:
-                    m = os.path.getmtime(_DB_LOCKFILE)
-                    if time.time() - m > (timeout * 2):
-                        try: os.remove(_DB_LOCKFILE)
-                        except Exception:
-                            pass
-                except Exception:
-                    pass
-                return False
-            time.sleep(poll)
-        except Exception:
-            return False
+    # ``poll`` mantido por compatibilidade: file_lock espera sem polling (flock)
+    try:
+        return file_lock.lock_for(_DB_LOCKFILE, stale_seconds=timeout * 2).acquire(timeout=timeout)
+    except Exception:
+        return False
 
 def _release_db_lock():
     try:
-        if os.path.exists(_DB_LOCKFILE): os.remove(_DB_LOCKFILE)
+        file_lock.lock_for(_DB_LOCKFILE).release()
     except Exception:
         pass
 
@@ -1081,38 +1080,15 @@ def _identity_from_record(rec: dict) -> str:
     return f"{nome}|{sobrenome}|{bloco}|{ap}"
 
 def _get_last_record_identity(dadosend_path: str) -> str:
+    # mesmo ponteiro O(1) do watcher do main (record_store.latest_record)
     try:
-        data = _read_json(dadosend_path)
+        last = record_store.latest_record(dadosend_path)
     except Exception:
         return ""
-    if isinstance(data, dict) and "registros" in data:
-        regs = data.get("registros") or []
-    elif isinstance(data, list):
-        regs = data
-    else:
-        regs = []
-    if not regs:
+    if not isinstance(last, dict):
         return ""
     try:
-        regs_with_id = [r for r in regs if isinstance(r.get("ID"), int)]
-        if regs_with_id:
-            last = max(regs_with_id, key=lambda r: int(r.get("ID") or 0))
-            return _identity_from_record(last)
-    except Exception:
-        pass
-    def _dt_key(rec):
-        s = rec.get("DATA_HORA") or rec.get("data_hora") or ""
-        return parse_datetime(s)
-    try:
-        regs_with_dt = [(r, _dt_key(r)) for r in regs]
-        regs_with_dt = [t for t in regs_with_dt if t[1] is not None]
-        if regs_with_dt:
-            last = max(regs_with_dt, key=lambda t: t[1])[0]
-            return _identity_from_record(last)
-    except Exception:
-        pass
-    try:
-        return _identity_from_record(regs[-1])
+        return _identity_from_record(last)
     except Exception:
         return ""
 
@@ -1128,7 +1104,7 @@ def _start_analises_watcher(poll_interval: float = 1.0):
                 encomendas_changed = False
 
                 if os.path.exists(DB_FILE):
-                    mtime_db = os.path.getmtime(DB_FILE)
+                    mtime_db = (os.path.getmtime(DB_FILE), record_store.change_token(DB_FILE))
                     if last_mtime_db is None:
                         last_mtime_db = mtime_db
                     elif mtime_db != last_mtime_db:
@@ -1168,14 +1144,7 @@ def _start_analises_watcher(poll_interval: float = 1.0):
 
 # ---------- append (revisado) ----------
 def _next_db_id(regs):
-    max_id = 0
-    for r in regs:
-        try:
-            v = int(r.get("ID") or r.get("id") or 0)
-            if v > max_id: max_id = v
-        except (TypeError, ValueError):
-            pass
-    return max_id + 1
+    return id_sequence.allocate(DB_FILE, seed=lambda: id_sequence.max_numeric_id(regs))
 
 def append_record_to_db(rec: dict):
     """
@@ -1196,23 +1165,16 @@ def append_record_to_db(rec: dict):
             return _append_record_to_db_nolock(rec)
         except:
             return False
+    idx = record_index.index_for(DB_FILE)
+    idx.lock.acquire()
     try:
-        base = _read_json(DB_FILE)
-        regs = [] if not base or not isinstance(base, dict) or "registros" not in base else (base.get("registros") or [])
-        if not isinstance(regs, list): regs = list(regs)
+        regs = idx.refresh()
 
-        # procura identidade já existente para reaproveitar ID de pessoa
+        # procura identidade já existente para reaproveitar ID de pessoa (índice em memória)
         new_idkey = _identity_key(rec)
-        person_id = None
-        for r in regs:
-            if _identity_key(r) == new_idkey:
-                try:
-                    person_id = int(r.get("ID") or r.get("id"))
-                    break
-                except:
-                    continue
+        person_id = idx.person_id(new_idkey, _identity_key)
         if person_id is None:
-            person_id = _next_db_id(regs)
+            person_id = id_sequence.allocate(DB_FILE, floor=idx.max_id())
 
         # criar novo registro (histórico) e garantir campos
         rec_to_insert = dict(rec)
@@ -1227,50 +1189,59 @@ def append_record_to_db(rec: dict):
         if "COR" in rec and rec.get("COR"): rec_to_insert["COR"] = str(rec.get("COR")).upper()
         if "PLACA" in rec and rec.get("PLACA"): rec_to_insert["PLACA"] = str(rec.get("PLACA")).upper()
 
-        regs.append(rec_to_insert)
-
-        _ensure_datetime_on_records(regs)
-        sanitize_and_save_db(regs)
+        if record_store.supports_incremental(DB_FILE):
+            if not record_store.append_record(DB_FILE, rec_to_insert):
+                raise OSError("falha ao gravar journal de dadosend")
+            idx.add(rec_to_insert)
+        else:
+            idx.add(rec_to_insert)
+            _ensure_datetime_on_records(regs)
+            sanitize_and_save_db(regs)
+        idx.mark_saved()
         report_status("db_append", "OK", stage="persisted", details={"id": rec_to_insert.get("ID"), "entrada_id": rec_to_insert.get("_entrada_id")})
         try: sync_suggestions(force=True)
         except Exception:
             pass
         return True
     except Exception as e:
+        idx.invalidate()
         report_status("db_append", "ERROR", stage="exception", details={"error": str(e)})
         _log_ui("ERROR", "append_record_exception", "Erro append_record_to_db", error=str(e)); return False
     finally:
+        idx.lock.release()
         _release_db_lock()
 
 def _append_record_to_db_nolock(rec: dict):
+    idx = record_index.index_for(DB_FILE)
+    idx.lock.acquire()
     try:
-        base = _read_json(DB_FILE)
-        regs = [] if base is None or not isinstance(base, dict) else (base.get("registros") or [])
-        if not isinstance(regs, list): regs = list(regs)
-        id_fp = _identity_key(rec); person_id=None
-        for r in regs:
-            if _identity_key(r) == id_fp:
-                try:
-                    person_id = int(r.get("ID") or r.get("id"))
-                    break
-                except:
-                    continue
+        regs = idx.refresh()
+        person_id = idx.person_id(_identity_key(rec), _identity_key)
         if person_id is None:
-            person_id = _next_db_id(regs)
+            person_id = id_sequence.allocate(DB_FILE, floor=idx.max_id())
         rec_to_insert = dict(rec); rec_to_insert["ID"] = person_id
         if not rec_to_insert.get("DATA_HORA") or parse_datetime(rec_to_insert.get("DATA_HORA")) is None:
             rec_to_insert["DATA_HORA"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
         if "MODELO" in rec and rec.get("MODELO"): rec_to_insert["MODELO"] = str(rec.get("MODELO")).upper()
         if "COR" in rec and rec.get("COR"): rec_to_insert["COR"] = str(rec.get("COR")).upper()
         if "PLACA" in rec and rec.get("PLACA"): rec_to_insert["PLACA"] = str(rec.get("PLACA")).upper()
-        regs.append(rec_to_insert)
-        _ensure_datetime_on_records(regs); sanitize_and_save_db(regs)
+        if record_store.supports_incremental(DB_FILE):
+            if not record_store.append_record(DB_FILE, rec_to_insert):
+                return False
+            idx.add(rec_to_insert)
+        else:
+            idx.add(rec_to_insert)
+            _ensure_datetime_on_records(regs); sanitize_and_save_db(regs)
+        idx.mark_saved()
         try: sync_suggestions(force=True)
         except Exception:
             pass
         return True
     except Exception as e:
+        idx.invalidate()
         _log_ui("ERROR", "append_record_nolock_exception", "Erro _append_record_to_db_nolock", error=str(e)); return False
+    finally:
+        idx.lock.release()
 
 # ---------- util overlay: common prefix ----------
 def token_common_prefix_len(a: str, b: str) -> int:
@@ -2209,6 +2180,11 @@ class SuggestEntry(tk.Frame):
     def on_tree_return(self, event): return self.on_return(event)
 
     def _send_query_to_ia_thread(self, query_text: str):
+        if HAS_CHAT_MODULE and getattr(chat_module, "stream_enabled", lambda: False)():
+            root = self._root_for_ui()
+            if root is not None:
+                self._stream_query_to_ia(root, query_text)
+                return
         if HAS_CHAT_MODULE and hasattr(chat_module, "respond_chat"):
             try: resp = chat_module.respond_chat(query_text)
             except Exception as e: resp = f"Erro ao consultar IA: {e}"
@@ -2236,6 +2212,69 @@ class SuggestEntry(tk.Frame):
         except Exception:
             print(resp)
 
+    def _stream_query_to_ia(self, root, query_text: str):
+        """Abre a janela antes do primeiro token e vai anexando o texto conforme chega."""
+        cancel = threading.Event()
+        win = {}
+        opened = threading.Event()
+        buf = {"parts": [], "scheduled": False}
+        buf_lock = threading.Lock()
+
+        def _open():
+            try: win.update(self._open_ia_stream_window(cancel))
+            except Exception as e: print("Erro ao abrir janela de resposta IA:", e)
+            finally: opened.set()
+
+        def _flush():
+            with buf_lock:
+                text = "".join(buf["parts"]); buf["parts"] = []; buf["scheduled"] = False
+            if text: self._ia_stream_write(win, text)
+
+        def _on_delta(piece):
+            # junta os pedaços que chegam entre dois ciclos do Tk num único insert
+            with buf_lock:
+                buf["parts"].append(piece)
+                if buf["scheduled"]: return
+                buf["scheduled"] = True
+            root.after(0, _flush)
+
+        root.after(0, _open)
+        opened.wait(5)
+        try: resp = chat_module.respond_chat(query_text, on_delta=_on_delta, cancel_event=cancel)
+        except Exception as e: resp = f"Erro ao consultar IA: {e}"
+        root.after(0, lambda r=resp: (_flush(), self._ia_stream_write(win, r, final=True)))
+
+    def _open_ia_stream_window(self, cancel_event):
+        root = self._root_for_ui()
+        top = tk.Toplevel(root); top.title("Resposta IA"); top.geometry("700x400")
+        st = scrolledtext.ScrolledText(top, wrap=tk.WORD); st.pack(fill=tk.BOTH, expand=True, padx=8, pady=8)
+        st.configure(state="disabled")
+        bar = tk.Frame(top); bar.pack(pady=(0,8))
+        btn_cancel = tk.Button(bar, text="Cancelar", command=cancel_event.set); btn_cancel.pack(side=tk.LEFT, padx=4)
+
+        def _close():
+            cancel_event.set(); top.destroy()
+
+        tk.Button(bar, text="Fechar", command=_close).pack(side=tk.LEFT, padx=4)
+        top.protocol("WM_DELETE_WINDOW", _close)
+        return {"top": top, "text": st, "cancel": btn_cancel}
+
+    def _ia_stream_write(self, win, text: str, final: bool = False):
+        st = win.get("text")
+        try:
+            if st is None or not st.winfo_exists():
+                if final: print(text)
+                return
+            st.configure(state="normal")
+            if final:
+                # a versão final passa pelo template do agente: substitui o parcial
+                st.delete("1.0", tk.END)
+            st.insert(tk.END, text); st.see(tk.END)
+            st.configure(state="disabled")
+            if final: win["cancel"].configure(state="disabled")
+        except Exception as e:
+            print("Erro ao atualizar resposta IA:", e)
+
     def _show_ia_response_window(self, text: str):
         try:
             root = self._root_for_ui()
@@ -2680,15 +2719,20 @@ class SuggestEntry(tk.Frame):
 # save_text (corrigido para usar preprocessor.extrair_tudo_consumo quando disponível)
 # =========================
 
-def _compute_next_in_id(regs):
-    max_id = 0
-    for r in regs:
-        try:
-            v = int(r.get("id") or r.get("ID") or 0)
-            if v > max_id: max_id = v
-        except (TypeError, ValueError):
-            pass
-    return max_id + 1
+def _compute_next_in_id(regs, path=None):
+    """Próximo id de entrada; com ``path`` usa a sequência persistente da coleção.
+
+    O piso da sequência é o maior id já gravado: o de ``regs`` quando o
+    chamador já leu o arquivo, senão ``record_store.max_record_id`` (sidecar
+    ou SQLite, sem varrer). Assim um contador velho ou restaurado não reemite ids.
+    """
+    if path:
+        if regs is None:
+            floor = record_store.max_record_id(path)
+        else:
+            floor = id_sequence.max_numeric_id(regs, keys=("id", "ID"))
+        return id_sequence.allocate(path, floor=floor)
+    return id_sequence.max_numeric_id(regs, keys=("id", "ID")) + 1
 
 def save_text(entry_widget=None, btn=None):
     started_at = time.time()
@@ -2761,7 +2805,7 @@ def save_text(entry_widget=None, btn=None):
         return
 
     if destino == "encomendas" or _is_encomenda_text(txt, parsed):
-        _save_encomenda_init(txt, now_str)
+        enc_id = _save_encomenda_init(txt, now_str)
         report_status("user_input", "OK", stage="saved_encomenda_init", details={"path": ENCOMENDAS_IN_FILE})
         if log_audit_event:
             log_audit_event("texto_persistido", "ENCOMENDAS_INIT", txt, motivo=decision.get("motivo"), score=decision.get("score"))
@@ -2775,7 +2819,7 @@ def save_text(entry_widget=None, btn=None):
                 entry_widget.after(500, lambda: btn.config(state="normal"))
             except Exception as e:
                 _log_ui("WARNING", "button_toggle_failed", "Falha ao atualizar estado do botão", error=str(e))
-        _start_ia_pipeline("save_text_encomenda")
+        _start_ia_pipeline("save_text_encomenda", entrada_id=enc_id)
         _report_save_metric("save_completed", destino="encomendas")
         return
 
@@ -2841,19 +2885,8 @@ def save_text(entry_widget=None, btn=None):
     access_flags = _compute_access_flags(fields_for_flags) if fields_for_flags else {}
     missing_fields = _missing_fields_from_record(fields_for_flags) if fields_for_flags else []
 
-    try:
-        existing = _read_json(IN_FILE)
-        if isinstance(existing, dict) and "registros" in existing:
-            regs = existing.get("registros") or []
-        elif isinstance(existing, list):
-            regs = existing
-        else:
-            regs = []
-    except (OSError, json.JSONDecodeError, TypeError):
-        regs = []
-
-    # compute next id robustly
-    nid = _compute_next_in_id(regs)
+    # compute next id robustly (sequência persistente com piso do sidecar/SQLite, sem ler dadosinit)
+    nid = _compute_next_in_id(None, IN_FILE)
 
     if montar_entrada_bruta:
         new_rec = montar_entrada_bruta(nid, txt, now_str, access_flags)
@@ -2866,10 +2899,9 @@ def save_text(entry_widget=None, btn=None):
         }
         if access_flags:
             new_rec.update(access_flags)
-    regs.append(new_rec)
 
     try:
-        atomic_save(IN_FILE, {"registros": regs})
+        _append_input_record(IN_FILE, new_rec)
         report_status("user_input", "OK", stage="saved_dadosinit", details={"path": IN_FILE, "entrada_id": nid})
     except Exception as e:
         report_status("user_input", "ERROR", stage="save_dadosinit_failed", details={"error": str(e), "path": IN_FILE})
@@ -2893,7 +2925,7 @@ def save_text(entry_widget=None, btn=None):
             pass
 
     # disparar processamento IA em background (se módulo ia disponível)
-    _start_ia_pipeline("save_text_dados")
+    _start_ia_pipeline("save_text_dados", entrada_id=nid)
 
     _report_save_metric("save_completed", destino="dados", missing_fields=len(missing_fields))
 
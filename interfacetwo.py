@@ -16,6 +16,7 @@ from tkinter import messagebox, ttk, simpledialog
 import re
 import hashlib
 import math
+import record_store
 
 from ui_theme import (
     UI_THEME,
@@ -1326,7 +1327,7 @@ def _parse_json_lenient(raw: str):
     raise json.JSONDecodeError("invalid json for known encodings", text, 0)
 
 
-def _read_json_flexible(path: str):
+def _read_json_lenient(path: str):
     # Robustez para ambientes Windows/produção: arquivos podem chegar com BOM,
     # codificação ANSI/latin-1 ou serializações não estritamente válidas.
     for enc in ("utf-8", "utf-8-sig", "latin-1"):
@@ -1341,6 +1342,10 @@ def _read_json_flexible(path: str):
     raise json.JSONDecodeError("invalid json for known encodings", "", 0)
 
 
+def _read_json_flexible(path: str):
+    return record_store.load_document(path, fallback=_read_json_lenient)
+
+
 def _load_safe(path: str):
     if not os.path.exists(path):
         return []
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Cache persistente de respostas do LLM, endereçado pelo conteúdo do pedido.
+
+Os mesmos visitantes (nome, placa, carro) passam pela portaria todos os dias e
+o ``ia.processar`` pagava uma ida ao Groq a cada vez pelo mesmo prompt. Aqui a
+chave é o sha256 de (versão do prompt, ``texto_limpo`` normalizado, modelo):
+mudar o ``prompt_llm.txt`` ou o modelo invalida tudo sem apagar nada.
+
+Opt-in via ``ACCESS_LLM_CACHE=1``. As entradas ficam em ``llm_cache.json`` em
+ordem LRU e saem da ponta menos usada quando passam de qualquer um dos dois
+limites: ``ACCESS_LLM_CACHE_MAX`` (número de entradas, padrão 5000) ou
+``ACCESS_LLM_CACHE_MAX_BYTES`` (tamanho serializado somado, padrão 8 MB; uma
+resposta maior que isso sozinha não entra). Expiram após
+``ACCESS_LLM_CACHE_TTL_DAYS`` dias (padrão 30). ``put`` só marca o cache
+como sujo; o arquivo é regravado por ``flush`` (fim do ``ia.processar`` e saída
+do processo) ou, num lote longo, no primeiro ``put`` depois de
+``ACCESS_LLM_CACHE_FLUSH_S`` segundos (padrão 30) desde a última gravação.
+Assim uma rajada de misses vira uma cópia e uma escrita só.
+Só respostas já interpretadas (dict) entram no cache.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import persistence_writer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, "llm_cache.json")
+CACHE_ENABLED = os.getenv("ACCESS_LLM_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+try:
+    MAX_ENTRIES = max(1, int(os.getenv("ACCESS_LLM_CACHE_MAX", "5000")))
+except ValueError:
+    MAX_ENTRIES = 5000
+try:
+    MAX_BYTES = max(1024, int(os.getenv("ACCESS_LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024))))
+except ValueError:
+    MAX_BYTES = 8 * 1024 * 1024
+try:
+    TTL_SECONDS = max(0.0, float(os.getenv("ACCESS_LLM_CACHE_TTL_DAYS", "30"))) * 86400.0
+except ValueError:
+    TTL_SECONDS = 30 * 86400.0
+try:
+    FLUSH_INTERVAL_S = max(0.0, float(os.getenv("ACCESS_LLM_CACHE_FLUSH_S", "30")))
+except ValueError:
+    FLUSH_INTERVAL_S = 30.0
+
+
+def cache_enabled() -> bool:
+    return bool(CACHE_ENABLED)
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(str(text or "").upper().split())
+
+
+_PROMPT_VERSIONS: Dict[str, str] = {}
+
+
+def prompt_version(prompt_base: str) -> str:
+    """Versão curta (sha256) do prompt base; memorizada por conteúdo."""
+    text = prompt_base or ""
+    version = _PROMPT_VERSIONS.get(text)
+    if version is None:
+        version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        _PROMPT_VERSIONS[text] = version
+    return version
+
+
+def make_key(prompt_ver: str, texto_limpo: str, model: str) -> str:
+    raw = json.dumps([prompt_ver, normalize_text(texto_limpo), model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_bytes(key: str, entry: Dict[str, Any]) -> int:
+    """Tamanho da entrada como ela vai para o ``llm_cache.json``."""
+    return len(json.dumps([key, entry], ensure_ascii=False).encode("utf-8"))
+
+
+def _write_document(path: str, obj: Any) -> None:
+    dirn = os.path.dirname(path) or "."
+    os.makedirs(dirn, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_llm_cache_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+
+
+class LLMCache:
+    def __init__(self, path: str = CACHE_FILE, *, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES,
+                 ttl_seconds: float = TTL_SECONDS, flush_interval_s: float = FLUSH_INTERVAL_S):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl_seconds = float(ttl_seconds)
+        self.flush_interval_s = float(flush_interval_s)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._entries: Optional["OrderedDict[str, Dict[str, Any]]"] = None
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.stats = {"hits": 0, "misses": 0, "gravacoes": 0, "expirados": 0, "removidos_lru": 0, "grandes_demais": 0}
+
+    def _load(self) -> "OrderedDict[str, Dict[str, Any]]":
+        if self._entries is None:
+            data = persistence_writer.pending_snapshot(self.path)
+            if data is None:
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = None
+            entries = data.get("entradas") if isinstance(data, dict) else None
+            self._entries = OrderedDict(
+                (k, v) for k, v in (entries or []) if isinstance(k, str) and isinstance(v, dict)
+            )
+            self._sizes = {k: _entry_bytes(k, v) for k, v in self._entries.items()}
+            self._total_bytes = sum(self._sizes.values())
+            # o arquivo pode vir de um limite maior: aplica os limites atuais já na carga
+            if self._evict():
+                self._dirty = True
+        return self._entries
+
+    def _drop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._total_bytes -= self._sizes.pop(key, 0)
+
+    def _evict(self) -> int:
+        removidos = 0
+        while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            removidos += 1
+        self.stats["removidos_lru"] += removidos
+        return removidos
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds > 0 and now - float(entry.get("criado") or 0) > self.ttl_seconds
+
+    def flush(self) -> bool:
+        """Grava o cache se houver alterações pendentes. Retorna se gravou.
+
+        Uma falha de escrita mantém o cache sujo para a próxima tentativa.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty or self._entries is None:
+                    return False
+                snapshot = {"versao": 1, "entradas": [[k, dict(v)] for k, v in self._entries.items()]}
+                self._dirty = False
+                self._last_flush = time.monotonic()
+            try:
+                persistence_writer.submit(self.path, snapshot, _write_document)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                print(f"[llm_cache] Falha ao gravar {self.path}: {e}")
+                return False
+            return True
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._drop(key)
+                self.stats["expirados"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            entries.move_to_end(key)
+            self.stats["hits"] += 1
+            resposta = entry.get("resposta")
+        return json.loads(json.dumps(resposta)) if isinstance(resposta, dict) else None
+
+    def put(self, key: str, resposta: dict) -> None:
+        if not isinstance(resposta, dict):
+            return
+        now = time.time()
+        entry = {"criado": now, "resposta": resposta}
+        size = _entry_bytes(key, entry)
+        with self._lock:
+            entries = self._load()
+            if size > self.max_bytes:
+                self.stats["grandes_demais"] += 1
+                return
+            self._drop(key)
+            entries[key] = entry
+            self._sizes[key] = size
+            self._total_bytes += size
+            self._evict()
+            self.stats["gravacoes"] += 1
+            self._dirty = True
+            vencido = time.monotonic() - self._last_flush >= self.flush_interval_s
+        if vencido:
+            self.flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = OrderedDict()
+            self._sizes = {}
+            self._total_bytes = 0
+            self._dirty = True
+        self.flush()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["entradas"] = len(self._entries or {})
+            out["bytes"] = self._total_bytes
+        total = out["hits"] + out["misses"]
+        out["taxa_acerto"] = round(out["hits"] / total, 4) if total else 0.0
+        return out
+
+
+_CACHE: Optional[LLMCache] = None
+_CACHE_GUARD = threading.Lock()
+
+
+def cache() -> LLMCache:
+    global _CACHE
+    with _CACHE_GUARD:
+        if _CACHE is None:
+            _CACHE = LLMCache()
+            atexit.register(_CACHE.flush)
+        return _CACHE
+
+
+def flush() -> bool:
+    """Grava o cache do processo se ele foi usado e tem alterações pendentes."""
+    with _CACHE_GUARD:
+        current = _CACHE
+    return current.flush() if current is not None else False
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Cliente Groq com orçamento de requisições/tokens por modelo e backoff.
+
+``ia.processar`` e ``chat.respond_chat`` batiam nos limites de tokens por
+minuto (TPM) e no 413 sem nenhum controle. ``wrap(cliente)`` devolve um objeto
+com a mesma interface ``chat.completions.create(...)`` que:
+
+- estima os tokens do pedido antes de enviar (mensagens / 4 + ``max_tokens``);
+- consome de dois token buckets por modelo (RPM e TPM) e, sem saldo, espera na
+  fila até ``ACCESS_LLM_MAX_WAIT_S`` (padrão 30 s) antes de recusar;
+- recusa na hora pedidos maiores que o TPM inteiro (viraria 413 no servidor)
+  com ``LLMRequestTooLargeError``; ``max_prompt_chars(modelo)`` diz quanto
+  contexto cabe, para o chamador cortar antes;
+- refaz 429/5xx/timeouts com backoff exponencial com jitter (respeitando
+  ``retry-after`` quando o servidor manda), até ``ACCESS_LLM_MAX_RETRIES``;
+- acerta o bucket de tokens com o ``usage`` real da resposta (com
+  ``stream=True`` o iterador passa direto e fica valendo a estimativa) e
+  devolve a estimativa de cada tentativa que falhou, para os retries não
+  drenarem o TPM com tokens que nunca foram gastos.
+
+Limites padrão seguem o plano gratuito do Groq e podem ser trocados por
+``ACCESS_LLM_LIMITS='{"modelo": {"rpm": 30, "tpm": 6000}}'``. ``metrics()``
+expõe tempo em espera, recusas e retries por modelo.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {
+    "llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000},
+    "llama-3.3-70b-versatile": {"rpm": 30, "tpm": 12000},
+}
+FALLBACK_LIMIT = {"rpm": 30, "tpm": 6000}
+DEFAULT_COMPLETION_TOKENS = 256
+CHARS_PER_TOKEN = 4
+
+try:
+    MAX_WAIT_SECONDS = max(0.0, float(os.getenv("ACCESS_LLM_MAX_WAIT_S", "30")))
+except ValueError:
+    MAX_WAIT_SECONDS = 30.0
+try:
+    MAX_RETRIES = max(0, int(os.getenv("ACCESS_LLM_MAX_RETRIES", "3")))
+except ValueError:
+    MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+
+def _load_limits() -> Dict[str, Dict[str, int]]:
+    limits = {k: dict(v) for k, v in DEFAULT_LIMITS.items()}
+    raw = os.getenv("ACCESS_LLM_LIMITS", "").strip()
+    if raw:
+        try:
+            extra = json.loads(raw)
+            if isinstance(extra, dict):
+                for model, lim in extra.items():
+                    if isinstance(lim, dict):
+                        limits.setdefault(model, dict(FALLBACK_LIMIT)).update(
+                            {k: int(v) for k, v in lim.items() if k in ("rpm", "tpm")}
+                        )
+        except (ValueError, TypeError):
+            print("[llm_client] ACCESS_LLM_LIMITS inválido; usando limites padrão.")
+    return limits
+
+
+class LLMRateLimitError(RuntimeError):
+    """Pedido recusado localmente (orçamento estourado ou maior que o TPM)."""
+
+
+class LLMRequestTooLargeError(LLMRateLimitError):
+    """Pedido maior que o TPM inteiro do modelo (o 413 que o servidor daria)."""
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = float(per_minute) / 60.0
+        self._clock = clock
+        self.tokens = float(capacity)
+        self._last = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, amount: float) -> float:
+        """Segundos até haver ``amount`` de saldo (0 se já há)."""
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def adjust(self, delta: float) -> None:
+        """Corrige o saldo depois da resposta (``delta`` > 0 devolve tokens)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    chars = 0
+    for msg in kwargs.get("messages") or []:
+        if isinstance(msg, dict):
+            chars += len(str(msg.get("content") or ""))
+    completion = kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return int(chars / CHARS_PER_TOKEN) + int(completion)
+
+
+def max_prompt_chars(model: str, completion_tokens: int = DEFAULT_COMPLETION_TOKENS,
+                     limits: Optional[Dict[str, Dict[str, int]]] = None) -> int:
+    """Quantos caracteres de mensagem cabem num pedido a ``model`` sem estourar o TPM.
+
+    Quem monta prompts com a base inteira (``ia.respond_query``) corta o
+    contexto por aqui antes de chamar, em vez de cair na recusa local de 413.
+    """
+    lim = (limits if limits is not None else _load_limits()).get(model, FALLBACK_LIMIT)
+    tpm = int(lim.get("tpm") or FALLBACK_LIMIT["tpm"])
+    return max(0, (tpm - int(completion_tokens)) * CHARS_PER_TOKEN)
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for attr in ("status_code", "status"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    resp = getattr(exc, "response", None)
+    code = getattr(resp, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _retryable(exc: Exception) -> bool:
+    code = _status_code(exc)
+    if code is not None:
+        return code == 429 or code >= 500
+    msg = str(exc).lower()
+    if "401" in msg or "invalid_api_key" in msg or "413" in msg or "request too large" in msg:
+        return False
+    return any(s in msg for s in ("429", "rate limit", "timeout", "timed out", "503", "502", "500", "overloaded"))
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class _ModelBudget:
+    def __init__(self, limit: Dict[str, int], clock: Callable[[], float]):
+        self.tpm = int(limit.get("tpm") or FALLBACK_LIMIT["tpm"])
+        self.requests = TokenBucket(int(limit.get("rpm") or FALLBACK_LIMIT["rpm"]), int(limit.get("rpm") or FALLBACK_LIMIT["rpm"]), clock)
+        self.tokens = TokenBucket(self.tpm, self.tpm, clock)
+        self.stats = {
+            "requisicoes": 0,
+            "tokens_estimados": 0,
+            "tokens_reais": 0,
+            "enfileiradas": 0,
+            "espera_ms": 0.0,
+            "recusas": 0,
+            "retries": 0,
+            "erros": 0,
+        }
+
+
+class RateLimitedClient:
+    """Mesma interface do ``Groq`` (``client.chat.completions.create``) com pacing."""
+
+    def __init__(self, inner: Any, *, limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 max_wait: float = MAX_WAIT_SECONDS, max_retries: int = MAX_RETRIES,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.inner = inner
+        self.limits = limits if limits is not None else _load_limits()
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._budgets: Dict[str, _ModelBudget] = {}
+        self.chat = _Chat(self)
+
+    def _budget(self, model: str) -> _ModelBudget:
+        with self._lock:
+            b = self._budgets.get(model)
+            if b is None:
+                b = _ModelBudget(self.limits.get(model, FALLBACK_LIMIT), self._clock)
+                self._budgets[model] = b
+            return b
+
+    def _reserve(self, model: str, budget: _ModelBudget, estimate: int) -> None:
+        if estimate > budget.tpm:
+            with self._lock:
+                budget.stats["recusas"] += 1
+            report_status("llm_client", "ERROR", stage="request_too_large", details={"model": model, "tokens_estimados": estimate, "tpm": budget.tpm})
+            raise LLMRequestTooLargeError(f"413 request too large: ~{estimate} tokens para limite de {budget.tpm} tokens per minute ({model})")
+        start = self._clock()
+        queued = False
+        while True:
+            with self._lock:
+                wait = max(budget.requests.wait_time(1), budget.tokens.wait_time(estimate))
+                if wait <= 0:
+                    budget.requests.take(1)
+                    budget.tokens.take(estimate)
+                    waited = self._clock() - start
+                    budget.stats["espera_ms"] += waited * 1000.0
+                    if queued:
+                        budget.stats["enfileiradas"] += 1
+                    return
+                if self._clock() - start + wait > self.max_wait:
+                    budget.stats["recusas"] += 1
+                    budget.stats["espera_ms"] += (self._clock() - start) * 1000.0
+                    break
+            queued = True
+            self._sleep(min(wait, 1.0))
+        report_status("llm_client", "ERROR", stage="rate_limited_local", details={"model": model, "tokens_estimados": estimate})
+        raise LLMRateLimitError(f"429 rate limit local: orçamento de {model} esgotado (espera > {self.max_wait:.0f}s)")
+
+    def _settle(self, budget: _ModelBudget, estimate: int, resposta: Any) -> None:
+        usage = getattr(resposta, "usage", None)
+        total = getattr(usage, "total_tokens", None) if usage is not None else None
+        with self._lock:
+            if isinstance(total, int) and total > 0:
+                budget.tokens.adjust(estimate - total)
+                budget.stats["tokens_reais"] += total
+
+    def create(self, **kwargs: Any) -> Any:
+        model = str(kwargs.get("model") or "")
+        budget = self._budget(model)
+        estimate = estimate_tokens(kwargs)
+        with self._lock:
+            budget.stats["requisicoes"] += 1
+            budget.stats["tokens_estimados"] += estimate
+        attempt = 0
+        while True:
+            self._reserve(model, budget, estimate)
+            try:
+                resposta = self.inner.chat.completions.create(**kwargs)
+            except Exception as e:
+                # a tentativa falhou: devolve a estimativa antes de reservar de novo
+                with self._lock:
+                    budget.tokens.adjust(estimate)
+                if attempt >= self.max_retries or not _retryable(e):
+                    with self._lock:
+                        budget.stats["erros"] += 1
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    # full jitter: uniforme entre 0 e o teto exponencial
+                    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+                attempt += 1
+                with self._lock:
+                    budget.stats["retries"] += 1
+                    budget.stats["espera_ms"] += delay * 1000.0
+                report_status("llm_client", "WARNING", stage="retry_backoff", details={"model": model, "tentativa": attempt, "espera_s": round(delay, 3), "error": str(e)[:200]})
+                self._sleep(delay)
+                continue
+            self._settle(budget, estimate, resposta)
+            return resposta
+
+    def metrics(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for model, b in self._budgets.items():
+                st = dict(b.stats)
+                st["espera_ms"] = round(st["espera_ms"], 1)
+                st["saldo_tokens"] = round(b.tokens.tokens, 1)
+                out[model] = st
+            return out
+
+
+class _Completions:
+    def __init__(self, owner: RateLimitedClient):
+        self._owner = owner
+
+    def create(self, **kwargs: Any) -> Any:
+        return self._owner.create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, owner: RateLimitedClient):
+        self.completions = _Completions(owner)
+
+
+def wrap(inner: Any) -> Optional[RateLimitedClient]:
+    if inner is None or isinstance(inner, RateLimitedClient):
+        return inner
+    return RateLimitedClient(inner)
+
+
+def metrics(client: Any) -> Dict[str, dict]:
+    return client.metrics() if isinstance(client, RateLimitedClient) else {}
@@ -7,6 +7,7 @@ Inicializa o sistema:
  - atualiza analises/avisos por identidade e por encomendas
  - inicia a UI via interfaceone.iniciar_interface_principal()
 """
+import atexit
 import os
 import time
 import json
@@ -15,6 +16,11 @@ import threading
 import traceback
 from collections import deque
 
+import persistence_writer
+import record_archive
+import record_store
+import snapshot_cache
+
 try:
     from runtime_status import report_status, report_log
 except Exception:
@@ -43,7 +49,8 @@ def _log(level: str, stage: str, message: str, **details):
 
 
 def ensure_file(path, template):
-    if not os.path.exists(path):
+    # no SQLite o JSON é só a origem da importação: quem vale é o repositório
+    if not record_store.uses_repository(path) and not os.path.exists(path):
         try:
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(template, f, ensure_ascii=False, indent=2)
@@ -51,15 +58,16 @@ def ensure_file(path, template):
         except OSError as e:
             _log("ERROR", "ensure_file_create_failed", "Falha ao criar arquivo", path=path, error=str(e))
     else:
+        if snapshot_cache.is_fresh(path, kind=dict):
+            # o cache só existe para um JSON decodificado com sucesso: nada a validar
+            return
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = record_store.load_document(path)
             if not isinstance(data, dict):
                 raise ValueError("conteúdo inválido")
-        except (OSError, ValueError, json.JSONDecodeError):
+        except (OSError, ValueError):
             try:
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump(template, f, ensure_ascii=False, indent=2)
+                record_store.save_document(path, dict(template), indent=2)
                 _log("OK", "ensure_file_recreated", f"Recriado (template aplicado): {path}", path=path)
             except OSError as e:
                 _log("ERROR", "ensure_file_recreate_failed", "Falha ao recriar arquivo", path=path, error=str(e))
@@ -73,67 +81,16 @@ def _identity_from_record(rec):
 
 
 def _get_last_record_identity(dadosend_path):
+    # ponteiro mantido na escrita (sidecar .tail.json / índice SQLite): O(1) após cada mudança;
+    # só varre o arquivo quando ele foi reescrito por fora do record_store
     try:
-        with open(dadosend_path, "r", encoding="utf-8") as f:
-            d = json.load(f)
+        last = record_store.latest_record(dadosend_path)
     except (OSError, json.JSONDecodeError):
         return None
-    regs = []
-    if isinstance(d, dict) and "registros" in d:
-        regs = d.get("registros") or []
-    elif isinstance(d, list):
-        regs = d
-    if not regs:
+    if not isinstance(last, dict):
         return None
-    def _safe_int_id(value):
-        try:
-            if value is None:
-                return None
-            if isinstance(value, bool):
-                return None
-            text = str(value).strip()
-            if not text:
-                return None
-            return int(text)
-        except (TypeError, ValueError):
-            return None
-
-    try:
-        regs_with_id = []
-        for r in regs:
-            rid = _safe_int_id(r.get("ID"))
-            if rid is not None:
-                regs_with_id.append((r, rid))
-        if regs_with_id:
-            last = max(regs_with_id, key=lambda item: item[1])[0]
-            return _identity_from_record(last)
-    except Exception:
-        pass
-
-    def _dt_key(rec):
-        s = rec.get("DATA_HORA") or rec.get("data_hora") or ""
-        try:
-            from datetime import datetime
-            for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M"):
-                try:
-                    return datetime.strptime(s, fmt)
-                except ValueError:
-                    pass
-        except Exception:
-            pass
-        return None
-
-    try:
-        regs_with_dt = [(r, _dt_key(r)) for r in regs]
-        regs_with_dt = [t for t in regs_with_dt if t[1] is not None]
-        if regs_with_dt:
-            last = max(regs_with_dt, key=lambda t: t[1])[0]
-            return _identity_from_record(last)
-    except Exception:
-        pass
-
     try:
-        return _identity_from_record(regs[-1])
+        return _identity_from_record(last)
     except Exception:
         return None
 
@@ -142,12 +99,31 @@ def _file_fingerprint(path):
     """
     Gera uma assinatura estável do conteúdo para ignorar mudanças apenas de mtime.
     """
+    if record_store.uses_repository(path):
+        # no SQLite o JSON fica parado: a revisão da coleção é a assinatura
+        return str(record_store.change_token(path))
     try:
         with open(path, "rb") as f:
             content = f.read()
-        return hashlib.sha1(content).hexdigest()
+        digest = hashlib.sha1(content)
     except OSError:
         return None
+    # no modo journal os registros novos chegam no .journal.jsonl, não no snapshot
+    try:
+        with open(record_store.journal_path(path), "rb") as f:
+            digest.update(f.read())
+    except OSError:
+        pass
+    return digest.hexdigest()
+
+
+def _change_marker(path):
+    """Marcador barato de mudança: (mtime do JSON, change_token); no SQLite só a revisão. None se não houver dados."""
+    if record_store.uses_repository(path):
+        return ("sqlite", record_store.change_token(path))
+    if not os.path.exists(path):
+        return None
+    return (os.path.getmtime(path), record_store.change_token(path))
 
 
 def _process_dadosend_change(dadosend_path, analises_mod, avisos_mod):
@@ -218,8 +194,12 @@ def watcher_thread(dadosend_path, analises_mod, avisos_mod, poll=POLL_INTERVAL,
     while True:
         now = time.time()
         try:
-            if os.path.exists(dadosend_path):
-                m_dados = os.path.getmtime(dadosend_path)
+            # virada de mês: move meses fechados para o histórico (no-op fora do opt-in)
+            for path in (dadosend_path, ENCOMENDASEND):
+                record_archive.maybe_archive(path)
+
+            m_dados = _change_marker(dadosend_path)
+            if m_dados is not None:
                 if last_mtime_dadosend is None:
                     last_mtime_dadosend = m_dados
                     last_fp_dadosend = _file_fingerprint(dadosend_path)
@@ -230,8 +210,8 @@ def watcher_thread(dadosend_path, analises_mod, avisos_mod, poll=POLL_INTERVAL,
                         last_fp_dadosend = fp_dados
                         pending_map["dadosend"] = now
 
-            if os.path.exists(ENCOMENDASEND):
-                m_encomendas = os.path.getmtime(ENCOMENDASEND)
+            m_encomendas = _change_marker(ENCOMENDASEND)
+            if m_encomendas is not None:
                 if last_mtime_encomendas is None:
                     last_mtime_encomendas = m_encomendas
                     last_fp_encomendas = _file_fingerprint(ENCOMENDASEND)
@@ -272,6 +252,15 @@ def initialize_system(start_watcher=True):
             _log("OK", "dadosend_created", "Criado dadosend.json vazio.")
         except OSError:
             _log("ERROR", "dadosend_create_failed", "Falha ao criar dadosend.json", error=traceback.format_exc())
+    try:
+        if record_store.compact(DADOSEND):
+            _log("OK", "journal_compacted", "Journal de dadosend.json incorporado ao snapshot.")
+    except Exception:
+        _log("ERROR", "journal_compact_failed", "Falha ao compactar journal de dadosend.json", error=traceback.format_exc())
+    for path in (DADOSEND, ENCOMENDASEND):
+        moved = record_archive.maybe_archive(path)
+        if moved:
+            _log("OK", "history_archived", f"{moved} registros de meses fechados movidos para o histórico", path=path)
 
     try:
         import analises
@@ -304,6 +293,10 @@ def initialize_system(start_watcher=True):
 
 def main():
     initialize_system(start_watcher=True)
+    # a partir daqui analises/avisos são gravados pelo escritor coalescente;
+    # o flush síncrono no encerramento garante que o último estado vá para o disco
+    persistence_writer.start()
+    atexit.register(persistence_writer.stop)
     try:
         import interfaceone
         _log("STARTED", "ui_starting", "Inicializando interface grafica (interfaceone)...")
@@ -311,6 +304,8 @@ def main():
     except Exception:
         _log("ERROR", "ui_start_failed", "Falha ao iniciar interfaceone", error=traceback.format_exc())
         raise
+    finally:
+        persistence_writer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Escritor de persistência em segundo plano que coalesce regravações do mesmo arquivo.
+
+analises.json e avisos.json são derivados e chegam a ser reescritos várias
+vezes por segundo (atualização de encomenda, watcher do main e watcher da
+interfaceone reconstruindo a mesma coisa). Com o escritor iniciado
+(``start()``, feito pelo main), ``submit`` apenas registra a intenção de
+gravar: cada arquivo guarda só o snapshot mais recente e a thread grava a cada
+``FLUSH_INTERVAL_MS`` (``ACCESS_PERSIST_INTERVAL_MS``, padrão 250 ms),
+descartando os snapshots superados.
+
+- Sem o escritor iniciado (testes, scripts avulsos), ``submit`` grava na hora.
+- ``pending_snapshot`` dá leitura-das-próprias-escritas a quem ler o arquivo
+  antes do flush.
+- ``flush()`` grava tudo de forma síncrona (encerramento; registrado no atexit).
+- ``discard(path)`` é chamado quando alguém grava o arquivo diretamente, para que
+  um snapshot antigo da fila não sobrescreva a escrita mais nova.
+
+dadosend.json não passa por aqui: é a fonte de verdade e precisa estar durável
+antes de marcar a entrada como processada (group commit do ia.processar).
+"""
+from __future__ import annotations
+
+import copy
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+try:
+    FLUSH_INTERVAL_MS = max(10, int(os.getenv("ACCESS_PERSIST_INTERVAL_MS", "250")))
+except ValueError:
+    FLUSH_INTERVAL_MS = 250
+
+WriteFn = Callable[[str, Any], None]
+
+
+class PersistenceWriter:
+    def __init__(self, interval_ms: int = FLUSH_INTERVAL_MS):
+        self.interval = max(0.01, interval_ms / 1000.0)
+        self._cond = threading.Condition()
+        self._io_lock = threading.RLock()
+        self._pending: Dict[str, Tuple[str, Any, WriteFn]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self.stats = {"submetidos": 0, "gravados": 0, "coalescidos": 0, "falhas": 0}
+
+    # ---------- ciclo de vida ----------
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._cond:
+            if self.running():
+                return
+            self._stop = False
+            self._thread = threading.Thread(target=self._loop, name="persistence-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        t = self._thread
+        if t is not None:
+            t.join(timeout)
+        self._thread = None
+        self.flush()
+
+    # ---------- escrita ----------
+    def submit(self, path: str, obj: Any, write_fn: WriteFn) -> None:
+        """Agenda a gravação de ``obj`` (o chamador cede o objeto; não o altere depois)."""
+        if not self.running():
+            write_fn(path, obj)
+            return
+        key = os.path.abspath(path)
+        with self._cond:
+            self.stats["submetidos"] += 1
+            if key in self._pending:
+                self.stats["coalescidos"] += 1
+            self._pending[key] = (path, obj, write_fn)
+            self._cond.notify_all()
+
+    def pending_snapshot(self, path: str) -> Any:
+        """Cópia do snapshot ainda não gravado de ``path`` (ou None)."""
+        with self._cond:
+            item = self._pending.get(os.path.abspath(path))
+        return copy.deepcopy(item[1]) if item else None
+
+    def discard(self, path: str) -> bool:
+        """Descarta o snapshot pendente; espera um flush em curso para não ser sobrescrito por ele."""
+        with self._io_lock:
+            with self._cond:
+                return self._pending.pop(os.path.abspath(path), None) is not None
+
+    def flush(self) -> int:
+        """Grava de forma síncrona tudo o que estiver pendente. Retorna quantos arquivos gravou."""
+        with self._io_lock:
+            with self._cond:
+                batch = list(self._pending.values())
+                self._pending.clear()
+            written = 0
+            for path, obj, write_fn in batch:
+                try:
+                    write_fn(path, obj)
+                    written += 1
+                except Exception as e:
+                    self.stats["falhas"] += 1
+                    report_status("persistencia", "ERROR", stage="write_failed", details={"path": path, "error": str(e)})
+                    traceback.print_exc()
+                    self._requeue(path, obj, write_fn)
+            self.stats["gravados"] += written
+            return written
+
+    def _requeue(self, path: str, obj: Any, write_fn: WriteFn) -> None:
+        # tenta de novo no próximo ciclo, a menos que já exista um snapshot mais novo
+        with self._cond:
+            self._pending.setdefault(os.path.abspath(path), (path, obj, write_fn))
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+            # janela de coalescência: escritas que chegarem agora substituem as anteriores
+            time.sleep(self.interval)
+            self.flush()
+
+
+_WRITER = PersistenceWriter()
+
+
+def writer() -> PersistenceWriter:
+    return _WRITER
+
+
+def start() -> None:
+    _WRITER.start()
+
+
+def stop(timeout: Optional[float] = 5.0) -> None:
+    _WRITER.stop(timeout)
+
+
+def submit(path: str, obj: Any, write_fn: WriteFn) -> None:
+    _WRITER.submit(path, obj, write_fn)
+
+
+def pending_snapshot(path: str) -> Any:
+    return _WRITER.pending_snapshot(path)
+
+
+def discard(path: str) -> bool:
+    return _WRITER.discard(path)
+
+
+def flush() -> int:
+    return _WRITER.flush()
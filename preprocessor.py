@@ -1,10 +1,17 @@
 # preprocessor.py (corrigido)
 # Funções para extrair nome, placa, bloco, apartamento, modelos, cor e status
-# Exporta: extrair_tudo_consumo, VEICULOS_MAP, remover_status, detectar_status
+# Exporta: extrair_tudo_consumo, extrair_tudo_consumo_many, pontuar_confianca, VEICULOS_MAP, remover_status, detectar_status, etiquetar_tokens
 
+import itertools
 import re
+import time
 import unicodedata
-from typing import Dict, Any, List, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from fuzzy_index import DeleteIndex
 
 # mapa simples de modelos -> abreviações/comuns (aumente conforme necessário)
 VEICULOS_MAP = {
@@ -264,6 +271,12 @@ for k,v in _STATUS_MAP.items():
     for w in v:
         _STATUS_WORDS.add(w.upper())
 
+# alias -> status canônico (primeira chave de _STATUS_MAP que contém o alias)
+_STATUS_CANONICO = {}
+for k,v in _STATUS_MAP.items():
+    for w in v:
+        _STATUS_CANONICO.setdefault(w.upper(), k)
+
 _NOMES = {
     "JOSÉ": ["JOSE", "JOZE", "JOZEH", "JOSEH", "JSE", "JOE", "JOS"],
     "JOÃO": ["JOAO", "JOAUM", "JOAM", "JAO", "JAA", "JOA"],
@@ -532,24 +545,39 @@ def detectar_status(texto: str) -> Tuple[str, str]:
     """
     if not texto:
         return "DESCONHECIDO", texto or ""
-    toks = [t.upper() for t in tokens(texto)]
+    found, cleaned = _varrer_status(texto)
+    return found or "DESCONHECIDO", cleaned
+
+# aliases de status numa só alternância, os mais longos primeiro: "PRESTADOR DE SERVIÇO"
+# sai inteiro em vez de sobrar o "DE" (antes dependia da ordem do set)
+_STATUS_RE = re.compile(
+    r"\b(" + "|".join(re.escape(w) for w in sorted(_STATUS_WORDS, key=lambda w: (-len(w), w))) + r")\b",
+    re.IGNORECASE,
+)
+_TOKEN_CHAR_RE = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9\-]")
+_ESPACOS_RE = re.compile(r"\s+")
+
+def _varrer_status(texto: str) -> Tuple[Optional[str], str]:
+    """Uma varredura de _STATUS_RE: (status canônico do primeiro alias, texto sem os aliases).
+
+    Só conta como status o alias que é um token inteiro (não "MOR" de "MOR-10"), mas
+    todo alias casado por palavra sai do texto, como antes.
+    """
     found = None
-    for t in toks:
-        if t in _STATUS_WORDS:
-            # map to canonical
-            for k, aliases in _STATUS_MAP.items():
-                if t in [a.upper() for a in aliases]:
-                    found = k
-                    break
-            if found:
-                break
-    if not found:
-        found = "DESCONHECIDO"
-    # remove status words from text (first occurrences)
-    pattern = r"\b(" + "|".join(re.escape(w) for w in _STATUS_WORDS) + r")\b"
-    cleaned = re.sub(pattern, "", texto, flags=re.IGNORECASE).strip()
-    cleaned = re.sub(r"\s+", " ", cleaned)
-    return found, cleaned
+    partes = []
+    pos = 0
+    for m in _STATUS_RE.finditer(texto):
+        inicio, fim = m.span()
+        if found is None and not (
+            (inicio > 0 and _TOKEN_CHAR_RE.match(texto, inicio - 1))
+            or (fim < len(texto) and _TOKEN_CHAR_RE.match(texto, fim))
+        ):
+            found = _STATUS_CANONICO.get(m.group(0).upper())
+        partes.append(texto[pos:inicio])
+        pos = fim
+    partes.append(texto[pos:])
+    cleaned = "".join(partes).strip()
+    return found, _ESPACOS_RE.sub(" ", cleaned)
 
 def remover_status(texto: str) -> str:
     st, cleaned = detectar_status(texto)
@@ -560,6 +588,87 @@ def remover_status(texto: str) -> str:
 def _normalize_token(tok: str) -> str:
     return re.sub(r"[^A-Z0-9]", "", str(tok or "").upper())
 
+# ---------- índice de modelos (montado uma vez a partir de VEICULOS_MAP) ----------
+
+_WORD_RUN_RE = re.compile(r"\w+")
+
+def _build_model_index():
+    """Tabelas de consulta de modelos; a ordem de VEICULOS_MAP decide os empates,
+    como nos laços que elas substituem."""
+    por_variante: Dict[str, List[str]] = {}       # "ONX" -> ["ONIX"] (todas as chaves, em ordem)
+    por_normal: Dict[str, str] = {}               # _normalize_token(variante) -> primeira chave
+    padroes: Dict[str, Tuple[int, str]] = {}      # variante em maiúsculas -> (ordem, chave)
+    irregulares: List[Tuple[int, str, Any]] = []  # variantes que não começam/terminam em \w
+    normais_chave: List[Tuple[str, str]] = []
+    normais_todos: List[Tuple[str, str]] = []
+    max_palavras = 1
+    for ordem, (key, abrevs) in enumerate(VEICULOS_MAP.items()):
+        ku = key.upper()
+        kn = _normalize_token(key)
+        normais_chave.append((kn, ku))
+        for i, variante in enumerate([key, *abrevs]):
+            vu = str(variante).upper()
+            chaves = por_variante.setdefault(vu, [])
+            if ku not in chaves:
+                chaves.append(ku)
+            vn = kn if i == 0 else _normalize_token(variante)
+            por_normal.setdefault(vn, ku)
+            normais_todos.append((vn, ku))
+            if re.fullmatch(r"\w(?:.*\w)?", vu, flags=re.S):
+                padroes.setdefault(vu, (ordem, key))
+                max_palavras = max(max_palavras, len(_WORD_RUN_RE.findall(vu)))
+            else:
+                irregulares.append((ordem, key, re.compile(rf"\b{re.escape(vu)}\b")))
+    return (
+        MappingProxyType({k: tuple(v) for k, v in por_variante.items()}),
+        MappingProxyType(por_normal),
+        MappingProxyType(padroes),
+        tuple(irregulares),
+        tuple(normais_chave),
+        tuple(normais_todos),
+        max_palavras,
+    )
+
+(
+    _MODELO_POR_VARIANTE,
+    _MODELO_POR_NORMAL,
+    _MODELO_PADROES,
+    _MODELO_IRREGULARES,
+    _MODELO_NORMAIS_CHAVE,
+    _MODELO_NORMAIS_TODOS,
+    _MODELO_MAX_PALAVRAS,
+) = _build_model_index()
+
+# busca aproximada (distância ≤ 2) sobre as mesmas formas normalizadas, sem varrer o mapa
+_MODELO_FUZZY = DeleteIndex(_MODELO_NORMAIS_TODOS, max_distance=2)
+
+# chaves + abreviações sem repetição, na ordem do mapa (candidatos do fuzzy do ia)
+MODELO_VARIANTES: Tuple[str, ...] = tuple(_MODELO_POR_VARIANTE)
+
+def modelos_da_variante(tok: str) -> Tuple[str, ...]:
+    """Chaves canônicas (maiúsculas) das quais ``tok`` é a chave ou uma abreviação."""
+    return _MODELO_POR_VARIANTE.get(str(tok or "").upper(), ())
+
+def detectar_modelo_canonico(texto: str) -> Optional[str]:
+    """Chave de VEICULOS_MAP cuja chave/abreviação aparece como palavra(s) inteira(s) em
+    ``texto``; com várias, vale a primeira na ordem do mapa.
+
+    Equivale a testar ``\\bVARIANTE\\b`` variante por variante, mas só consulta as
+    sequências de até ``_MODELO_MAX_PALAVRAS`` palavras consecutivas do texto.
+    """
+    s = str(texto or "").upper()
+    runs = [(m.start(), m.end()) for m in _WORD_RUN_RE.finditer(s)]
+    best = None
+    for j, (inicio, _fim) in enumerate(runs):
+        for k in range(j, min(len(runs), j + _MODELO_MAX_PALAVRAS)):
+            hit = _MODELO_PADROES.get(s[inicio:runs[k][1]])
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = hit
+    for ordem, key, rx in _MODELO_IRREGULARES:
+        if (best is None or ordem < best[0]) and rx.search(s):
+            best = (ordem, key)
+    return best[1] if best is not None else None
+
 def _edit_distance(a: str, b: str) -> int:
     # classic Levenshtein (efficient enough for short tokens)
     a = a or ""
@@ -588,104 +697,104 @@ def _map_to_canonical_model(candidate: str) -> str:
         return ""
     cand_norm = _normalize_token(candidate)
     # exact matches
-    for key, abrevs in VEICULOS_MAP.items():
-        if cand_norm == _normalize_token(key):
-            return key.upper()
-        for a in abrevs:
-            if cand_norm == _normalize_token(a):
-                return key.upper()
+    exato = _MODELO_POR_NORMAL.get(cand_norm)
+    if exato is not None:
+        return exato
     # substring / startswith (helps JETA -> JETTA)
-    for key, abrevs in VEICULOS_MAP.items():
-        kn = _normalize_token(key)
+    for kn, key in _MODELO_NORMAIS_CHAVE:
         if cand_norm in kn or kn in cand_norm:
-            return key.upper()
-    # edit distance <=1
-    cand_short = cand_norm
-    best_key = None
-    best_dist = None
-    for key, abrevs in VEICULOS_MAP.items():
-        kn = _normalize_token(key)
-        d = _edit_distance(cand_short, kn)
-        if best_dist is None or d < best_dist:
-            best_dist = d; best_key = key
-        for a in abrevs:
-            an = _normalize_token(a)
-            d2 = _edit_distance(cand_short, an)
-            if best_dist is None or d2 < best_dist:
-                best_dist = d2; best_key = key
-    if best_dist is not None and best_dist <= 1:
-        return best_key.upper()
+            return key
+    # edit distance <=1 (índice de deleções; empate fica com o primeiro na ordem do mapa)
+    hit = _MODELO_FUZZY.nearest(cand_norm, 1)
+    if hit is not None:
+        return hit[2].upper()
     return candidate.upper()
 
-# ---------- model/color/block/ap helpers already used by original code ----------
-
-def _find_model_candidates(toks_up: List[str]) -> List[str]:
-    found = []
-    # direct detection via VEICULOS_MAP keys/abrev
-    for i, tok in enumerate(toks_up):
-        for modelo_key, abrevs in VEICULOS_MAP.items():
-            if tok.upper() == modelo_key.upper() or tok.upper() in [a.upper() for a in abrevs]:
-                found.append(modelo_key.upper())
-    # also try to look near plate: if token previous to plate is alphabetic and length>2, treat as model
-    for i, tok in enumerate(toks_up):
-        if _is_plate(tok):
-            if i-1 >= 0:
-                cand = toks_up[i-1]
-                if cand.isalpha() and len(cand) >= 2 and cand.upper() not in _CORES_SET and cand.upper() not in _STATUS_WORDS:
-                    found.append(cand.upper().title())
-            # also check next tokens
-            if i+1 < len(toks_up):
-                cand2 = toks_up[i+1]
-                if cand2.isalpha() and len(cand2) >= 2 and cand2.upper() not in _CORES_SET and cand2.upper() not in _STATUS_WORDS:
-                    found.append(cand2.upper().title())
-    # dedupe preserving order
-    out = []
-    for x in found:
-        if x not in out:
-            out.append(x)
-    return out
+# ---------- etiquetador de tokens (uma passada, tabelas pré-compiladas) ----------
 
-def _find_color_candidates(toks_up: List[str]) -> List[str]:
-    out = []
-    for t in toks_up:
-        if t.upper() in _CORES_SET:
-            out.append(t.upper())
-    return out
+TAG_BLOCO = "BLOCO"
+TAG_APARTAMENTO = "APARTAMENTO"
+TAG_STATUS = "STATUS"
+TAG_COR = "COR"
+TAG_MODELO = "MODELO"
+TAG_PLACA = "PLACA"
+TAG_NOME = "NOME"
+TAG_OUTRO = "OUTRO"
+
+# etiquetas que tiram o token da disputa pelo nome (a placa conta só a primeira)
+_TAGS_ESTRUTURAIS = frozenset((TAG_BLOCO, TAG_APARTAMENTO, TAG_STATUS, TAG_COR, TAG_MODELO))
 
-def _find_block_ap(toks_up: List[str]) -> (str, str):
-    bloco = ""
-    apt = ""
-    for i, t in enumerate(toks_up):
-        # BL10, BL-10 patterns
-        m = re.match(r"^BL(?:OCO)?[-:]?(\d+)$", t, flags=re.IGNORECASE)
+_BLOCO_RE = re.compile(r"^BL(?:OCO)?[-:]?(\d+)$", re.IGNORECASE)
+_AP_RE = re.compile(r"^AP(?:T|ARTAMENTO)?[-:]?(\d+)$", re.IGNORECASE)
+_AP_PALAVRAS = frozenset(("AP", "APT", "APTO", "APARTAMENTO"))
+_NOME_LETRA_RE = re.compile(r"[A-ZÀ-ÖØ-öø-ÿ]")
+_DIGITO_RE = re.compile(r"\d")
+_NOME_PARTICULAS = frozenset(("DO", "DA", "DE", "DOS", "DAS", "E", "O", "A", "SR", "SRA"))
+
+
+class _Token(NamedTuple):
+    tag: str
+    placa: bool
+    bloco: Optional[str]        # número do bloco no próprio token (BL10, BLOCO-3)
+    ap: Optional[str]           # número do apartamento no próprio token (AP101, APTO:7)
+    bloco_palavra: bool         # "BLOCO" seguido do número no próximo token
+    ap_palavra: bool            # "AP"/"APTO"/... seguido do número no próximo token
+    status: bool
+    cor: bool
+    modelos: Tuple[str, ...]    # chaves de VEICULOS_MAP das quais o token é variante
+    alfa: bool
+    norm: str
+
+
+def _classificar_token(t: str) -> _Token:
+    """Etiqueta um token já em maiúsculas; cada campo equivale a um dos testes antigos."""
+    bloco = ap = None
+    if t.startswith("BL"):
+        m = _BLOCO_RE.match(t)
         if m:
             bloco = m.group(1)
-            continue
-        if t.startswith("BL") and t[2:].isdigit():
+        elif t[2:].isdigit():
             bloco = t[2:]
-            continue
-        if t == "BLOCO":
-            if i+1 < len(toks_up) and toks_up[i+1].isdigit():
-                bloco = toks_up[i+1]
-        if t in ("AP","APT","APTO","APARTAMENTO"):
-            if i+1 < len(toks_up) and toks_up[i+1].isdigit():
-                apt = toks_up[i+1]
-                continue
-        m2 = re.match(r"^AP(?:T|ARTAMENTO)?[-:]?(\d+)$", t, flags=re.IGNORECASE)
-        if m2:
-            apt = m2.group(1)
-            continue
-        if t.startswith("AP") and t[2:].isdigit():
-            apt = t[2:]
-            continue
-    return bloco or "", apt or ""
-
-def _extract_plate_and_indices(toks: List[str]) -> (str, int):
-    # return (plate, index) of first found plate, else ("", -1)
-    for i, t in enumerate(toks):
-        if _is_plate(t):
-            return t.upper(), i
-    return "", -1
+    elif t.startswith("AP"):
+        m = _AP_RE.match(t)
+        if m:
+            ap = m.group(1)
+        elif t[2:].isdigit():
+            ap = t[2:]
+    bloco_palavra = t == "BLOCO"
+    ap_palavra = t in _AP_PALAVRAS
+    status = t in _STATUS_WORDS
+    cor = t in _CORES_SET
+    modelos = _MODELO_POR_VARIANTE.get(t, ())
+    placa = 5 <= len(t) <= 8 and _is_plate(t)
+
+    if bloco is not None or bloco_palavra:
+        tag = TAG_BLOCO
+    elif ap is not None or ap_palavra:
+        tag = TAG_APARTAMENTO
+    elif status:
+        tag = TAG_STATUS
+    elif cor:
+        tag = TAG_COR
+    elif modelos:
+        tag = TAG_MODELO
+    elif placa:
+        tag = TAG_PLACA
+    elif _NOME_LETRA_RE.search(t) and not _DIGITO_RE.search(t):
+        tag = TAG_NOME
+    else:
+        tag = TAG_OUTRO
+    return _Token(tag, placa, bloco, ap, bloco_palavra, ap_palavra, status, cor, modelos, t.isalpha(), _normalize_token(t))
+
+
+def etiquetar_tokens(texto: str) -> List[Tuple[str, str]]:
+    """Lista ``(token, etiqueta)`` do texto, com as etiquetas TAG_* usadas por extrair_tudo_consumo."""
+    return [(t, _classificar_token(t.upper()).tag) for t in tokens(texto)]
+
+
+def _vizinho_modelo(info: _Token, t: str, *, minimo: int = 1) -> bool:
+    # token ao lado da placa que pode ser um modelo escrito livremente (ex: JETA)
+    return info.alfa and len(t) >= minimo and not info.cor and not info.status
 
 # =========================
 # função principal: extrair_tudo_consumo
@@ -703,133 +812,117 @@ def extrair_tudo_consumo(texto: str) -> Dict[str, Any]:
     - TEXTO_LIMPO (texto sem status)
     Retorna dicionário com keys (uppercase):
       { "TEXTO_LIMPO","COR","PLACA","BLOCO","APARTAMENTO","MODELOS","NOME_RAW","STATUS" }
+
+    O texto é tokenizado uma vez e cada token recebe uma etiqueta (_classificar_token);
+    os campos saem de uma única passada sobre as etiquetas. Para muitos textos use
+    extrair_tudo_consumo_many (ou um ExtratorLote), que reaproveita etiquetas e modelos.
     """
+    return _extrair(texto, None)
+
+def _extrair(texto: str, lote: Optional["ExtratorLote"]) -> Dict[str, Any]:
+    classificar = lote.etiqueta if lote is not None else _classificar_token
+    mapear = lote.canonico if lote is not None else _map_to_canonical_model
     original = (texto or "").strip()
     toks = tokens(original)
     toks_up = [t.upper() for t in toks]
+    infos = [classificar(t) for t in toks_up]
+    n = len(toks_up)
 
-    status, texto_sem_status = detectar_status(original)
-    # recompute tokens without status words for some heuristics
-    toks_ns = tokens(texto_sem_status)
-    toks_ns_up = [t.upper() for t in toks_ns]
-
-    placa, plate_idx = _extract_plate_and_indices(toks_up)
+    placa, plate_idx = "", -1
+    bloco = apt = cor = ""
+    modelos = []          # variantes diretas, na ordem dos tokens
+    perto_da_placa = []   # candidatos livres vizinhos de qualquer placa
+    for i, (t, info) in enumerate(zip(toks_up, infos)):
+        if info.cor and not cor:
+            cor = t
+        modelos.extend(info.modelos)
+        if info.placa:
+            if plate_idx < 0:
+                placa, plate_idx = t, i
+            if i > 0 and _vizinho_modelo(infos[i - 1], toks_up[i - 1], minimo=2):
+                perto_da_placa.append(toks_up[i - 1].title())
+            if i + 1 < n and _vizinho_modelo(infos[i + 1], toks_up[i + 1], minimo=2):
+                perto_da_placa.append(toks_up[i + 1].title())
+        # bloco/apartamento: vale a última ocorrência
+        if info.bloco is not None:
+            bloco = info.bloco
+        elif info.bloco_palavra and i + 1 < n and toks_up[i + 1].isdigit():
+            bloco = toks_up[i + 1]
+        elif info.ap_palavra and i + 1 < n and toks_up[i + 1].isdigit():
+            apt = toks_up[i + 1]
+        elif info.ap is not None:
+            apt = info.ap
 
-    bloco, apt = _find_block_ap(toks_up)
+    status, texto_sem_status = _varrer_status(original) if original else (None, "")
 
-    modelos = _find_model_candidates(toks_up)
-    # normalize/map modelos to canonical keys when possible and record their token indices to exclude from name
+    # normalize/map modelos to canonical keys when possible
     modelos_mapped = []
-    modelo_indices = set()
-    if modelos:
-        # modelos may be strings (from map keys) or heuristics (like 'JETA')
-        for cand in modelos:
-            canon = _map_to_canonical_model(str(cand))
-            if canon and canon not in modelos_mapped:
-                modelos_mapped.append(canon)
-    else:
-        modelos_mapped = []
+    for cand in dict.fromkeys(modelos + perto_da_placa):
+        canon = mapear(str(cand))
+        if canon and canon not in modelos_mapped:
+            modelos_mapped.append(canon)
 
     # ALSO, try to find model candidates near plate (again) and map them
     if plate_idx >= 0:
         # check previous token
         if plate_idx - 1 >= 0:
-            p = toks_up[plate_idx - 1]
-            if p.isalpha() and p.upper() not in _CORES_SET and p.upper() not in _STATUS_WORDS:
-                cand = _map_to_canonical_model(p)
+            p, pinfo = toks_up[plate_idx - 1], infos[plate_idx - 1]
+            if _vizinho_modelo(pinfo, p):
+                cand = mapear(p)
                 if cand and cand not in modelos_mapped:
                     modelos_mapped.insert(0, cand)
             # se o token anterior é cor, tente o anterior a ele (ex: JETA PRETO FEU3C84)
-            if p.upper() in _CORES_SET and plate_idx - 2 >= 0:
-                p_prev = toks_up[plate_idx - 2]
-                if p_prev.isalpha() and p_prev.upper() not in _STATUS_WORDS:
-                    cand = _map_to_canonical_model(p_prev)
+            if pinfo.cor and plate_idx - 2 >= 0:
+                p_prev, prev_info = toks_up[plate_idx - 2], infos[plate_idx - 2]
+                if prev_info.alfa and not prev_info.status:
+                    cand = mapear(p_prev)
                     if cand and cand not in modelos_mapped:
                         modelos_mapped.insert(0, cand)
         # check next token
-        if plate_idx + 1 < len(toks_up):
-            p2 = toks_up[plate_idx + 1]
-            if p2.isalpha() and p2.upper() not in _CORES_SET and p2.upper() not in _STATUS_WORDS:
-                cand = _map_to_canonical_model(p2)
+        if plate_idx + 1 < n:
+            p2, p2info = toks_up[plate_idx + 1], infos[plate_idx + 1]
+            if _vizinho_modelo(p2info, p2):
+                cand = mapear(p2)
                 if cand and cand not in modelos_mapped:
                     modelos_mapped.append(cand)
             # se o token seguinte é cor, tente o próximo a ele
-            if p2.upper() in _CORES_SET and plate_idx + 2 < len(toks_up):
-                p_next = toks_up[plate_idx + 2]
-                if p_next.isalpha() and p_next.upper() not in _STATUS_WORDS:
-                    cand = _map_to_canonical_model(p_next)
+            if p2info.cor and plate_idx + 2 < n:
+                p_next, next_info = toks_up[plate_idx + 2], infos[plate_idx + 2]
+                if next_info.alfa and not next_info.status:
+                    cand = mapear(p_next)
                     if cand and cand not in modelos_mapped:
                         modelos_mapped.append(cand)
 
-    # dedupe modelos_mapped preserve order
-    modelos_final = []
-    for m in modelos_mapped:
-        if m and m not in modelos_final:
-            modelos_final.append(m)
-
-    # find indices of tokens that correspond to model candidates (either exact match or normalized match)
-    for i, t in enumerate(toks_up):
-        tn = _normalize_token(t)
-        for m in modelos_final:
-            if tn == _normalize_token(m) or tn == _normalize_token(m[:4]) or m.upper().startswith(tn) or tn.startswith(_normalize_token(m)):
-                modelo_indices.add(i)
-
-    cores = _find_color_candidates(toks_up)
-    cor = cores[0] if cores else ""
-
-    # Name extraction: choose tokens that are alphabetic and not identified as other fields
-    marked_indices = set()
-    # mark plate index
-    if plate_idx >= 0:
-        marked_indices.add(plate_idx)
-    # mark block/ap tokens indices
-    for i,t in enumerate(toks_up):
-        if re.match(r"^BL(?:OCO)?[-:]?\d+$", t) or (t.startswith("BL") and t[2:].isdigit()) or t=="BLOCO":
-            marked_indices.add(i)
-        if re.match(r"^AP(?:T|ARTAMENTO)?[-:]?\d+$", t) or (t.startswith("AP") and t[2:].isdigit()) or t in ("AP","APT","APTO","APARTAMENTO"):
-            marked_indices.add(i)
-    # mark status word indices and color/model tokens
-    for i,t in enumerate(toks_up):
-        if t in _STATUS_WORDS:
-            marked_indices.add(i)
-        if t in _CORES_SET:
-            marked_indices.add(i)
-        for modelo_key, abrevs in VEICULOS_MAP.items():
-            if t == modelo_key.upper() or t in [a.upper() for a in abrevs]:
-                marked_indices.add(i)
-    # mark heuristic-detected model indices as well
-    marked_indices.update(modelo_indices)
-
-    # candidate name tokens (alphabetic, not marked)
+    modelos_final = [m for m in modelos_mapped if m]
+    chaves_modelo = [(_normalize_token(m), _normalize_token(m[:4]), m.upper()) for m in modelos_final]
+
+    # Name extraction: tokens tagged NOME that were not claimed by a model/the plate
+    marked_indices = []
     candidate_name_tokens = []
-    for i,t in enumerate(toks_up):
-        if i in marked_indices: continue
-        # token should contain alphabetic characters
-        if re.search(r"[A-ZÀ-ÖØ-öø-ÿ]", t) and not re.search(r"\d", t):
-            candidate_name_tokens.append((i, t))
+    for i, info in enumerate(infos):
+        tn = info.norm
+        marcado = (
+            i == plate_idx
+            or info.tag in _TAGS_ESTRUTURAIS
+            or any(tn == mn or tn == m4 or mu.startswith(tn) or tn.startswith(mn) for mn, m4, mu in chaves_modelo)
+        )
+        if marcado:
+            marked_indices.append(i)
+        elif info.tag == TAG_NOME:
+            candidate_name_tokens.append(toks_up[i])
 
-    # Build name_raw: choose contiguous sequence of up to 3 candidate tokens with likely person name
+    # Build name_raw: up to 3 candidate tokens, skipping prepositions/particles
     name_raw = ""
     if candidate_name_tokens:
-        seq = [t for i,t in candidate_name_tokens]
-        # filter out common prepositions/particles
-        stopwords = set(["DO","DA","DE","DOS","DAS","E","O","A","SR","SRA"])
-        cleaned_seq = [t for t in seq if t.upper() not in stopwords]
+        cleaned_seq = [t for t in candidate_name_tokens if t not in _NOME_PARTICULAS]
         if cleaned_seq:
-            top = cleaned_seq[:3]
-            name_raw = " ".join([x.title() for x in top])
+            name_raw = " ".join([x.title() for x in cleaned_seq[:3]])
         else:
-            name_raw = seq[0].title()
-    else:
-        name_raw = ""
+            name_raw = candidate_name_tokens[0].title()
 
     # Fallback: if there's a 'name-looking' block before block/ap token, use that
-    if not name_raw:
-        first_struct_idx = None
-        for i,t in enumerate(toks_up):
-            if i in marked_indices:
-                first_struct_idx = i
-                break
+    if not name_raw and marked_indices:
+        first_struct_idx = marked_indices[0]
         if first_struct_idx:
             cand = [toks[j] for j in range(0, first_struct_idx) if toks[j].isalpha()]
             if cand:
@@ -842,11 +935,183 @@ def extrair_tudo_consumo(texto: str) -> Dict[str, Any]:
 
     return {
         "TEXTO_LIMPO": texto_limpo,
-        "COR": cor.upper() if cor else "",
-        "PLACA": placa.upper() if placa else "",
+        "COR": cor,
+        "PLACA": placa,
         "BLOCO": bloco,
         "APARTAMENTO": apt,
-        "MODELOS": [m.upper() for m in modelos_final] if modelos_final else [],
+        "MODELOS": [m.upper() for m in modelos_final],
         "NOME_RAW": name_raw.upper() if name_raw else "",
         "STATUS": status.upper() if status else "DESCONHECIDO"
     }
+
+
+# =========================
+# lote: extrair_tudo_consumo_many
+# =========================
+
+class ExtratorLote:
+    """extrair_tudo_consumo com memória compartilhada entre os textos de um lote.
+
+    Textos do mesmo lote repetem nomes, modelos, cores e placas; a etiqueta de cada
+    token e o modelo canônico de cada candidato são calculados uma vez por lote.
+    As memórias são esvaziadas ao passar de ``max_itens`` entradas.
+    """
+
+    def __init__(self, max_itens: int = 50000):
+        self.max_itens = max(1, int(max_itens))
+        self._etiquetas: Dict[str, _Token] = {}
+        self._canonicos: Dict[str, str] = {}
+
+    def __call__(self, texto: str) -> Dict[str, Any]:
+        return _extrair(texto, self)
+
+    def etiqueta(self, t: str) -> _Token:
+        info = self._etiquetas.get(t)
+        if info is None:
+            if len(self._etiquetas) >= self.max_itens:
+                self._etiquetas.clear()
+            info = self._etiquetas[t] = _classificar_token(t)
+        return info
+
+    def canonico(self, candidate: str) -> str:
+        canon = self._canonicos.get(candidate)
+        if canon is None:
+            if len(self._canonicos) >= self.max_itens:
+                self._canonicos.clear()
+            canon = self._canonicos[candidate] = _map_to_canonical_model(candidate)
+        return canon
+
+
+_EXTRATOR_DO_PROCESSO: Optional[ExtratorLote] = None
+
+def _extrair_bloco(textos: List[str]) -> List[Dict[str, Any]]:
+    # roda nos processos do pool; a memória dura enquanto o processo viver
+    global _EXTRATOR_DO_PROCESSO
+    if _EXTRATOR_DO_PROCESSO is None:
+        _EXTRATOR_DO_PROCESSO = ExtratorLote()
+    return [_EXTRATOR_DO_PROCESSO(t) for t in textos]
+
+def _blocos(it: Iterator[str], tamanho: int) -> Iterator[List[str]]:
+    while True:
+        bloco = list(itertools.islice(it, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+def extrair_tudo_consumo_many(
+    textos: Iterable[str],
+    *,
+    workers: int = 1,
+    chunksize: int = 500,
+    min_paralelo: int = 5000,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """extrair_tudo_consumo para vários textos, entregando os resultados em ordem, à medida que saem.
+
+    - ``workers <= 1``: tudo no processo atual, com um ExtratorLote compartilhado;
+    - ``workers > 1``: se houver ao menos ``min_paralelo`` textos, blocos de ``chunksize``
+      vão para um ProcessPoolExecutor (no máximo ``2 * workers`` blocos em voo, então
+      iteráveis grandes não são lidos de uma vez); com menos texto o pool não compensa.
+
+    Se ``stats`` (dict) for passado, recebe ao final ``textos``, ``segundos``,
+    ``textos_por_s``, ``modo`` e ``workers``, mesmo que a iteração pare no meio.
+    """
+    it = iter(textos)
+    workers = max(1, int(workers or 1))
+    chunksize = max(1, int(chunksize))
+    inicio = list(itertools.islice(it, max(0, int(min_paralelo)))) if workers > 1 else []
+    paralelo = workers > 1 and len(inicio) >= max(1, int(min_paralelo))
+    fonte = itertools.chain(inicio, it)
+
+    started = time.perf_counter()
+    total = 0
+    try:
+        if not paralelo:
+            extrator = ExtratorLote()
+            for texto in fonte:
+                pre = extrator(texto)
+                total += 1
+                yield pre
+            return
+        em_voo = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                for bloco in _blocos(fonte, chunksize):
+                    em_voo.append(pool.submit(_extrair_bloco, bloco))
+                    if len(em_voo) >= 2 * workers:
+                        for pre in em_voo.popleft().result():
+                            total += 1
+                            yield pre
+                while em_voo:
+                    for pre in em_voo.popleft().result():
+                        total += 1
+                        yield pre
+            finally:
+                for fut in em_voo:
+                    fut.cancel()
+    finally:
+        if stats is not None:
+            segundos = time.perf_counter() - started
+            stats.update({
+                "textos": total,
+                "segundos": round(segundos, 3),
+                "textos_por_s": round(total / segundos, 1) if segundos > 0 else 0.0,
+                "modo": "processos" if paralelo else "sequencial",
+                "workers": workers if paralelo else 1,
+            })
+
+
+# =========================
+# confiança da extração (fast path sem LLM no ia.processar)
+# =========================
+
+_MODEL_KEYS = {k.upper() for k in VEICULOS_MAP}
+_plate_re_mercosul = re.compile(r"^[A-Z]{3}\d[A-Z]\d{2}$", re.IGNORECASE)
+
+_NOME_SUSPEITOS = {"BL", "BLOCO", "AP", "APT", "APTO", "APARTAMENTO", "PLACA", "CARRO"}
+
+def _confianca_nome(nome_raw: str) -> float:
+    parts = [p for p in str(nome_raw or "").split() if p]
+    if not parts:
+        return 0.0
+    if any(p.upper() in _NOME_SUSPEITOS or len(p) < 2 for p in parts):
+        # sobra de bloco/apartamento colada no nome: melhor deixar o LLM decidir
+        return 0.4
+    conhecidos = [_normalize_name_token(p) in _NOMES_LOOKUP for p in parts]
+    if conhecidos[0] and len(parts) >= 2:
+        return 1.0
+    if conhecidos[0]:
+        return 0.8
+    return 0.5 if any(conhecidos) else 0.3
+
+def _confianca_veiculo(placa: str, modelos: List[str]) -> float:
+    if not placa or re.match(r"^(BL|AP)\d+$", placa, re.IGNORECASE):
+        # sem placa, ou o token de bloco/apartamento foi tomado por placa
+        return 0.0
+    p = 1.0 if (_plate_re_1.match(placa) or _plate_re_mercosul.match(placa)) else 0.6
+    if not modelos:
+        return 0.0
+    m = 1.0 if str(modelos[0]).upper() in _MODEL_KEYS else 0.4
+    return min(p, m)
+
+def _confianca_unidade(bloco: str, apt: str) -> float:
+    if str(bloco or "").isdigit() and str(apt or "").isdigit():
+        return 1.0
+    return 0.5 if (bloco or apt) else 0.0
+
+def pontuar_confianca(pre: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Confiança (0..1) do resultado de extrair_tudo_consumo por grupo de campos:
+      - NOME: primeiro token (e idealmente o sobrenome) reconhecido em _NOMES
+      - VEICULO: placa no formato antigo/Mercosul + modelo canônico de VEICULOS_MAP
+      - UNIDADE: BLOCO e APARTAMENTO numéricos
+    GERAL é o mínimo dos três.
+    """
+    pre = pre or {}
+    out = {
+        "NOME": _confianca_nome(pre.get("NOME_RAW", "")),
+        "VEICULO": _confianca_veiculo(str(pre.get("PLACA") or ""), list(pre.get("MODELOS") or [])),
+        "UNIDADE": _confianca_unidade(pre.get("BLOCO", ""), pre.get("APARTAMENTO", "")),
+    }
+    out["GERAL"] = min(out.values())
+    return out
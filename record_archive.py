@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Arquivo histórico particionado por mês para dadosend.json e encomendasend.json.
+
+Opt-in via ``ACCESS_HISTORY_ARCHIVE=1``. Meses fechados (anteriores à janela
+quente de ``ACCESS_ARCHIVE_KEEP_MONTHS`` meses, padrão 2) saem do arquivo
+quente e viram segmentos imutáveis em ``historico/<colecao>/``::
+
+    historico/dadosend/2026-01-3f9a1c2b7d10.json.gz
+    historico/dadosend/manifest.json
+
+O nome do segmento leva o sha256 do conteúdo: rearquivar os mesmos registros
+(queda entre gravar o manifesto e regravar o arquivo quente) não duplica nada.
+Registros sem DATA_HORA legível ficam sempre no arquivo quente.
+
+Os arquivos de entrada (dadosinit/encomendasinit) também usam o histórico:
+``input_cursor`` move para cá o prefixo já processado via ``archive_records``.
+
+Consumidores do dia a dia (watcher, analises, avisos, monitor) só enxergam a
+janela quente. Auditorias e o modo histórico completo do chat usam
+``record_store.load_document(path, include_archive=True)``.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import record_index
+import record_store
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+ARCHIVE_ENABLED = os.getenv("ACCESS_HISTORY_ARCHIVE", "").strip().lower() in ("1", "true", "yes", "on")
+ARCHIVE_GZIP = os.getenv("ACCESS_ARCHIVE_GZIP", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    KEEP_MONTHS = max(1, int(os.getenv("ACCESS_ARCHIVE_KEEP_MONTHS", "2")))
+except ValueError:
+    KEEP_MONTHS = 2
+ARCHIVE_DIRNAME = "historico"
+MANIFEST_FILENAME = "manifest.json"
+
+_DATE_FORMATS = (
+    "%d/%m/%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d",
+)
+
+_CHECKED_LOCK = threading.Lock()
+_CHECKED_MONTH: Dict[str, str] = {}
+
+
+def archive_enabled() -> bool:
+    return bool(ARCHIVE_ENABLED)
+
+
+def archive_dir(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(path)), ARCHIVE_DIRNAME, stem)
+
+
+def manifest_path(path: str) -> str:
+    return os.path.join(archive_dir(path), MANIFEST_FILENAME)
+
+
+def record_month(rec: dict) -> Optional[str]:
+    """Mês ``YYYY-MM`` do DATA_HORA do registro, ou None se ausente/ilegível."""
+    if not isinstance(rec, dict):
+        return None
+    raw = rec.get("DATA_HORA") or rec.get("data_hora")
+    if not isinstance(raw, str) or not raw.strip():
+        return None
+    text = raw.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m")
+        except ValueError:
+            continue
+    return None
+
+
+def first_hot_month(now: Optional[datetime] = None, keep_months: Optional[int] = None) -> str:
+    """Mês mais antigo que permanece no arquivo quente (os anteriores são arquivados)."""
+    now = now or datetime.now()
+    keep = max(1, int(keep_months or KEEP_MONTHS))
+    total = now.year * 12 + (now.month - 1) - (keep - 1)
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    segs = data.get("segmentos")
+    data["segmentos"] = segs if isinstance(segs, list) else []
+    data.setdefault("colecao", os.path.basename(path))
+    return data
+
+
+def _write_bytes_atomic(dest: str, payload: bytes) -> None:
+    dirn = os.path.dirname(dest) or "."
+    os.makedirs(dirn, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_hist_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+
+
+def _write_segment(path: str, month: str, regs: List[dict], compress: bool) -> Dict[str, Any]:
+    raw = json.dumps(regs, ensure_ascii=False).encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()
+    name = f"{month}-{digest[:12]}.json" + (".gz" if compress else "")
+    dest = os.path.join(archive_dir(path), name)
+    if not os.path.exists(dest):
+        # mtime=0 deixa o .gz determinístico para o mesmo conteúdo
+        _write_bytes_atomic(dest, gzip.compress(raw, mtime=0) if compress else raw)
+    return {
+        "arquivo": name,
+        "mes": month,
+        "registros": len(regs),
+        "sha256": digest,
+        "criado_em": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+    }
+
+
+def _add_segments(path: str, por_mes: Dict[str, List[dict]], compress: bool) -> None:
+    """Grava um segmento por mês e registra no manifesto (idempotente pelo sha256)."""
+    manifest = read_manifest(path)
+    known = {s.get("sha256") for s in manifest["segmentos"] if isinstance(s, dict)}
+    for month in sorted(por_mes):
+        entry = _write_segment(path, month, por_mes[month], compress)
+        if entry["sha256"] not in known:
+            manifest["segmentos"].append(entry)
+            known.add(entry["sha256"])
+    manifest["segmentos"].sort(key=lambda s: str(s.get("mes") or ""))
+    manifest["atualizado_em"] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    _write_bytes_atomic(
+        manifest_path(path),
+        json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+    )
+
+
+def archive_records(path: str, regs: List[dict], *, compress: Optional[bool] = None) -> List[dict]:
+    """Grava ``regs`` no histórico de ``path`` agrupados por mês, sem mexer no arquivo quente.
+
+    Para quem decide sozinho o que sai do arquivo quente (ex.: ``input_cursor``
+    compactando o prefixo já processado do dadosinit). Devolve os registros que
+    ficaram de fora por não terem data legível; cabe ao chamador mantê-los.
+    """
+    compress = ARCHIVE_GZIP if compress is None else bool(compress)
+    por_mes: Dict[str, List[dict]] = {}
+    sem_data: List[dict] = []
+    for rec in regs or []:
+        month = record_month(rec)
+        if month is None:
+            sem_data.append(rec)
+        else:
+            por_mes.setdefault(month, []).append(rec)
+    if por_mes:
+        _add_segments(path, por_mes, compress)
+    return sem_data
+
+
+def archive_closed_months(path: str, *, now: Optional[datetime] = None, keep_months: Optional[int] = None,
+                          compress: Optional[bool] = None) -> int:
+    """Move os meses fechados de ``path`` para segmentos do histórico. Retorna quantos registros saíram."""
+    compress = ARCHIVE_GZIP if compress is None else bool(compress)
+    cutoff = first_hot_month(now, keep_months)
+    idx = record_index.index_for(path)
+    with idx.lock:
+        try:
+            doc = record_store.load_document(path)
+        except FileNotFoundError:
+            return 0
+        if isinstance(doc, list):
+            doc = {"registros": doc}
+        if not isinstance(doc, dict):
+            return 0
+        regs = doc.get("registros") or []
+        por_mes: Dict[str, List[dict]] = {}
+        quentes: List[Any] = []
+        for rec in regs:
+            month = record_month(rec)
+            if month is not None and month < cutoff:
+                por_mes.setdefault(month, []).append(rec)
+            else:
+                quentes.append(rec)
+        if not por_mes:
+            return 0
+
+        _add_segments(path, por_mes, compress)
+
+        # só depois do segmento e do manifesto duráveis o arquivo quente encolhe
+        hot = dict(doc)
+        hot["registros"] = quentes
+        record_store.save_document(path, hot)
+        idx.invalidate()
+
+    moved = len(regs) - len(quentes)
+    report_status(
+        "historico",
+        "OK",
+        stage="archive_closed_months",
+        details={"path": path, "meses": sorted(por_mes), "registros": moved, "quentes": len(quentes)},
+    )
+    return moved
+
+
+def load_archived(path: str, *, months: Optional[List[str]] = None) -> List[dict]:
+    """Registros arquivados de ``path`` em ordem cronológica de mês (opcionalmente filtrados)."""
+    wanted = set(months) if months else None
+    out: List[dict] = []
+    base = archive_dir(path)
+    for seg in read_manifest(path)["segmentos"]:
+        if not isinstance(seg, dict):
+            continue
+        if wanted is not None and seg.get("mes") not in wanted:
+            continue
+        name = str(seg.get("arquivo") or "")
+        seg_path = os.path.join(base, name)
+        try:
+            with open(seg_path, "rb") as f:
+                raw = f.read()
+            if name.endswith(".gz"):
+                raw = gzip.decompress(raw)
+            regs = json.loads(raw.decode("utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"[record_archive] Segmento ilegível {seg_path}: {e}")
+            continue
+        if isinstance(regs, list):
+            out.extend(r for r in regs if isinstance(r, dict))
+    return out
+
+
+def maybe_archive(path: str, *, now: Optional[datetime] = None) -> int:
+    """Arquiva no máximo uma vez por virada de mês (barato para chamar a cada ciclo do watcher)."""
+    if not archive_enabled():
+        return 0
+    now = now or datetime.now()
+    key = os.path.abspath(path)
+    month = now.strftime("%Y-%m")
+    with _CHECKED_LOCK:
+        if _CHECKED_MONTH.get(key) == month:
+            return 0
+        _CHECKED_MONTH[key] = month
+    try:
+        return archive_closed_months(path, now=now)
+    except Exception as e:
+        with _CHECKED_LOCK:
+            _CHECKED_MONTH.pop(key, None)
+        report_status("historico", "ERROR", stage="archive_failed", details={"path": path, "error": str(e)})
+        return 0
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Índice em memória dos registros de um arquivo (dadosend.json e afins).
+
+Carrega o arquivo uma vez (via ``record_store``) e mantém mapas por
+``_entrada_id``, ``ID`` e identidade normalizada, além do maior ID. O índice é
+invalidado pela assinatura do arquivo (inode, tamanho, mtime_ns e o
+``change_token`` do journal/SQLite): se outro processo ou módulo reescrever o
+arquivo, a próxima consulta recarrega. Escritas feitas por quem usa o índice
+o atualizam no lugar com ``add``/``touch`` + ``mark_saved``, então
+merge-ou-insert fica O(1) independentemente do tamanho do histórico.
+
+Uso típico (o lock serializa leitores/escritores do mesmo arquivo)::
+
+    idx = record_index.index_for(SAIDA)
+    with idx.lock:
+        idx.refresh()
+        found = idx.find_by_entrada_id(entrada_id)
+        ...
+        idx.mark_saved()
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import record_store
+
+_INDEXES_LOCK = threading.Lock()
+_INDEXES: Dict[str, "RecordIndex"] = {}
+
+
+def _int_id(rec: dict) -> Optional[int]:
+    try:
+        return int(rec.get("ID") or rec.get("id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def file_signature(path: str) -> Any:
+    try:
+        st = os.stat(path)
+        base = (st.st_ino, st.st_size, st.st_mtime_ns)
+    except OSError:
+        base = None
+    return (base, record_store.change_token(path))
+
+
+class RecordIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.records: List[dict] = []
+        self._signature: Any = object()
+        self._by_entrada: Dict[str, dict] = {}
+        self._by_id: Dict[int, List[dict]] = {}
+        self._identity_maps: Dict[Callable[[dict], str], Dict[str, int]] = {}
+        self._max_id = 0
+
+    # ---------- ciclo de vida ----------
+    def invalidate(self) -> None:
+        with self.lock:
+            self._signature = object()
+
+    def refresh(self) -> List[dict]:
+        """Recarrega apenas se a assinatura do arquivo mudou desde a última carga/gravação."""
+        with self.lock:
+            sig = file_signature(self.path)
+            if sig == self._signature:
+                return self.records
+            try:
+                doc = record_store.load_document(self.path)
+            except FileNotFoundError:
+                doc = {"registros": []}
+            except ValueError:
+                # JSON inválido: mesmo fallback de ia.carregar, sem fixar a assinatura
+                doc = {"registros": []}
+                sig = object()
+            if isinstance(doc, dict):
+                regs = doc.get("registros") or []
+            elif isinstance(doc, list):
+                regs = doc
+            else:
+                regs = []
+            if not isinstance(regs, list):
+                regs = list(regs)
+            self._rebuild(regs)
+            self._signature = sig
+            return self.records
+
+    def mark_saved(self) -> None:
+        """Chamado após gravar o estado atual do índice: evita recarga pela própria escrita."""
+        with self.lock:
+            self._signature = file_signature(self.path)
+
+    def _rebuild(self, regs: List[dict]) -> None:
+        self.records = regs
+        self._by_entrada = {}
+        self._by_id = {}
+        self._identity_maps = {}
+        self._max_id = 0
+        for rec in regs:
+            if isinstance(rec, dict):
+                self._index(rec)
+
+    def _index(self, rec: dict, *, existing: bool = False) -> None:
+        entrada = rec.get("_entrada_id")
+        if entrada:
+            self._by_entrada.setdefault(str(entrada), rec)
+        rid = _int_id(rec)
+        if rid is not None:
+            bucket = self._by_id.setdefault(rid, [])
+            if not (existing and any(r is rec for r in bucket)):
+                bucket.append(rec)
+            if rid > self._max_id:
+                self._max_id = rid
+            for identity_fn, mapping in self._identity_maps.items():
+                mapping.setdefault(identity_fn(rec), rid)
+
+    # ---------- consultas ----------
+    def find_by_entrada_id(self, entrada_id: Any) -> Optional[dict]:
+        if entrada_id is None:
+            return None
+        return self._by_entrada.get(str(entrada_id))
+
+    def find_by_id(self, rec_id: int) -> List[dict]:
+        return list(self._by_id.get(int(rec_id), []))
+
+    def person_id(self, identity: str, identity_fn: Callable[[dict], str]) -> Optional[int]:
+        """ID do primeiro registro (na ordem do arquivo) com a mesma identidade."""
+        mapping = self._identity_maps.get(identity_fn)
+        if mapping is None:
+            mapping = {}
+            for rec in self.records:
+                if not isinstance(rec, dict):
+                    continue
+                rid = _int_id(rec)
+                if rid is not None:
+                    mapping.setdefault(identity_fn(rec), rid)
+            self._identity_maps[identity_fn] = mapping
+        return mapping.get(identity)
+
+    def max_id(self) -> int:
+        return self._max_id
+
+    def next_id(self) -> int:
+        return self._max_id + 1
+
+    # ---------- atualização no lugar ----------
+    def add(self, rec: dict) -> None:
+        self.records.append(rec)
+        self._index(rec)
+
+    def touch(self, rec: dict) -> None:
+        """Reindexa um registro já presente que ganhou ID/_entrada_id num merge."""
+        self._index(rec, existing=True)
+
+
+def index_for(path: str) -> RecordIndex:
+    key = os.path.abspath(path)
+    with _INDEXES_LOCK:
+        idx = _INDEXES.get(key)
+        if idx is None:
+            idx = RecordIndex(path)
+            _INDEXES[key] = idx
+        return idx
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Repositório SQLite (stdlib ``sqlite3``, modo WAL) para os arquivos de registros.
+
+Opt-in via ``ACCESS_STORAGE_BACKEND=sqlite``. Com o backend ativo, dadosinit,
+dadosend, encomendas, analises e avisos deixam de ser reescritos como JSON e
+passam a viver em ``access.sqlite3`` (no mesmo diretório dos JSON). Na primeira
+leitura de cada coleção o JSON existente é importado.
+
+Cada registro é uma linha com o payload JSON e colunas indexadas para ID,
+``_entrada_id``, identidade (NOME|SOBRENOME|BLOCO|APARTAMENTO) e DATA_HORA, o que
+torna buscas pontuais e appends O(log n). O WAL permite que UI e pipeline leiam
+enquanto outro escreve, sem os loops de retry/sleep da leitura de JSON.
+
+Os módulos continuam chamando ``record_store.load_document``/``save_document``;
+é o ``record_store`` que despacha para cá.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BACKEND = os.getenv("ACCESS_STORAGE_BACKEND", "json").strip().lower()
+DB_FILENAME = "access.sqlite3"
+BUSY_TIMEOUT_MS = 5000
+
+COLLECTIONS = {
+    "dadosinit.json": "dadosinit",
+    "dadosend.json": "dadosend",
+    "encomendasinit.json": "encomendasinit",
+    "encomendasend.json": "encomendasend",
+    "analises.json": "analises",
+    "avisos.json": "avisos",
+}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS registros (
+        collection TEXT NOT NULL,
+        pos INTEGER NOT NULL,
+        rec_id INTEGER,
+        entrada_id TEXT,
+        identidade TEXT,
+        data_hora TEXT,
+        payload TEXT NOT NULL,
+        PRIMARY KEY (collection, pos)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_registros_id ON registros(collection, rec_id)",
+    "CREATE INDEX IF NOT EXISTS idx_registros_entrada ON registros(collection, entrada_id)",
+    "CREATE INDEX IF NOT EXISTS idx_registros_identidade ON registros(collection, identidade)",
+    "CREATE INDEX IF NOT EXISTS idx_registros_data_hora ON registros(collection, data_hora)",
+    """
+    CREATE TABLE IF NOT EXISTS colecoes (
+        collection TEXT PRIMARY KEY,
+        meta TEXT NOT NULL DEFAULT '{}',
+        revisao INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+)
+
+_REPOS_LOCK = threading.Lock()
+_REPOS: Dict[str, "SQLiteRecordRepository"] = {}
+
+
+def backend_enabled() -> bool:
+    return BACKEND == "sqlite"
+
+
+def collection_for(path: str) -> Optional[str]:
+    return COLLECTIONS.get(os.path.basename(path or ""))
+
+
+def repository_for(path: str) -> Optional["SQLiteRecordRepository"]:
+    """Repositório responsável por ``path`` ou None (backend JSON ou arquivo fora das coleções)."""
+    if not backend_enabled() or collection_for(path) is None:
+        return None
+    db_path = os.path.join(os.path.dirname(os.path.abspath(path)), DB_FILENAME)
+    with _REPOS_LOCK:
+        repo = _REPOS.get(db_path)
+        if repo is None:
+            repo = SQLiteRecordRepository(db_path)
+            _REPOS[db_path] = repo
+        return repo
+
+
+def _identity_of(rec: dict) -> str:
+    ident = rec.get("identidade")
+    if isinstance(ident, str) and ident.strip():
+        return ident.strip().upper()
+
+    def _v(k):
+        return str(rec.get(k, "") or "").strip().upper()
+
+    return f"{_v('NOME')}|{_v('SOBRENOME')}|{_v('BLOCO')}|{_v('APARTAMENTO')}"
+
+
+def _id_of(rec: dict) -> Optional[int]:
+    value = rec.get("ID", rec.get("id"))
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _data_hora_iso(rec: dict) -> Optional[str]:
+    s = str(rec.get("DATA_HORA") or rec.get("data_hora") or "").strip()
+    for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    return None
+
+
+def _row_values(collection: str, pos: int, rec: dict):
+    entrada = rec.get("_entrada_id")
+    return (
+        collection,
+        pos,
+        _id_of(rec),
+        None if entrada in (None, "") else str(entrada),
+        _identity_of(rec),
+        _data_hora_iso(rec),
+        json.dumps(rec, ensure_ascii=False),
+    )
+
+
+class SQLiteRecordRepository:
+    """Coleções de registros em um único arquivo SQLite; uma conexão por thread."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------- importação / coleções ----------
+    def _ensure_collection(self, conn: sqlite3.Connection, path: str, collection: str) -> None:
+        row = conn.execute("SELECT 1 FROM colecoes WHERE collection = ?", (collection,)).fetchone()
+        if row:
+            return
+        doc: Any = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            doc = None
+        if isinstance(doc, list):
+            doc = {"registros": doc}
+        if not isinstance(doc, dict):
+            doc = {"registros": []}
+        self._replace(conn, collection, doc, bump=False)
+
+    def _replace(self, conn: sqlite3.Connection, collection: str, doc: dict, *, bump: bool = True) -> None:
+        regs = doc.get("registros") or []
+        meta = {k: v for k, v in doc.items() if k != "registros"}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM registros WHERE collection = ?", (collection,))
+            conn.executemany(
+                "INSERT INTO registros (collection, pos, rec_id, entrada_id, identidade, data_hora, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [_row_values(collection, i, r) for i, r in enumerate(regs) if isinstance(r, dict)],
+            )
+            conn.execute(
+                "INSERT INTO colecoes (collection, meta, revisao) VALUES (?, ?, ?) "
+                "ON CONFLICT(collection) DO UPDATE SET meta = excluded.meta, revisao = colecoes.revisao + ?",
+                (collection, json.dumps(meta, ensure_ascii=False), 1 if bump else 0, 1 if bump else 0),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _prepare(self, path: str):
+        collection = collection_for(path)
+        if collection is None:
+            raise KeyError(f"arquivo sem coleção no repositório: {path}")
+        conn = self._conn()
+        self._ensure_collection(conn, path, collection)
+        return conn, collection
+
+    # ---------- documento inteiro ----------
+    def load_document(self, path: str) -> Dict[str, Any]:
+        conn, collection = self._prepare(path)
+        meta_row = conn.execute("SELECT meta FROM colecoes WHERE collection = ?", (collection,)).fetchone()
+        doc: Dict[str, Any] = {}
+        try:
+            doc.update(json.loads(meta_row[0]) if meta_row else {})
+        except json.JSONDecodeError:
+            pass
+        rows = conn.execute("SELECT payload FROM registros WHERE collection = ? ORDER BY pos", (collection,)).fetchall()
+        doc["registros"] = [json.loads(r[0]) for r in rows]
+        return doc
+
+    def save_document(self, path: str, obj: Any) -> None:
+        if isinstance(obj, list):
+            obj = {"registros": obj}
+        if not isinstance(obj, dict):
+            raise TypeError("documento deve ser dict ou lista de registros")
+        with self._write_lock:
+            conn, collection = self._prepare(path)
+            self._replace(conn, collection, obj)
+
+    # ---------- escrita incremental ----------
+    def _next_pos(self, conn: sqlite3.Connection, collection: str) -> int:
+        row = conn.execute("SELECT MAX(pos) FROM registros WHERE collection = ?", (collection,)).fetchone()
+        return (row[0] + 1) if row and row[0] is not None else 0
+
+    def _write_op(self, conn: sqlite3.Connection, collection: str, op: str, rec: dict, key: str) -> None:
+        pos = None
+        if op == "upsert" and key == "_entrada_id" and rec.get("_entrada_id") not in (None, ""):
+            row = conn.execute(
+                "SELECT pos FROM registros WHERE collection = ? AND entrada_id = ? ORDER BY pos LIMIT 1",
+                (collection, str(rec.get("_entrada_id"))),
+            ).fetchone()
+            if row is not None:
+                pos = row[0]
+        if pos is None:
+            pos = self._next_pos(conn, collection)
+        conn.execute(
+            "INSERT OR REPLACE INTO registros (collection, pos, rec_id, entrada_id, identidade, data_hora, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _row_values(collection, pos, rec),
+        )
+
+    def apply_batch(self, path: str, ops: List[tuple]) -> bool:
+        """Aplica ``(op, rec[, key])`` ("append"/"upsert") numa única transação."""
+        if not ops:
+            return True
+        with self._write_lock:
+            conn, collection = self._prepare(path)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for item in ops:
+                    op, rec = item[0], item[1]
+                    key = item[2] if len(item) > 2 and item[2] else "_entrada_id"
+                    self._write_op(conn, collection, op, rec, key)
+                conn.execute("UPDATE colecoes SET revisao = revisao + 1 WHERE collection = ?", (collection,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def append(self, path: str, rec: dict) -> bool:
+        return self.apply_batch(path, [("append", rec)])
+
+    def upsert(self, path: str, rec: dict, key: str = "_entrada_id") -> bool:
+        return self.apply_batch(path, [("upsert", rec, key)])
+
+    # ---------- consultas pontuais ----------
+    def _select(self, path: str, where: str, params: tuple, suffix: str = "ORDER BY pos") -> List[dict]:
+        conn, collection = self._prepare(path)
+        rows = conn.execute(
+            f"SELECT payload FROM registros WHERE collection = ? AND {where} {suffix}",
+            (collection,) + params,
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_by_id(self, path: str, rec_id: int) -> List[dict]:
+        return self._select(path, "rec_id = ?", (int(rec_id),))
+
+    def get_by_entrada_id(self, path: str, entrada_id: Any) -> Optional[dict]:
+        found = self._select(path, "entrada_id = ?", (str(entrada_id),), "ORDER BY pos LIMIT 1")
+        return found[0] if found else None
+
+    def find_by_identity(self, path: str, identidade: str) -> List[dict]:
+        return self._select(path, "identidade = ?", (str(identidade or "").strip().upper(),))
+
+    def latest(self, path: str) -> Optional[dict]:
+        """Registro de maior ID; sem IDs, o de DATA_HORA mais recente; senão o último gravado."""
+        for where, order in (
+            ("rec_id IS NOT NULL", "ORDER BY rec_id DESC, pos ASC LIMIT 1"),
+            ("data_hora IS NOT NULL", "ORDER BY data_hora DESC, pos ASC LIMIT 1"),
+            ("1 = 1", "ORDER BY pos DESC LIMIT 1"),
+        ):
+            found = self._select(path, where, (), order)
+            if found:
+                return found[0]
+        return None
+
+    def recent(self, path: str, limit: int) -> List[dict]:
+        """Últimos ``limit`` registros na ordem de gravação, sem carregar a coleção."""
+        if limit <= 0:
+            return []
+        found = self._select(path, "1 = 1", (), f"ORDER BY pos DESC LIMIT {int(limit)}")
+        found.reverse()
+        return found
+
+    def max_id(self, path: str) -> int:
+        conn, collection = self._prepare(path)
+        row = conn.execute("SELECT MAX(rec_id) FROM registros WHERE collection = ?", (collection,)).fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
+    def revision(self, path: str) -> int:
+        conn, collection = self._prepare(path)
+        row = conn.execute("SELECT revisao FROM colecoes WHERE collection = ?", (collection,)).fetchone()
+        return int(row[0]) if row else 0
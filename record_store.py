@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""Camada de persistência dos arquivos de registros (dadosend.json e afins).
+
+Modo journal (opt-in via ``ACCESS_DADOSEND_JOURNAL=1``): cada registro novo
+vira uma linha em ``<arquivo>.journal.jsonl`` em vez de reescrever o JSON
+inteiro. Leitores reconstroem o estado a partir do último snapshot
+(o próprio ``<arquivo>.json``) somado à cauda do journal. A compactação
+regrava o snapshot e descarta o journal quando ele passa do limite.
+
+Cada operação do journal carrega um ``seq`` crescente; o snapshot guarda
+``_journal_seq`` com o último ``seq`` já incorporado, então uma queda entre
+gravar o snapshot e remover o journal não duplica registros na releitura.
+
+Com ``ACCESS_STORAGE_BACKEND=sqlite`` as coleções conhecidas (ver
+``record_repository.COLLECTIONS``) são despachadas para o repositório SQLite e o
+journal não é usado.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+import persistence_writer
+import record_repository
+import record_tail
+import snapshot_cache
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+JOURNAL_ENABLED = os.getenv("ACCESS_DADOSEND_JOURNAL", "").strip().lower() in ("1", "true", "yes", "on")
+try:
+    JOURNAL_COMPACT_BYTES = int(os.getenv("ACCESS_JOURNAL_COMPACT_BYTES", "262144"))
+except ValueError:
+    JOURNAL_COMPACT_BYTES = 262144
+JOURNAL_FSYNC = True
+
+_LOCKS_GUARD = threading.Lock()
+_LOCKS: Dict[str, threading.RLock] = {}
+_SEQ: Dict[str, int] = {}
+
+
+def journal_enabled() -> bool:
+    return bool(JOURNAL_ENABLED)
+
+
+def uses_repository(path: str) -> bool:
+    return record_repository.repository_for(path) is not None
+
+
+def supports_incremental(path: str) -> bool:
+    """True quando ``append_record``/``upsert_record`` evitam reescrever o histórico de ``path``."""
+    return uses_repository(path) or journal_enabled()
+
+
+def journal_path(path: str) -> str:
+    return os.path.splitext(path)[0] + JOURNAL_SUFFIX
+
+
+def _path_lock(path: str) -> threading.RLock:
+    key = os.path.abspath(path)
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = threading.RLock()
+            _LOCKS[key] = lock
+        return lock
+
+
+def _read_journal_ops(path: str):
+    jpath = journal_path(path)
+    ops = []
+    try:
+        with open(jpath, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # linha parcial (queda no meio do append): ignora só ela
+                    continue
+                if isinstance(op, dict):
+                    ops.append(op)
+    except FileNotFoundError:
+        return []
+    return ops
+
+
+def _snapshot_seq(doc: Any) -> int:
+    if isinstance(doc, dict):
+        try:
+            return int(doc.get("_journal_seq") or 0)
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+def _apply_ops(doc: Any, ops) -> Any:
+    if isinstance(doc, list):
+        doc = {"registros": doc}
+    if not isinstance(doc, dict):
+        doc = {"registros": []}
+    regs = doc.get("registros")
+    if not isinstance(regs, list):
+        regs = []
+        doc["registros"] = regs
+    base_seq = _snapshot_seq(doc)
+    last_seq = base_seq
+    key_index: Dict[tuple, int] = {}
+    for op in ops:
+        try:
+            seq = int(op.get("seq") or 0)
+        except (TypeError, ValueError):
+            seq = 0
+        if seq and seq <= base_seq:
+            continue
+        rec = op.get("rec")
+        if not isinstance(rec, dict):
+            continue
+        if op.get("op") == "upsert":
+            key = str(op.get("key") or "_entrada_id")
+            value = str(rec.get(key) or "")
+            idx = key_index.get((key, value)) if value else None
+            if idx is None and value:
+                for i, r in enumerate(regs):
+                    if isinstance(r, dict) and str(r.get(key) or "") == value:
+                        idx = i
+                        break
+            if idx is not None:
+                regs[idx] = rec
+            else:
+                regs.append(rec)
+                idx = len(regs) - 1
+            if value:
+                key_index[(key, value)] = idx
+        else:
+            regs.append(rec)
+        last_seq = max(last_seq, seq)
+    if last_seq > base_seq:
+        doc["_journal_seq"] = last_seq
+    return doc
+
+
+def apply_journal(path: str, doc: Any) -> Any:
+    """Aplica a cauda do journal (se existir) sobre o snapshot já lido de ``path``."""
+    if not os.path.exists(journal_path(path)):
+        return doc
+    with _path_lock(path):
+        ops = _read_journal_ops(path)
+        if not ops:
+            return doc
+        return _apply_ops(doc, ops)
+
+
+def load_document(path: str, *, include_archive: bool = False, fallback=None) -> Any:
+    """Lê snapshot + journal. Sem snapshot nem journal, propaga FileNotFoundError.
+
+    Ordem: gravação ainda pendente no ``persistence_writer``, repositório SQLite,
+    ``snapshot_cache`` e por fim o JSON. ``fallback(path)`` substitui o parse
+    estrito quando ele falha (BOM, latin-1, JSON tolerante); o journal é aplicado
+    sobre o resultado do mesmo jeito. Sem ``fallback`` o erro de parse propaga.
+
+    ``include_archive=True`` antepõe os meses já movidos para o histórico
+    (``record_archive``); use só em auditorias/histórico completo.
+    """
+    pending = persistence_writer.pending_snapshot(path)
+    doc = pending if pending is not None else _load_hot_document(path, fallback)
+    if include_archive:
+        import record_archive  # import tardio: record_archive depende deste módulo
+
+        archived = record_archive.load_archived(path)
+        if archived:
+            if isinstance(doc, list):
+                doc = {"registros": doc}
+            if isinstance(doc, dict):
+                doc = dict(doc)
+                doc["registros"] = archived + list(doc.get("registros") or [])
+    return doc
+
+
+def _load_hot_document(path: str, fallback=None) -> Any:
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.load_document(path)
+    with _path_lock(path):
+        cached = snapshot_cache.load(path)
+        if cached is not None:
+            return apply_journal(path, cached)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                st = os.fstat(f.fileno())
+                doc = json.load(f)
+        except FileNotFoundError:
+            if not os.path.exists(journal_path(path)):
+                raise
+            doc = {"registros": []}
+        except ValueError:
+            # JSONDecodeError e UnicodeDecodeError
+            if fallback is None:
+                raise
+            doc = fallback(path)
+        else:
+            snapshot_cache.store(path, doc, st)
+        return apply_journal(path, doc)
+
+
+def _current_seq(path: str) -> int:
+    key = os.path.abspath(path)
+    seq = _SEQ.get(key)
+    if seq is not None:
+        return seq
+    seq = 0
+    for op in _read_journal_ops(path):
+        try:
+            seq = max(seq, int(op.get("seq") or 0))
+        except (TypeError, ValueError):
+            pass
+    if not seq:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                seq = _snapshot_seq(json.load(f))
+        except Exception:
+            seq = 0
+    _SEQ[key] = seq
+    return seq
+
+
+def save_document(path: str, obj: Any, *, indent: int = 4, fsync: bool = True) -> None:
+    """Grava o snapshot completo de forma atômica e descarta o journal já incorporado."""
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        repo.save_document(path, obj)
+        return
+    dirn = os.path.dirname(path) or "."
+    os.makedirs(dirn, exist_ok=True)
+    with _path_lock(path):
+        jpath = journal_path(path)
+        has_journal = os.path.exists(jpath)
+        if has_journal and isinstance(obj, dict):
+            obj = dict(obj)
+            obj["_journal_seq"] = max(_current_seq(path), _snapshot_seq(obj))
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_", suffix=os.path.splitext(path)[1] or ".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(obj, f, ensure_ascii=False, indent=indent)
+                f.flush()
+                if fsync:
+                    os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except Exception:
+                    pass
+        snapshot_cache.store(path, obj, st)
+        if has_journal:
+            try:
+                os.remove(jpath)
+            except FileNotFoundError:
+                pass
+        if record_tail.tracked(path):
+            regs = obj.get("registros") if isinstance(obj, dict) else obj
+            record_tail.note_snapshot(path, regs if isinstance(regs, list) else [], record_tail.signature(path, jpath))
+
+
+def _append_ops(path: str, ops) -> bool:
+    """Acrescenta várias operações ao journal com uma única escrita e um único fsync."""
+    if not ops:
+        return True
+    with _path_lock(path):
+        jpath = journal_path(path)
+        before = record_tail.signature(path, jpath) if record_tail.tracked(path) else None
+        seq = _current_seq(path)
+        lines = []
+        for op, rec, key in ops:
+            seq += 1
+            entry = {"seq": seq, "op": op, "rec": rec}
+            if key:
+                entry["key"] = key
+            lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.makedirs(os.path.dirname(jpath) or ".", exist_ok=True)
+        try:
+            with open(jpath, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+                f.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(f.fileno())
+        except OSError:
+            return False
+        _SEQ[os.path.abspath(path)] = seq
+        if before is not None:
+            record_tail.note_ops(path, before, record_tail.signature(path, jpath), ops)
+        try:
+            if os.path.getsize(jpath) >= JOURNAL_COMPACT_BYTES:
+                compact(path)
+        except OSError:
+            pass
+        return True
+
+
+def append_record(path: str, rec: dict) -> bool:
+    """Acrescenta um registro novo ao journal (custo de uma linha, não do histórico)."""
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.append(path, dict(rec))
+    return _append_ops(path, [("append", dict(rec), None)])
+
+
+def upsert_record(path: str, rec: dict, key: str = "_entrada_id") -> bool:
+    """Registra a versão atual de um registro; na releitura substitui o de mesmo ``key``."""
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.upsert(path, dict(rec), key=key)
+    return _append_ops(path, [("upsert", dict(rec), key)])
+
+
+def apply_batch(path: str, ops) -> bool:
+    """Grava ``(op, rec)`` ou ``(op, rec, key)`` de uma vez (uma transação SQLite ou um fsync do journal).
+
+    ``op`` é "append" ou "upsert" (por padrão com chave ``_entrada_id``). Exige
+    ``supports_incremental(path)``; no modo JSON puro quem chama regrava o snapshot.
+    """
+    normalized = []
+    for item in ops or []:
+        op, rec = item[0], item[1]
+        key = item[2] if len(item) > 2 else None
+        if op == "upsert" and not key:
+            key = "_entrada_id"
+        normalized.append((op, dict(rec), key if op == "upsert" else None))
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.apply_batch(path, normalized)
+    return _append_ops(path, normalized)
+
+
+def compact(path: str, *, indent: int = 4) -> bool:
+    """Incorpora o journal ao snapshot. Retorna False se não havia nada a compactar."""
+    with _path_lock(path):
+        if not os.path.exists(journal_path(path)):
+            return False
+        doc = load_document(path)
+        save_document(path, doc, indent=indent)
+        return True
+
+
+def latest_record(path: str) -> Optional[dict]:
+    """Registro mais recente de ``path`` (regra em ``record_tail.rank``) sem varrer o histórico.
+
+    Usa o índice do SQLite ou o sidecar ``.tail.json``; se o sidecar não
+    corresponder ao estado atual, faz a varredura uma vez e o regrava.
+    """
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.latest(path)
+    return _tail_data(path).get("ultimo")
+
+
+def max_record_id(path: str) -> int:
+    """Maior ID inteiro (``ID`` ou ``id``) de ``path`` sem varrer o histórico; 0 se não houver.
+
+    SQLite: ``MAX(rec_id)`` indexado. JSON: o "mais recente" do sidecar
+    ``.tail.json`` é o de maior ID (só arquivos em ``record_tail.TAIL_FILES``
+    têm sidecar; os demais pagam uma leitura).
+    """
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.max_id(path)
+    return record_tail.int_id(_tail_data(path).get("ultimo")) or 0
+
+
+def recent_records(path: str, limit: int = record_tail.TAIL_SIZE) -> list:
+    """Últimos ``limit`` registros gravados (na ordem do arquivo), até ``record_tail.TAIL_SIZE``."""
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        return repo.recent(path, limit)
+    regs = _tail_data(path).get("recentes") or []
+    return list(regs[-limit:]) if limit > 0 else []
+
+
+def _tail_data(path: str) -> dict:
+    with _path_lock(path):
+        sig = record_tail.signature(path, journal_path(path))
+        data = record_tail.read_valid(path, sig)
+        if data is not None:
+            return data
+        try:
+            doc = load_document(path)
+        except FileNotFoundError:
+            return {}
+        regs = doc.get("registros") if isinstance(doc, dict) else doc
+        regs = regs if isinstance(regs, list) else []
+        if record_tail.tracked(path):
+            record_tail.note_snapshot(path, regs, sig)
+        data = {"ultimo": record_tail.latest_of(regs), "recentes": [r for r in regs if isinstance(r, dict)][-record_tail.TAIL_SIZE:]}
+        return data
+
+
+def change_token(path: str) -> Any:
+    """Marcador barato que muda a cada escrita incremental (mtime do journal ou revisão SQLite)."""
+    repo = record_repository.repository_for(path)
+    if repo is not None:
+        try:
+            return repo.revision(path)
+        except Exception:
+            return None
+    try:
+        return os.stat(journal_path(path)).st_mtime
+    except OSError:
+        return None
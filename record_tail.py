@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Ponteiro persistente para o registro mais recente (e os últimos N) de um arquivo.
+
+O watcher só precisa da identidade do último registro após cada mudança, mas
+``_get_last_record_identity`` lia e varria o dadosend.json inteiro. Aqui o
+``record_store`` mantém, a cada escrita, um sidecar pequeno
+``<arquivo>.tail.json`` com o registro "mais recente" e os últimos
+``TAIL_SIZE`` registros gravados, junto com a assinatura (inode, tamanho,
+mtime_ns do snapshot e do journal) do estado a que ele se refere.
+
+A leitura compara a assinatura atual com a do sidecar: se bater, o resultado é
+O(1); se o arquivo foi reescrito por fora, cai na varredura completa e regrava
+o sidecar. No backend SQLite a consulta vai direto ao repositório
+(``latest`` indexado) e não há sidecar.
+
+"Mais recente" segue a regra histórica do watcher: maior ID inteiro (o
+primeiro, em caso de empate); sem IDs, o maior DATA_HORA; senão o último.
+Por isso o sidecar também dá o maior ID gravado sem varrer o arquivo
+(``record_store.max_record_id``), usado como piso das sequências de ID.
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Iterable, List, Optional
+
+TAIL_SUFFIX = ".tail.json"
+TAIL_SIZE = 20
+TAIL_FILES = ("dadosend.json", "encomendasend.json", "dadosinit.json", "encomendasinit.json")
+
+_DATE_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
+
+
+def tracked(path: str) -> bool:
+    return os.path.basename(path) in TAIL_FILES
+
+
+def tail_path(path: str) -> str:
+    return os.path.splitext(path)[0] + TAIL_SUFFIX
+
+
+def signature(path: str, journal: Optional[str] = None) -> Any:
+    """Assinatura do estado de ``path`` (snapshot + journal), só com ``os.stat``."""
+    try:
+        st = os.stat(path)
+        base = [st.st_ino, st.st_size, st.st_mtime_ns]
+    except OSError:
+        base = None
+    jsig = None
+    if journal:
+        try:
+            jst = os.stat(journal)
+            jsig = [jst.st_size, jst.st_mtime_ns]
+        except OSError:
+            jsig = None
+    return [base, jsig]
+
+
+def int_id(rec: Optional[dict]) -> Optional[int]:
+    """ID inteiro do registro (``ID`` nas saídas, ``id`` nos arquivos de entrada)."""
+    if not isinstance(rec, dict):
+        return None
+    value = rec.get("ID", rec.get("id"))
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        text = str(value).strip()
+        return int(text) if text else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _data_hora(rec: dict) -> Optional[datetime]:
+    s = rec.get("DATA_HORA") or rec.get("data_hora") or ""
+    if not isinstance(s, str):
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def rank(rec: dict, pos: int) -> tuple:
+    """Chave de "mais recente": ID > DATA_HORA > posição (o primeiro máximo vence)."""
+    rid = int_id(rec)
+    if rid is not None:
+        return (2, rid)
+    dt = _data_hora(rec)
+    if dt is not None:
+        return (1, dt.strftime("%Y%m%d%H%M%S"))
+    return (0, pos)
+
+
+def latest_of(regs: Iterable[Any]) -> Optional[dict]:
+    best = None
+    best_key = None
+    for pos, rec in enumerate(regs or []):
+        if not isinstance(rec, dict):
+            continue
+        key = rank(rec, pos)
+        if best_key is None or key > best_key:
+            best, best_key = rec, key
+    return best
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(tail_path(path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _write(path: str, data: dict) -> None:
+    dest = tail_path(path)
+    dirn = os.path.dirname(dest) or "."
+    try:
+        fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_tail_", suffix=".json")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, dest)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+
+
+def discard(path: str) -> None:
+    try:
+        os.remove(tail_path(path))
+    except OSError:
+        pass
+
+
+def _build(regs: List[Any]) -> dict:
+    dicts = [r for r in regs if isinstance(r, dict)]
+    ultimo = latest_of(regs)
+    pos = None
+    if ultimo is not None:
+        pos = next(i for i, r in enumerate(regs) if r is ultimo)
+    return {
+        "ultimo": ultimo,
+        "ultimo_rank": list(rank(ultimo, pos)) if ultimo is not None else None,
+        "total": len(regs),
+        "recentes": dicts[-TAIL_SIZE:],
+    }
+
+
+def note_snapshot(path: str, regs: List[Any], sig: Any) -> None:
+    """Chamado pelo record_store após gravar o snapshot completo (já paga O(n))."""
+    data = _build(list(regs or []))
+    data["assinatura"] = sig
+    _write(path, data)
+
+
+def note_ops(path: str, before: Any, after: Any, ops) -> None:
+    """Atualiza o sidecar em O(len(ops)) após appends/upserts incrementais.
+
+    Só aplica se o sidecar descrevia exatamente o estado anterior à escrita;
+    caso contrário descarta (a próxima leitura reconstrói).
+    """
+    data = _read(path)
+    if not data or data.get("assinatura") != before:
+        discard(path)
+        return
+    ultimo = data.get("ultimo")
+    cur = tuple(data["ultimo_rank"]) if data.get("ultimo_rank") else None
+    total = int(data.get("total") or 0)
+    recentes = list(data.get("recentes") or [])
+    for op, rec, key in ops:
+        key = key or "_entrada_id"
+        value = rec.get(key)
+        if op == "upsert" and value not in (None, ""):
+            # upsert de registro já existente: não muda posição nem total
+            same = lambda r: isinstance(r, dict) and str(r.get(key) or "") == str(value)
+            recentes = [rec if same(r) else r for r in recentes]
+            if same(ultimo):
+                ultimo = rec
+                cur = rank(rec, cur[1] if cur and cur[0] == 0 else total)
+                continue
+            if cur is not None and cur[0] == 0:
+                # sem ID/DATA_HORA a posição do registro atualizado é desconhecida aqui
+                discard(path)
+                return
+            key_new = rank(rec, total)
+            if cur is None or key_new > cur:
+                ultimo, cur = rec, key_new
+            continue
+        key_new = rank(rec, total)
+        total += 1
+        if cur is None or key_new > cur:
+            ultimo, cur = rec, key_new
+        recentes.append(rec)
+    data.update({
+        "ultimo": ultimo,
+        "ultimo_rank": list(cur) if cur is not None else None,
+        "total": total,
+        "recentes": recentes[-TAIL_SIZE:],
+        "assinatura": after,
+    })
+    _write(path, data)
+
+
+def read_valid(path: str, sig: Any) -> Optional[dict]:
+    """Sidecar de ``path`` se ele corresponde à assinatura ``sig``; senão None."""
+    data = _read(path)
+    if data and data.get("assinatura") == sig:
+        return data
+    return None
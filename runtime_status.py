@@ -1,13 +1,24 @@
 #!/usr/bin/env python3
-"""Rastreio de status em tempo real para ações do usuário e pipeline interno."""
+"""Rastreio de status em tempo real para ações do usuário e pipeline interno.
+
+O ``runtime_events.jsonl`` é rotacionado por tamanho
+(``ACCESS_EVENTS_SEGMENT_BYTES``, padrão 8 MB) e por virada de dia: o arquivo
+ativo vira um segmento imutável ``runtime_events.<AAAAMMDD-HHMMSS>-NNN.jsonl``
+no mesmo diretório e ganha uma entrada em ``runtime_events.index.json`` com o
+intervalo de timestamps, a contagem de eventos e marcos ``[timestamp, offset]``
+a cada ``INDEX_MARK_BYTES``. ``read_runtime_events(since=..., until=...)`` só
+abre os segmentos cujo intervalo cruza a janela pedida e, dentro deles, começa
+no marco mais próximo. ``ACCESS_EVENTS_ROTATE=0`` desliga a rotação.
+"""
 from __future__ import annotations
 
+import glob
 import json
 import os
 import tempfile
 import threading
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_DIR = os.path.join(BASE_DIR, "logs")
@@ -18,6 +29,17 @@ LAST_STATUS_FILE = os.path.join(LOG_DIR, "runtime_last_status.json")
 
 _LOCK = threading.Lock()
 
+ROTATE_ENABLED = os.getenv("ACCESS_EVENTS_ROTATE", "1").strip().lower() in ("1", "true", "yes", "on")
+try:
+    SEGMENT_MAX_BYTES = max(4096, int(os.getenv("ACCESS_EVENTS_SEGMENT_BYTES", str(8 * 1024 * 1024))))
+except ValueError:
+    SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+INDEX_MARK_BYTES = 256 * 1024
+INDEX_SUFFIX = ".index.json"
+
+# (inode, dia AAAA-MM-DD do primeiro evento) do arquivo ativo, por caminho
+_ACTIVE_DAY: Dict[str, tuple] = {}
+
 
 class RuntimeStatusStore:
     """Armazena caminhos de status/eventos para evitar dependência em globais mutáveis."""
@@ -71,8 +93,13 @@ def report_status(action: str, status: str, *, stage: str = "", details: Dict[st
         "details": _safe_json(details or {}),
     }
     with _LOCK:
+        path = EVENTS_FILE
         try:
-            with open(EVENTS_FILE, "a", encoding="utf-8") as f:
+            _rotate_if_needed(path, event["timestamp"])
+        except Exception:
+            pass
+        try:
+            with open(path, "a", encoding="utf-8") as f:
                 f.write(json.dumps(event, ensure_ascii=False) + "\n")
         except Exception:
             return
@@ -109,6 +136,16 @@ def _read_json(path: str) -> Any:
         return None
 
 
+def _read_document(path: str, include_archive: bool = False) -> Any:
+    """Arquivo de dados lido pelo ``record_store`` (pendente, SQLite, journal); None se ausente/ilegível."""
+    import record_store  # import tardio: persistence_writer importa este módulo
+
+    try:
+        return record_store.load_document(path, include_archive=include_archive)
+    except Exception:
+        return None
+
+
 def _to_records(obj: Any) -> list:
     if isinstance(obj, dict) and "registros" in obj:
         recs = obj.get("registros") or []
@@ -118,22 +155,225 @@ def _to_records(obj: Any) -> list:
     return []
 
 
-def read_runtime_events(path: str = EVENTS_FILE) -> list[Dict[str, Any]]:
+# ---------- rotação e índice de segmentos ----------
+def _segment_glob(path: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{glob.escape(stem)}.*{ext}"
+
+
+def index_path(path: str = EVENTS_FILE) -> str:
+    return os.path.splitext(path)[0] + INDEX_SUFFIX
+
+
+def _line_ts(line: bytes) -> str:
+    try:
+        ev = json.loads(line)
+    except Exception:
+        return ""
+    return str(ev.get("timestamp") or "")[:19] if isinstance(ev, dict) else ""
+
+
+def _first_day(path: str, ino: int) -> Optional[str]:
+    key = os.path.abspath(path)
+    cached = _ACTIVE_DAY.get(key)
+    if cached and cached[0] == ino:
+        return cached[1]
+    day = None
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                ts = _line_ts(line)
+                if ts:
+                    day = ts[:10]
+                    break
+    except OSError:
+        pass
+    _ACTIVE_DAY[key] = (ino, day)
+    return day
+
+
+def _describe_segment(seg_path: str) -> Dict[str, Any]:
+    """Varre o segmento uma vez: intervalo, contagem e marcos de offset."""
+    inicio = fim = ""
+    eventos = 0
+    marcos: List[list] = []
+    next_mark = 0
+    offset = 0
+    with open(seg_path, "rb") as f:
+        for line in f:
+            ts = _line_ts(line)
+            if ts:
+                eventos += 1
+                inicio = inicio or ts
+                fim = max(fim, ts)
+                if offset >= next_mark:
+                    marcos.append([ts, offset])
+                    next_mark = offset + INDEX_MARK_BYTES
+            offset += len(line)
+    return {
+        "arquivo": os.path.basename(seg_path),
+        "inicio": inicio,
+        "fim": fim,
+        "eventos": eventos,
+        "bytes": offset,
+        "marcos": marcos,
+    }
+
+
+def _load_index(path: str) -> List[Dict[str, Any]]:
+    """Segmentos de ``path`` em ordem cronológica; indexa segmentos órfãos do diretório."""
+    data = _read_json(index_path(path))
+    segs = data.get("segmentos") if isinstance(data, dict) else None
+    segs = [s for s in (segs or []) if isinstance(s, dict) and s.get("arquivo")]
+    dirn = os.path.dirname(path) or "."
+    known = {s["arquivo"] for s in segs}
+    on_disk = {os.path.basename(p) for p in glob.glob(_segment_glob(path))}
+    changed = False
+    for name in sorted(on_disk - known):
+        # rotação de outro processo que perdeu a corrida ao gravar o índice
+        try:
+            segs.append(_describe_segment(os.path.join(dirn, name)))
+            changed = True
+        except OSError:
+            continue
+    if known - on_disk:
+        segs = [s for s in segs if s["arquivo"] in on_disk]
+        changed = True
+    segs.sort(key=lambda s: (str(s.get("inicio") or ""), s["arquivo"]))
+    if changed:
+        try:
+            _write_atomic_json(index_path(path), {"segmentos": segs})
+        except Exception:
+            pass
+    return segs
+
+
+def _rotate(path: str) -> Optional[Dict[str, Any]]:
+    entry = _describe_segment(path)
+    stamp = (entry["inicio"] or _now_iso()).replace("-", "").replace(":", "").replace(" ", "-")
+    stem, ext = os.path.splitext(path)
+    # sufixo de 3 dígitos: segmentos do mesmo segundo ordenam pelo nome
+    n = 0
+    dest = f"{stem}.{stamp}-{n:03d}{ext}"
+    while os.path.exists(dest):
+        n += 1
+        dest = f"{stem}.{stamp}-{n:03d}{ext}"
+    try:
+        os.replace(path, dest)
+    except FileNotFoundError:
+        return None  # outro processo rotacionou primeiro
+    _ACTIVE_DAY.pop(os.path.abspath(path), None)
+    entry["arquivo"] = os.path.basename(dest)
+    segs = [s for s in _load_index(path) if s["arquivo"] != entry["arquivo"]]
+    segs.append(entry)
+    segs.sort(key=lambda s: (str(s.get("inicio") or ""), s["arquivo"]))
+    _write_atomic_json(index_path(path), {"segmentos": segs})
+    return entry
+
+
+def _rotate_if_needed(path: str, ts: str) -> bool:
+    """Chamado sob ``_LOCK`` antes de anexar o evento com timestamp ``ts``."""
+    if not ROTATE_ENABLED:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    size = st.st_size
+    if size <= 0:
+        return False
+    day = _first_day(path, st.st_ino)
+    if size < SEGMENT_MAX_BYTES and (not day or day == ts[:10]):
+        return False
+    return _rotate(path) is not None
+
+
+def rotate_events(path: str | None = None) -> Optional[Dict[str, Any]]:
+    """Força a rotação do arquivo ativo (manutenção/testes). Retorna a entrada do índice."""
+    target = path or EVENTS_FILE
+    with _LOCK:
+        try:
+            if os.stat(target).st_size <= 0:
+                return None
+        except OSError:
+            return None
+        return _rotate(target)
+
+
+def _ts_bound(value: Any, *, upper: bool = False) -> str:
+    if value is None or value == "":
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    s = str(value).strip()
+    dt = _parse_ts(s)
+    if dt is not None:
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        day = datetime.strptime(s, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return s
+    return f"{day} 23:59:59" if upper else f"{day} 00:00:00"
+
+
+def _read_events_file(path: str, events: list, *, offset: int = 0, lo: str = "", hi: str = "") -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        if offset:
+            f.seek(offset)
+        for line in f:
+            line = (line or "").strip()
+            if not line:
+                continue
+            try:
+                ev = json.loads(line)
+            except Exception:
+                continue
+            if not isinstance(ev, dict):
+                continue
+            if lo or hi:
+                ts = str(ev.get("timestamp") or "")[:19]
+                if not ts or (lo and ts < lo) or (hi and ts > hi):
+                    continue
+            events.append(ev)
+
+
+def _seek_offset(seg: Dict[str, Any], lo: str) -> int:
+    offset = 0
+    if not lo:
+        return offset
+    for ts, off in seg.get("marcos") or []:
+        # marco estritamente anterior: eventos no mesmo segundo de ``lo`` não ficam de fora
+        if str(ts) < lo:
+            offset = int(off)
+        else:
+            break
+    return offset
+
+
+def read_runtime_events(path: str = EVENTS_FILE, since: Any = None, until: Any = None) -> list[Dict[str, Any]]:
+    """Eventos de ``path`` (segmentos rotacionados + arquivo ativo), em ordem.
+
+    ``since``/``until`` (datetime, ``AAAA-MM-DD`` ou ``AAAA-MM-DD HH:MM:SS``,
+    inclusivos) limitam a janela; só os segmentos que a cruzam são lidos.
+    """
     events: list[Dict[str, Any]] = []
+    lo = _ts_bound(since)
+    hi = _ts_bound(until, upper=True)
+    dirn = os.path.dirname(path) or "."
+    for seg in _load_index(path):
+        if lo and str(seg.get("fim") or "") < lo:
+            continue
+        if hi and str(seg.get("inicio") or "") > hi:
+            continue
+        seg_path = os.path.join(dirn, seg["arquivo"])
+        try:
+            _read_events_file(seg_path, events, offset=_seek_offset(seg, lo), lo=lo, hi=hi)
+        except Exception:
+            continue
     if not os.path.exists(path):
         return events
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = (line or "").strip()
-                if not line:
-                    continue
-                try:
-                    ev = json.loads(line)
-                    if isinstance(ev, dict):
-                        events.append(ev)
-                except Exception:
-                    continue
+        _read_events_file(path, events, lo=lo, hi=hi)
     except Exception:
         return []
     return events
@@ -149,9 +389,9 @@ def _parse_ts(value: Any):
     return None
 
 
-def analisar_saude_pipeline(events_path: str = EVENTS_FILE) -> Dict[str, Any]:
-    """Analisa saúde do pipeline baseado em runtime_events.jsonl."""
-    events = read_runtime_events(events_path)
+def analisar_saude_pipeline(events_path: str = EVENTS_FILE, since: Any = None, until: Any = None) -> Dict[str, Any]:
+    """Analisa saúde do pipeline baseado em runtime_events.jsonl (opcionalmente numa janela)."""
+    events = read_runtime_events(events_path, since=since, until=until)
     stage_counts: Dict[str, int] = {}
     stage_errors: Dict[str, int] = {}
     error_messages: Dict[str, int] = {}
@@ -206,8 +446,8 @@ def analisar_saude_pipeline(events_path: str = EVENTS_FILE) -> Dict[str, Any]:
 UX_METRICS_FILE = os.path.join(LOG_DIR, "ux_metrics_dashboard.json")
 
 
-def analisar_metricas_ux(events_path: str = EVENTS_FILE) -> Dict[str, Any]:
-    events = read_runtime_events(events_path)
+def analisar_metricas_ux(events_path: str = EVENTS_FILE, since: Any = None, until: Any = None) -> Dict[str, Any]:
+    events = read_runtime_events(events_path, since=since, until=until)
     out: Dict[str, Any] = {
         "time_to_apply_filter_ms": {"count": 0, "avg": 0.0, "p95": 0.0},
         "edit_save_success_rate": 0.0,
@@ -264,10 +504,12 @@ def analisar_metricas_ux(events_path: str = EVENTS_FILE) -> Dict[str, Any]:
 
 def detectar_conflitos_dados(base_dir: str = BASE_DIR) -> Dict[str, Any]:
     """Procura inconsistências entre dadosinit/dadosend/analises/avisos."""
-    dadosinit = _to_records(_read_json(os.path.join(base_dir, "dadosinit.json")))
-    dadosend = _to_records(_read_json(os.path.join(base_dir, "dadosend.json")))
-    analises_raw = _read_json(os.path.join(base_dir, "analises.json")) or {}
-    avisos_raw = _read_json(os.path.join(base_dir, "avisos.json")) or {}
+    # o histórico entra nos dois lados: entrada compactada ou saída arquivada
+    # não pode virar "processado sem saída" só porque saiu do arquivo quente
+    dadosinit = _to_records(_read_document(os.path.join(base_dir, "dadosinit.json"), include_archive=True))
+    dadosend = _to_records(_read_document(os.path.join(base_dir, "dadosend.json"), include_archive=True))
+    analises_raw = _read_document(os.path.join(base_dir, "analises.json")) or {}
+    avisos_raw = _read_document(os.path.join(base_dir, "avisos.json")) or {}
 
     analises_regs = []
     if isinstance(analises_raw, dict):
@@ -321,10 +563,9 @@ def detectar_conflitos_dados(base_dir: str = BASE_DIR) -> Dict[str, Any]:
 
 def gerar_relatorio_diagnostico_diario(base_dir: str = BASE_DIR, events_path: str = EVENTS_FILE) -> Dict[str, Any]:
     """Resumo diário: volume, falhas e sugestões automáticas."""
-    events = read_runtime_events(events_path)
     today = datetime.now().strftime("%Y-%m-%d")
-
-    daily = [e for e in events if str(e.get("timestamp") or "").startswith(today)]
+    # só os segmentos de hoje são lidos
+    daily = read_runtime_events(events_path, since=today, until=today)
 
     volume_by_action: Dict[str, int] = {}
     failures_by_stage: Dict[str, int] = {}
@@ -335,7 +576,7 @@ def gerar_relatorio_diagnostico_diario(base_dir: str = BASE_DIR, events_path: st
             st = str(ev.get("stage") or "-")
             failures_by_stage[st] = failures_by_stage.get(st, 0) + 1
 
-    saude = analisar_saude_pipeline(events_path)
+    saude = analisar_saude_pipeline(events_path, since=today, until=today)
     conflitos = detectar_conflitos_dados(base_dir)
 
     sugestoes = []
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Cache binário (pickle) dos JSON de dados para partida a frio rápida.
+
+Opt-in via ``ACCESS_SNAPSHOT_CACHE=1``. Ao lado de cada ``<arquivo>.json`` fica
+um ``<arquivo>.snapshot.pickle`` com dois objetos em sequência: um cabeçalho
+(versão do formato, inode, tamanho e mtime_ns do JSON de origem) e o documento
+já decodificado. O cabeçalho é lido primeiro, então checar frescor não
+desserializa o documento.
+
+O cache é usado só quando inode, tamanho e mtime_ns batem com o JSON atual;
+qualquer outra diferença faz o chamador cair no parse normal. Quem já tem o
+documento em mãos atualiza o cache com ``store``: o caminho de escrita
+(``record_store.save_document`` e os ``_write_document`` de avisos/analises)
+logo depois de gravar e o leitor depois de um parse completo, ambos passando o
+stat do conteúdo que o documento descreve. Se o arquivo mudou desde esse stat o
+cache não é gravado, então ele nunca descreve um estado intermediário.
+
+Não há hash de conteúdo nem regeneração em segundo plano: quem grava o JSON
+por fora de ``record_store.save_document`` (e dos ``_write_document`` acima)
+deixa o ``.snapshot.pickle`` velho. Ele não é usado, porque o stat não bate;
+a próxima leitura pelo ``record_store`` paga o parse completo e regrava o cache.
+"""
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import tempfile
+from typing import Any, Optional
+
+try:
+    from runtime_status import report_status
+except Exception:
+    def report_status(*args, **kwargs):
+        return None
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".snapshot.pickle"
+CACHE_ENABLED = os.getenv("ACCESS_SNAPSHOT_CACHE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def cache_enabled() -> bool:
+    return bool(CACHE_ENABLED)
+
+
+def cache_path(path: str) -> str:
+    return os.path.splitext(path)[0] + CACHE_SUFFIX
+
+
+def _read_header(path: str):
+    try:
+        f = open(cache_path(path), "rb")
+    except OSError:
+        return None, None
+    try:
+        header = pickle.load(f)
+    except Exception:
+        f.close()
+        return None, None
+    if not isinstance(header, dict) or header.get("versao") != CACHE_VERSION:
+        f.close()
+        return None, None
+    return header, f
+
+
+def _signature(st: os.stat_result):
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _matches(header: dict, st: os.stat_result) -> bool:
+    return (header.get("ino"), header.get("size"), header.get("mtime_ns")) == _signature(st)
+
+
+def is_fresh(path: str, kind: Optional[type] = None) -> bool:
+    """True se o cache descreve o JSON atual (sem desserializar o documento).
+
+    ``kind`` exige também o tipo do topo do documento (ex.: ``dict``).
+    """
+    if not cache_enabled():
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    header, f = _read_header(path)
+    if header is None:
+        return False
+    f.close()
+    if kind is not None and header.get("tipo") != kind.__name__:
+        return False
+    return _matches(header, st)
+
+
+def load(path: str) -> Any:
+    """Documento do cache se estiver fresco; senão ``None`` (o chamador faz o parse)."""
+    if not cache_enabled():
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    header, f = _read_header(path)
+    if header is None:
+        return None
+    try:
+        if _matches(header, st):
+            return pickle.load(f)
+    except Exception:
+        pass
+    finally:
+        f.close()
+    return None
+
+
+def _write(path: str, header: dict, doc: Any) -> None:
+    dest = cache_path(path)
+    dirn = os.path.dirname(dest) or "."
+    fd, tmp = tempfile.mkstemp(dir=dirn, prefix=".tmp_snap_", suffix=".pickle")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(doc, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except Exception:
+                pass
+
+
+def store(path: str, doc: Any, st: os.stat_result) -> bool:
+    """Grava o cache de ``path`` com ``doc``, que descreve o conteúdo de stat ``st``.
+
+    ``st`` é o stat tirado junto da escrita/leitura que produziu ``doc``; se o
+    arquivo atual já não bate com ele, nada é gravado. Retorna se gravou.
+    """
+    if not cache_enabled():
+        return False
+    try:
+        current = os.stat(path)
+    except OSError:
+        return False
+    if _signature(current) != _signature(st):
+        return False
+    header = {
+        "versao": CACHE_VERSION,
+        "origem": os.path.basename(path),
+        "ino": current.st_ino,
+        "size": current.st_size,
+        "mtime_ns": current.st_mtime_ns,
+        "tipo": type(doc).__name__,
+    }
+    try:
+        _write(path, header, doc)
+    except (OSError, pickle.PicklingError) as e:
+        report_status("snapshot_cache", "ERROR", stage="store_failed", details={"path": path, "error": str(e)})
+        return False
+    return True
+
+
+def rebuild(path: str) -> bool:
+    """Gera o cache de ``path`` a partir do JSON atual (partida a frio). Retorna se gravou."""
+    try:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            doc = json.loads(f.read().decode("utf-8-sig"))
+    except (OSError, ValueError):
+        return False
+    return store(path, doc, st)
@@ -1,4 +1,7 @@
+import threading
 import unittest
+from types import SimpleNamespace
+from unittest import mock
 
 import chat
 
@@ -16,5 +19,66 @@ class ChatModuleTests(unittest.TestCase):
         self.assertEqual(chat._to_records(None), [])
 
 
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class _Stream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.closed = False
+
+    def __iter__(self):
+        for p in self.pieces:
+            yield _chunk(p)
+
+    def close(self):
+        self.closed = True
+
+
+class ChatStreamingTests(unittest.TestCase):
+    def _respond(self, stream, **kwargs):
+        client = mock.Mock()
+        client.chat.completions.create.return_value = stream
+        with mock.patch.object(chat.ia, "client", client), \
+             mock.patch.object(chat, "_build_user_message", return_value="pergunta"), \
+             mock.patch.object(chat, "_emit_telemetry") as telemetry:
+            out = chat.respond_chat("quem entrou?", **kwargs)
+        return out, client, telemetry
+
+    def test_stream_entrega_pedacos_conforme_chegam(self):
+        recebidos = []
+        out, client, telemetry = self._respond(_Stream(["Ola", ", ", None, "mundo"]), on_delta=recebidos.append)
+        self.assertEqual(recebidos, ["Ola", ", ", "mundo"])
+        self.assertEqual(out, "Ola, mundo")
+        self.assertTrue(client.chat.completions.create.call_args.kwargs["stream"])
+        evento, meta = telemetry.call_args.args
+        self.assertEqual(evento, "sucesso")
+        self.assertIsNotNone(meta["ttft_ms"])
+
+    def test_cancelar_interrompe_e_fecha_stream(self):
+        cancel = threading.Event()
+        stream = _Stream(["parte 1 ", "parte 2 ", "parte 3"])
+        out, _client, telemetry = self._respond(stream, on_delta=lambda _p: cancel.set(), cancel_event=cancel)
+        self.assertEqual(out, "parte 1 \n\n" + chat.CANCELED_NOTICE)
+        self.assertTrue(stream.closed)
+        self.assertEqual(telemetry.call_args.args[0], "cancelado")
+
+    def test_sem_on_delta_mantem_resposta_inteira(self):
+        resposta = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="completo"))])
+        out, client, _telemetry = self._respond(resposta)
+        self.assertEqual(out, "completo")
+        self.assertNotIn("stream", client.chat.completions.create.call_args.kwargs)
+
+    def test_recusa_local_vira_mensagem_amigavel(self):
+        client = mock.Mock()
+        client.chat.completions.create.side_effect = chat.llm_client.LLMRequestTooLargeError("pedido recusado")
+        with mock.patch.object(chat.ia, "client", client), \
+             mock.patch.object(chat, "_build_user_message", return_value="pergunta"), \
+             mock.patch.object(chat, "_emit_telemetry"), mock.patch("traceback.print_exc"):
+            out = chat.respond_chat("quem entrou?")
+        self.assertIn("grande demais", out)
+
+
 if __name__ == "__main__":
     unittest.main()
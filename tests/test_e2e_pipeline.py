@@ -6,6 +6,7 @@ from unittest import mock
 
 import interfaceone
 import ia
+import id_sequence
 import runtime_status
 
 
@@ -44,11 +45,19 @@ class E2EPipelineTests(unittest.TestCase):
             "ENCOMENDAS_IN_FILE": os.path.join(self.td.name, "encomendasinit.json"),
             "ENCOMENDAS_DB_FILE": os.path.join(self.td.name, "encomendasend.json"),
             "REVIEW_QUEUE_FILE": os.path.join(self.td.name, "fila_revisao.json"),
+            "ORIENTACOES_FILE": os.path.join(self.td.name, "orientacoes.json"),
+            "OBSERVACOES_FILE": os.path.join(self.td.name, "observacoes.json"),
         }
         for p in self.paths.values():
             with open(p, "w", encoding="utf-8") as f:
                 json.dump({"registros": []}, f)
 
+        # sequências de ID no diretório temporário, nunca no id_sequences.json do checkout
+        store = id_sequence.SequenceStore(os.path.join(self.td.name, id_sequence.SEQUENCES_FILENAME))
+        patcher = mock.patch.object(id_sequence, "store_for", return_value=store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.events = os.path.join(self.td.name, "runtime_events.jsonl")
         self.last = os.path.join(self.td.name, "runtime_last_status.json")
         runtime_status.EVENTS_FILE = self.events
@@ -133,21 +142,20 @@ class E2EPipelineTests(unittest.TestCase):
 
     def test_e2e_encomenda_dispara_pipeline_mesmo_com_chat_ativo(self):
         entry = _Entry("PACOTE SHOPEE BLOCO A AP 101")
-        fake_thread = mock.Mock()
         fake_ia = mock.Mock()
         fake_ia.processar = mock.Mock()
         fake_ia.is_chat_mode_active = mock.Mock(return_value=True)
         with self._patch_interface_paths(), \
              mock.patch.object(interfaceone, "classificar_destino_texto", return_value={"destino": "encomendas", "score": 3.0, "ambiguo": False}), \
-             mock.patch.object(interfaceone, "_save_encomenda_init") as m_save_enc, \
+             mock.patch.object(interfaceone, "_save_encomenda_init", return_value=7) as m_save_enc, \
              mock.patch.object(interfaceone, "HAS_IA_MODULE", True), \
              mock.patch.object(interfaceone, "ia_module", fake_ia), \
-             mock.patch.object(interfaceone.threading, "Thread", return_value=fake_thread) as m_thread:
+             mock.patch.object(interfaceone.threading, "Thread") as m_thread:
             interfaceone.save_text(entry_widget=entry)
 
         self.assertTrue(m_save_enc.called)
-        m_thread.assert_called_once_with(target=fake_ia.processar, daemon=True)
-        fake_thread.start.assert_called_once()
+        fake_ia.enqueue_processing.assert_called_once_with(entrada_id=7, source="save_text_encomenda")
+        self.assertFalse(m_thread.called)
 
     def test_e2e_erro_preprocess_ainda_salva(self):
         entry = _Entry("texto qualquer")
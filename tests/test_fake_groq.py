@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import bench_pipeline  # noqa: E402
+import fake_groq  # noqa: E402
+import ia  # noqa: E402
+
+
+class FakeGroqTests(unittest.TestCase):
+    def test_latencia_e_erros_configuraveis(self):
+        sleeps = []
+        fake = fake_groq.FakeGroq(latency="fixed:120", errors=fake_groq.parse_errors("429=1"), sleep=sleeps.append)
+        with self.assertRaises(fake_groq.FakeAPIError) as ctx:
+            fake.chat.completions.create(model="m", messages=[{"role": "user", "content": "oi"}])
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(ctx.exception.response.headers.get("retry-after"), "1")
+        self.assertEqual(sleeps, [0.12])
+        self.assertEqual(fake.stats["erros"], {"429": 1})
+        self.assertEqual(fake.stats["em_voo"], 0)
+        with self.assertRaises(ValueError):
+            fake_groq.LatencyModel("pareto:1")
+
+    def test_resposta_padrao_segue_prompt_de_registro_e_de_lote(self):
+        fake = fake_groq.FakeGroq(sleep=lambda _s: None)
+        ctxs = [
+            {"entrada_id": 1, "texto_limpo": "JOAO SILVA GOL", "prompt_base": "Retorne JSON", "prompt": "x"},
+            {"entrada_id": 2, "texto_limpo": "ANA LIMA ONIX", "prompt_base": "Retorne JSON", "prompt": "x"},
+        ]
+        prompt_lote = ia._build_batch_prompt(ctxs, ia._refs_lote(ctxs))
+        resp = fake.chat.completions.create(model="m", messages=[{"role": "user", "content": prompt_lote}])
+        itens = json.loads(resp.choices[0].message.content)
+        self.assertEqual([i["NOME"] for i in itens], ["JOAO", "ANA"])
+        self.assertGreater(resp.usage.total_tokens, 0)
+
+        unico = fake.chat.completions.create(model="m", messages=[{"role": "user", "content": "Regras\nTexto:\nMARIA SOUZA\n\nfim"}])
+        self.assertEqual(ia.extrair_json_seguro(unico.choices[0].message.content)["SOBRENOME"], "SOUZA")
+
+    def test_benchmark_processa_todos_os_registros(self):
+        args = SimpleNamespace(records=4, rate=0.0, latency="fixed:0", errors="", timeout_s=0.0, in_flight=2,
+                               batch=1, fast_path=False, rate_limited=False, deadline_s=30.0, seed=3, json_out="")
+        out = bench_pipeline.run_benchmark(args)
+        self.assertEqual(out["concluidos"], 4)
+        self.assertEqual(out["fake_groq"]["chamadas"], 4)
+        self.assertEqual(out["worker"]["enfileirados"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import file_lock
+
+
+class FileLockTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "process.lock")
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_exclusivo_acorda_quem_espera_sem_polling(self):
+        lk = file_lock.FileLock(self.path)
+        self.assertTrue(lk.acquire(timeout=1))
+        got = []
+        t = threading.Thread(target=lambda: got.append(lk.acquire(timeout=2)))
+        t.start()
+        time.sleep(0.05)
+        self.assertEqual(got, [])
+        lk.release()
+        t.join(2)
+        self.assertEqual(got, [True])
+        lk.release()
+        m = lk.metrics()
+        self.assertEqual(m["aquisicoes"], 2)
+        self.assertEqual(m["contendidas"], 1)
+        self.assertGreater(m["espera_max_ms"], 0)
+
+    def test_compartilhado_admite_leitores_e_bloqueia_escritor(self):
+        lk = file_lock.FileLock(self.path)
+        self.assertTrue(lk.acquire(timeout=1, shared=True))
+        self.assertTrue(lk.acquire(timeout=1, shared=True))
+        self.assertFalse(lk.acquire(timeout=0.05))
+        lk.release()
+        lk.release()
+        self.assertTrue(lk.acquire(timeout=1))
+        lk.release()
+        self.assertEqual(lk.metrics()["timeouts"], 1)
+
+    @unittest.skipUnless(file_lock.flock_available(), "requer fcntl.flock")
+    def test_flock_entre_descritores_respeita_timeout_e_libera_depois(self):
+        # duas instâncias simulam dois processos: cada uma abre seu próprio fd
+        a = file_lock.FileLock(self.path)
+        b = file_lock.FileLock(self.path)
+        self.assertTrue(a.acquire(timeout=1))
+        t0 = time.monotonic()
+        self.assertFalse(b.acquire(timeout=0.1))
+        self.assertLess(time.monotonic() - t0, 1.0)
+        a.release()
+        self.assertTrue(b.acquire(timeout=1))
+        b.release()
+
+    def test_fallback_o_excl_remove_lock_velho(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("stale")
+        os.utime(self.path, (1000.0, 1000.0))
+        with mock.patch.object(file_lock, "fcntl", None):
+            lk = file_lock.FileLock(self.path, stale_seconds=0.01)
+            self.assertTrue(lk.acquire(timeout=0.2))
+            self.assertFalse(file_lock.FileLock(self.path, stale_seconds=60).acquire(timeout=0.05))
+            lk.release()
+            self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
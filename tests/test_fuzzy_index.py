@@ -0,0 +1,47 @@
+import random
+import unittest
+
+import fuzzy_index
+import preprocessor
+
+
+class FuzzyIndexTests(unittest.TestCase):
+    def test_nearest_desempata_pela_primeira_insercao(self):
+        idx = fuzzy_index.DeleteIndex([("GOL", "GOL"), ("GOLF", "GOLF"), ("POLO", "POLO"), ("GOL", "OUTRO")])
+        self.assertEqual(len(idx), 3)
+        self.assertEqual(idx.nearest("GOL"), (0, "GOL", "GOL"))
+        # GOLL está a 1 de GOL e de GOLF: vale o inserido primeiro
+        self.assertEqual(idx.nearest("GOLL", 1), (1, "GOL", "GOL"))
+        self.assertEqual([h[2] for h in idx.lookup("POL", 2)], ["GOL", "POLO", "GOLF"])
+        self.assertIsNone(idx.nearest("XYZW", 1))
+        # consulta não passa do max_distance do índice
+        self.assertEqual(idx.lookup("PXXLXO", 5), [])
+
+    def test_bounded_distance_confere_com_levenshtein(self):
+        rnd = random.Random(7)
+        for _ in range(300):
+            a = "".join(rnd.choice("ABC") for _ in range(rnd.randint(0, 6)))
+            b = "".join(rnd.choice("ABC") for _ in range(rnd.randint(0, 6)))
+            d = preprocessor._edit_distance(a, b)
+            self.assertEqual(fuzzy_index.bounded_distance(a, b, 2), d if d <= 2 else 3, (a, b))
+
+    def test_indice_de_modelos_equivale_a_varredura_linear(self):
+        rnd = random.Random(11)
+        termos = [vn for vn, _key in preprocessor._MODELO_NORMAIS_TODOS if vn]
+        consultas = []
+        for vn in rnd.sample(termos, 60):
+            i = rnd.randrange(len(vn))
+            consultas += [vn[:i] + vn[i + 1:], vn[:i] + "X" + vn[i:], vn[:i] + "Q" + vn[i + 1:], vn + "ZZ"]
+        for q in consultas:
+            best = None
+            for vn, key in preprocessor._MODELO_NORMAIS_TODOS:
+                d = preprocessor._edit_distance(q, vn)
+                if best is None or d < best[0]:
+                    best = (d, key)
+            esperado = best[1] if best[0] <= 1 else None
+            hit = preprocessor._MODELO_FUZZY.nearest(q, 1)
+            self.assertEqual(hit[2] if hit else None, esperado, q)
+
+
+if __name__ == "__main__":
+    unittest.main()
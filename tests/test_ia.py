@@ -1,12 +1,26 @@
+import json
 import os
 import tempfile
+import threading
+import time
 import unittest
 from unittest import mock
 
 import ia
+import id_sequence
+import input_cursor
 
 
 class IAModuleTests(unittest.TestCase):
+    def setUp(self):
+        # sequências de ID num diretório temporário, nunca no id_sequences.json do checkout
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        store = id_sequence.SequenceStore(os.path.join(td.name, id_sequence.SEQUENCES_FILENAME))
+        patcher = mock.patch.object(id_sequence, "store_for", return_value=store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def tearDown(self):
         ia._RETRY_SCHEDULED = False
 
@@ -126,6 +140,189 @@ class IAModuleTests(unittest.TestCase):
                 ia.release_lock()
 
 
+    def _processar_em_lote(self, td, n, saida_ok=True, client=None, textos=None, **config):
+        paths = {k: os.path.join(td, f"{k.lower()}.json") for k in ("ENTRADA", "SAIDA", "ENCOMENDAS_ENTRADA", "ENCOMENDAS_SAIDA")}
+        for p in paths.values():
+            with open(p, "w", encoding="utf-8") as f:
+                json.dump({"registros": []}, f)
+        with open(paths["ENTRADA"], "w", encoding="utf-8") as f:
+            textos = textos or [f"JOAO BL A AP 10{i} ABC123{i}" for i in range(1, n + 1)]
+            json.dump({"registros": [{"id": i, "texto": t, "processado": False} for i, t in enumerate(textos, 1)]}, f)
+
+        saves = []
+        real_save = ia.salvar_atomico
+
+        def tracking_save(path, data):
+            saves.append(os.path.basename(path))
+            return real_save(path, data)
+
+        save_saida = ia._save_saida if saida_ok else (lambda regs: False)
+        config.setdefault("COMMIT_BATCH_SIZE", 2)
+        config.setdefault("COMMIT_INTERVAL_MS", 60000)
+        with mock.patch.multiple(ia, client=client, **config, **paths), \
+             mock.patch.object(ia, "salvar_atomico", side_effect=tracking_save), \
+             mock.patch.object(ia, "_save_saida", side_effect=save_saida), \
+             mock.patch.object(ia, "acquire_lock", return_value=True), \
+             mock.patch.object(ia, "release_lock", return_value=None), \
+             mock.patch.object(ia, "log_forense", return_value=None):
+            ia.processar()
+
+        with open(paths["ENTRADA"], "r", encoding="utf-8") as f:
+            entrada = json.load(f)["registros"]
+        with open(paths["SAIDA"], "r", encoding="utf-8") as f:
+            saida = json.load(f)["registros"]
+        return saves, entrada, saida
+
+    def test_processar_group_commit_grava_uma_vez_por_lote(self):
+        with tempfile.TemporaryDirectory() as td:
+            saves, entrada, saida = self._processar_em_lote(td, 5)
+        # 5 registros, lotes de 2: 3 flushes, cada um com uma gravação de SAIDA e uma de ENTRADA
+        self.assertEqual(saves.count("saida.json"), 3)
+        self.assertEqual(saves.count("entrada.json"), 3)
+        self.assertLess(saves.index("saida.json"), saves.index("entrada.json"))
+        self.assertTrue(all(r["processado"] for r in entrada))
+        self.assertEqual(sorted(r["_entrada_id"] for r in saida), [1, 2, 3, 4, 5])
+
+    def test_marcar_processados_rele_arquivo_mesmo_sem_id(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "dadosinit.json")
+            lido = [{"id": 1, "texto": "A", "processado": False},
+                    {"texto": "B", "data_hora": "01/03/2026 10:00:00", "processado": False},
+                    {"texto": "C", "data_hora": "01/03/2026 10:05:00", "processado": False}]
+            # enquanto a IA trabalhava: o registro 1 foi arquivado e um novo foi anexado
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"registros": lido[1:] + [{"id": 9, "texto": "D", "processado": False}]}, f)
+            ia.marcar_processados(path, lido)
+            with open(path, "r", encoding="utf-8") as f:
+                atual = json.load(f)["registros"]
+        self.assertEqual([(r["texto"], r["processado"]) for r in atual], [("B", True), ("C", True), ("D", False)])
+        # o 1 não estava mais no arquivo: não volta para ele e fica sem flag em memória
+        self.assertEqual([r["processado"] for r in lido], [False, True, True])
+
+    def test_processar_nao_marca_processado_sem_saida(self):
+        with tempfile.TemporaryDirectory() as td:
+            saves, entrada, saida = self._processar_em_lote(td, 3, saida_ok=False)
+            cursor = input_cursor.cursor(os.path.join(td, "entrada.json"))
+        self.assertNotIn("entrada.json", saves)
+        self.assertFalse(any(r.get("processado") for r in entrada))
+        self.assertEqual(saida, [])
+        # falhas ficam como lacunas do cursor e voltam na próxima rodada
+        self.assertEqual(cursor, {"ultimo_id": 3, "lacunas": [1, 2, 3]})
+
+    def test_processar_sobrepoe_chamadas_llm_e_preserva_ordem(self):
+        guard = threading.Lock()
+        estado = {"em_voo": 0, "max": 0}
+
+        def create(**kwargs):
+            with guard:
+                estado["em_voo"] += 1
+                estado["max"] = max(estado["max"], estado["em_voo"])
+            time.sleep(0.05)
+            with guard:
+                estado["em_voo"] -= 1
+            msg = mock.Mock(content='{"NOME": "JOAO", "SOBRENOME": "", "MODELO": "", "COR": ""}')
+            return mock.Mock(choices=[mock.Mock(message=msg)])
+
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = create
+        with tempfile.TemporaryDirectory() as td:
+            _saves, entrada, saida = self._processar_em_lote(td, 6, client=fake_client, LLM_MAX_IN_FLIGHT=3)
+        self.assertEqual(fake_client.chat.completions.create.call_count, 6)
+        self.assertGreater(estado["max"], 1)
+        self.assertLessEqual(estado["max"], 3)
+        self.assertTrue(all(r["processado"] for r in entrada))
+        self.assertEqual([r["_entrada_id"] for r in saida], [1, 2, 3, 4, 5, 6])
+
+    def test_processar_fast_path_pula_llm_com_alta_confianca(self):
+        msg = mock.Mock(content='{"NOME": "X", "SOBRENOME": "Y", "MODELO": "", "COR": ""}')
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = mock.Mock(choices=[mock.Mock(message=msg)])
+        textos = ["JOAO SILVA GOL PRATA ABC1234 BLOCO 3 AP 102", "fulano bl3 ap10"]
+        with tempfile.TemporaryDirectory() as td, \
+             mock.patch.dict(ia._FAST_PATH_STATS, {"avaliados": 0, "bypass": 0}):
+            _saves, _entrada, saida = self._processar_em_lote(td, 2, client=fake_client, textos=textos, FAST_PATH_ENABLED=True)
+            metricas = ia.fast_path_metrics()
+        self.assertEqual(fake_client.chat.completions.create.call_count, 1)
+        self.assertEqual((saida[0]["NOME"], saida[0]["SOBRENOME"], saida[0]["MODELO"]), ("JOÃO", "SILVA", "GOL"))
+        self.assertIn(saida[1]["NOME"], ("X", "Y"))  # veio do LLM
+        self.assertEqual(metricas, {"avaliados": 2, "bypass": 1, "taxa_bypass": 0.5})
+
+    def test_respond_query_corta_base_grande_para_caber_no_tpm(self):
+        regs = [{"ID": i, "NOME": f"MORADOR {i}", "OBS": "x" * 80} for i in range(1, 3001)]
+        msg = mock.Mock(content="ok")
+        inner = mock.Mock()
+        inner.chat.completions.create.return_value = mock.Mock(choices=[mock.Mock(message=msg)], usage=None)
+        client = ia.llm_client.RateLimitedClient(inner, limits={"m": {"rpm": 30, "tpm": 6000}}, max_wait=0.0)
+        with mock.patch.object(ia, "carregar", return_value={"registros": regs}), \
+             mock.patch.object(ia, "client", client), mock.patch.object(ia, "IN_IA_MODE", True):
+            self.assertEqual(ia.respond_query("quem chegou por último?", db_path="outro.json", model="m"), "ok")
+        enviado = inner.chat.completions.create.call_args.kwargs["messages"][0]["content"]
+        self.assertLessEqual(len(enviado), ia.llm_client.max_prompt_chars("m", limits={"m": {"tpm": 6000}}))
+        self.assertIn("MORADOR 3000", enviado)
+        self.assertNotIn('"MORADOR 1"', enviado)
+        self.assertIn("registros mais antigos omitidos", enviado)
+
+    def test_extrair_json_seguro_aceita_lista(self):
+        texto = '```json\n[{"ENTRADA_ID": "1", "NOME": "A"}, {"ENTRADA_ID": "2", "NOME": "B"}]\n```'
+        self.assertEqual([d["NOME"] for d in ia.extrair_json_seguro(texto, aceitar_lista=True)], ["A", "B"])
+        # sem aceitar_lista mantém o contrato antigo (último objeto)
+        self.assertEqual(ia.extrair_json_seguro(texto), {"ENTRADA_ID": "2", "NOME": "B"})
+        self.assertIsNone(ia.extrair_json_seguro("[{quebrado", aceitar_lista=True))
+
+    def test_processar_lote_refaz_registro_ausente_na_resposta(self):
+        prompts = []
+
+        def create(model, messages, temperature):
+            prompt = messages[0]["content"]
+            prompts.append(prompt)
+            if "array JSON" in prompt:
+                # resposta do lote sem o registro 3
+                conteudo = json.dumps([{"ENTRADA_ID": str(i), "NOME": nome, "SOBRENOME": "", "MODELO": "", "COR": ""} for i, nome in ((1, "ANA"), (2, "BIA"), (4, "DAVI"))])
+            else:
+                conteudo = '{"NOME": "SOLO", "SOBRENOME": "", "MODELO": "", "COR": ""}'
+            return mock.Mock(choices=[mock.Mock(message=mock.Mock(content=conteudo))])
+
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = create
+        textos = ["ana", "bia", "caio", "davi"]
+        with tempfile.TemporaryDirectory() as td:
+            _saves, entrada, saida = self._processar_em_lote(td, 4, client=fake_client, textos=textos, LLM_BATCH_SIZE=4)
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("[3] caio", prompts[0])
+        self.assertEqual([r["NOME"] for r in saida], ["ANA", "BIA", "SOLO", "DAVI"])
+        self.assertTrue(all(r["processado"] for r in entrada))
+
+    def test_pipeline_worker_coalesce_gatilhos_e_refaz_quando_lock_ocupado(self):
+        liberar = threading.Event()
+        chamadas = []
+
+        def fake_processar(agendar_retry=True):
+            chamadas.append(agendar_retry)
+            if len(chamadas) == 1:
+                liberar.wait(2)
+                return True
+            return len(chamadas) != 2  # 2ª execução: lock com outro processo
+
+        worker = ia.PipelineWorker(retry_delay=0.01)
+        with mock.patch.object(ia, "processar", side_effect=fake_processar), \
+             mock.patch.object(ia, "is_chat_mode_active", return_value=False):
+            worker.enqueue(1, "teste")
+            deadline = time.monotonic() + 2
+            while not chamadas and time.monotonic() < deadline:
+                time.sleep(0.005)
+            for eid in (2, 3, 4):
+                worker.enqueue(eid, "teste")
+            liberar.set()
+            deadline = time.monotonic() + 2
+            while len(chamadas) < 3 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            worker.stop()
+
+        # 1ª execução + uma para os 3 gatilhos acumulados + o retry após o lock ocupado
+        self.assertEqual(chamadas, [False, False, False])
+        m = worker.metrics()
+        self.assertEqual((m["enfileirados"], m["coalescidos"], m["retries"]), (4, 2, 1))
+
 
 if __name__ == "__main__":
     unittest.main()
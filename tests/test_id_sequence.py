@@ -0,0 +1,119 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import avisos
+import ia
+import id_sequence
+import interfaceone
+import record_store
+
+
+def _alocar_varios(data_path, n):
+    # roda em outro processo: store próprio, só o arquivo e o lock em comum
+    return [id_sequence.allocate(data_path) for _ in range(n)]
+
+
+class IdSequenceTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.data = os.path.join(self.td.name, "dadosend.json")
+
+    def tearDown(self):
+        id_sequence._STORES.clear()
+        self.td.cleanup()
+
+    def test_semeia_uma_vez_e_sobrevive_a_reinicio(self):
+        calls = []
+
+        def seed():
+            calls.append(1)
+            return 41
+
+        self.assertEqual(id_sequence.allocate(self.data, seed=seed), 42)
+        self.assertEqual(id_sequence.allocate(self.data, seed=seed), 43)
+        self.assertEqual(len(calls), 1)
+
+        id_sequence._STORES.clear()  # simula reinício do processo
+        self.assertEqual(id_sequence.allocate(self.data, seed=seed), 44)
+        self.assertEqual(len(calls), 1)
+        with open(os.path.join(self.td.name, id_sequence.SEQUENCES_FILENAME), "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["sequencias"]["dadosend.json"], 44)
+
+    def test_floor_evita_ficar_atras_de_escrita_externa(self):
+        id_sequence.allocate(self.data, seed=1)
+        self.assertEqual(id_sequence.allocate(self.data, floor=10), 11)
+
+    def test_threads_nunca_recebem_o_mesmo_id(self):
+        got = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(25):
+                v = id_sequence.allocate(self.data)
+                with lock:
+                    got.append(v)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(got), list(range(1, 101)))
+
+    def test_processos_nunca_recebem_o_mesmo_id(self):
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(3) as pool:
+            got = pool.starmap(_alocar_varios, [(self.data, 20)] * 3)
+        self.assertEqual(sorted(v for lote in got for v in lote), list(range(1, 61)))
+
+    def test_next_aviso_id_usa_sequencia_do_arquivo_de_avisos(self):
+        out = os.path.join(self.td.name, "avisos.json")
+        existing = [{"id_aviso": "AVISO-000007"}, {"id_aviso": "lixo"}]
+        self.assertEqual(avisos._next_aviso_id(existing, out), "AVISO-000008")
+        self.assertEqual(avisos._next_aviso_id(existing, out), "AVISO-000009")
+        self.assertEqual(avisos._next_aviso_id(existing), "AVISO-000008")
+
+    def test_reserva_bloco_e_falha_de_gravacao_nao_entrega_id(self):
+        self.assertEqual(list(id_sequence.reserve(self.data, 3, seed=10)), [11, 12, 13])
+        self.assertEqual(id_sequence.allocate(self.data), 14)
+        store = id_sequence.store_for(self.data)
+        with mock.patch.object(store, "_write", side_effect=OSError("disco cheio")):
+            with self.assertRaises(OSError):
+                id_sequence.allocate(self.data)
+        self.assertEqual(id_sequence.allocate(self.data), 15)
+
+    def test_build_avisos_reserva_ids_uma_vez(self):
+        analises = os.path.join(self.td.name, "analises.json")
+        out = os.path.join(self.td.name, "avisos.json")
+        regs = [{"ID": i, "NOME": "ANA", "MORADOR SEM TAG": True, "DATA_HORA": f"01/03/2026 10:0{i}:00"} for i in (1, 2, 3)]
+        with open(analises, "w", encoding="utf-8") as f:
+            json.dump({"registros": [{"identidade": "ANA|A|1", "registros": regs}]}, f)
+        with mock.patch.object(id_sequence, "reserve", wraps=id_sequence.reserve) as reserve:
+            doc = avisos.build_avisos(analises, out)
+        self.assertEqual(reserve.call_count, 1)
+        novos = [a for a in doc["registros"] if a["tipo"] == "MORADOR_SEM_TAG"]
+        self.assertEqual([a["id_aviso"] for a in novos], ["AVISO-000001", "AVISO-000002", "AVISO-000003"])
+        self.assertEqual(doc["ultimo_aviso_ativo"], doc["registros"][-1]["id_aviso"])
+
+    def test_contador_velho_nao_reemite_ids_de_entrada_e_encomendas(self):
+        init = os.path.join(self.td.name, "encomendasinit.json")
+        saida = os.path.join(self.td.name, "encomendasend.json")
+        record_store.save_document(init, {"registros": [{"id": 7, "texto": "A"}, {"id": 9, "texto": "B"}]})
+        record_store.save_document(saida, {"registros": [{"ID": 40, "NOME": "ANA"}]})
+        # contador deixado por um teste/restauração abaixo do maior ID real
+        id_sequence.reserve(init, 2, seed=0)
+        id_sequence.reserve(saida, 3, seed=0)
+
+        self.assertEqual(record_store.max_record_id(init), 9)
+        self.assertEqual(interfaceone._compute_next_in_id(None, init), 10)
+        with mock.patch.object(ia, "ENCOMENDAS_SAIDA", saida):
+            self.assertEqual(ia._next_encomenda_id([]), 41)
+
+
+if __name__ == "__main__":
+    unittest.main()
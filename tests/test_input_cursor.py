@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import input_cursor
+import record_archive
+import record_store
+
+
+def _regs(n, processados=(), mes="03/2026"):
+    return [
+        {"id": i, "texto": f"T{i}", "processado": i in processados, "data_hora": f"01/{mes} 10:00:00"}
+        for i in range(1, n + 1)
+    ]
+
+
+class InputCursorTests(unittest.TestCase):
+    def test_cursor_pula_prefixo_e_guarda_lacunas(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "dadosinit.json")
+            regs = _regs(5)
+            self.assertEqual([r["id"] for r in input_cursor.pendentes(path, regs)], [1, 2, 3, 4, 5])
+
+            for r in regs:
+                r["processado"] = r["id"] != 3
+            self.assertEqual(input_cursor.avancar(path, regs), {"ultimo_id": 5, "lacunas": [3]})
+            with open(os.path.join(td, input_cursor.CURSOR_FILENAME), encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["cursores"]["dadosinit.json"]["lacunas"], [3])
+
+            regs.append({"id": 6, "texto": "T6", "processado": False})
+            # o 2 perdeu a flag fora das lacunas: o cursor não volta a olhar o prefixo
+            regs[1]["processado"] = False
+            self.assertEqual([r["id"] for r in input_cursor.pendentes(path, regs)], [3, 6])
+
+            with mock.patch.object(input_cursor, "CURSOR_ENABLED", False):
+                self.assertEqual([r["id"] for r in input_cursor.pendentes(path, regs)], [2, 3, 6])
+
+    @mock.patch.object(record_archive, "ARCHIVE_ENABLED", True)
+    def test_compactar_arquiva_prefixo_ate_a_primeira_lacuna(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "dadosinit.json")
+            regs = _regs(8, processados={1, 2, 3, 4, 6, 7, 8})
+            record_store.save_document(path, {"registros": regs})
+            input_cursor.avancar(path, regs)
+
+            self.assertEqual(input_cursor.compactar(path, min_registros=5), 0)
+            self.assertEqual(input_cursor.compactar(path, min_registros=4), 4)
+            quente = record_store.load_document(path)["registros"]
+            self.assertEqual([r["id"] for r in quente], [5, 6, 7, 8])
+            completo = record_store.load_document(path, include_archive=True)["registros"]
+            self.assertEqual([r["id"] for r in completo], list(range(1, 9)))
+
+    @mock.patch.object(record_archive, "ARCHIVE_ENABLED", True)
+    def test_compactar_mantem_ultimo_registro(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "encomendasinit.json")
+            regs = _regs(3, processados={1, 2, 3})
+            record_store.save_document(path, {"registros": regs})
+            input_cursor.avancar(path, regs)
+            self.assertEqual(input_cursor.compactar(path, min_registros=1), 2)
+            self.assertEqual([r["id"] for r in record_store.load_document(path)["registros"]], [3])
+            self.assertEqual(input_cursor.pendentes(path, record_store.load_document(path)["registros"]), [])
+
+    def test_compactar_nao_roda_sem_opt_in_do_historico(self):
+        with tempfile.TemporaryDirectory() as td, mock.patch.object(record_archive, "ARCHIVE_ENABLED", False):
+            path = os.path.join(td, "dadosinit.json")
+            regs = _regs(4, processados={1, 2, 3, 4})
+            record_store.save_document(path, {"registros": regs})
+            input_cursor.avancar(path, regs)
+            self.assertEqual(input_cursor.compactar(path, min_registros=1), 0)
+            self.assertEqual(len(record_store.load_document(path)["registros"]), 4)
+            self.assertFalse(os.path.exists(record_archive.archive_dir(path)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import ia
+import llm_cache
+
+
+class LLMCacheTests(unittest.TestCase):
+    def test_chave_normaliza_texto_e_muda_com_prompt_e_modelo(self):
+        v1 = llm_cache.prompt_version("prompt A")
+        k = llm_cache.make_key(v1, "joao  silva gol", "m1")
+        self.assertEqual(k, llm_cache.make_key(v1, " JOAO SILVA  GOL ", "m1"))
+        self.assertNotEqual(k, llm_cache.make_key(llm_cache.prompt_version("prompt B"), "joao silva gol", "m1"))
+        self.assertNotEqual(k, llm_cache.make_key(v1, "joao silva gol", "m2"))
+
+    def test_lru_ttl_e_persistencia(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "llm_cache.json")
+            c = llm_cache.LLMCache(path, max_entries=2, ttl_seconds=60)
+            c.put("a", {"NOME": "A"})
+            c.put("b", {"NOME": "B"})
+            self.assertEqual(c.get("a"), {"NOME": "A"})  # "a" vira o mais recente
+            c.put("c", {"NOME": "C"})
+            self.assertIsNone(c.get("b"))
+            self.assertEqual(c.metrics()["removidos_lru"], 1)
+            self.assertTrue(c.flush())
+
+            reaberto = llm_cache.LLMCache(path, max_entries=2, ttl_seconds=60)
+            self.assertEqual(reaberto.get("c"), {"NOME": "C"})
+            with mock.patch.object(llm_cache.time, "time", return_value=llm_cache.time.time() + 120):
+                self.assertIsNone(reaberto.get("a"))
+            self.assertEqual(reaberto.metrics()["expirados"], 1)
+
+    def test_put_so_marca_sujo_e_flush_grava_uma_vez(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "llm_cache.json")
+            c = llm_cache.LLMCache(path, flush_interval_s=3600)
+            with mock.patch.object(llm_cache.persistence_writer, "submit") as m_submit:
+                for i in range(50):
+                    c.put(f"k{i}", {"NOME": str(i)})
+                m_submit.assert_not_called()
+                self.assertTrue(c.flush())
+                self.assertFalse(c.flush())
+            self.assertEqual(m_submit.call_count, 1)
+            self.assertEqual(len(m_submit.call_args[0][1]["entradas"]), 50)
+
+            # intervalo vencido: o próprio put grava
+            c = llm_cache.LLMCache(path, flush_interval_s=0)
+            c.put("x", {"NOME": "X"})
+            self.assertEqual(llm_cache.LLMCache(path).get("x"), {"NOME": "X"})
+
+    def test_limite_em_bytes_remove_lru_e_recusa_resposta_gigante(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "llm_cache.json")
+            um = llm_cache._entry_bytes("a", {"criado": llm_cache.time.time(), "resposta": {"NOME": "X" * 100}})
+            c = llm_cache.LLMCache(path, max_entries=100, max_bytes=2 * um + 40)
+            for k in ("a", "b", "c"):
+                c.put(k, {"NOME": "X" * 100})
+            self.assertIsNone(c.get("a"))
+            self.assertIsNotNone(c.get("c"))
+            c.put("d", {"NOME": "X" * 10_000})
+            self.assertIsNone(c.get("d"))
+            m = c.metrics()
+            self.assertEqual((m["entradas"], m["removidos_lru"], m["grandes_demais"]), (2, 1, 1))
+            self.assertLessEqual(m["bytes"], c.max_bytes)
+            c.flush()
+            self.assertLessEqual(os.path.getsize(path), c.max_bytes + 64)
+
+    def test_call_llm_acerto_nao_chama_cliente(self):
+        with tempfile.TemporaryDirectory() as td:
+            c = llm_cache.LLMCache(os.path.join(td, "llm_cache.json"))
+            msg = mock.Mock(content='{"NOME": "joao", "SOBRENOME": "silva", "MODELO": "", "COR": ""}')
+            fake_client = mock.Mock()
+            fake_client.chat.completions.create.return_value = mock.Mock(choices=[mock.Mock(message=msg)])
+            ctx = {"registro": {"id": 1}, "entrada_id": 1, "texto_limpo": "JOAO SILVA", "prompt": "p",
+                   "prompt_versao": llm_cache.prompt_version("p")}
+            with mock.patch.object(llm_cache, "CACHE_ENABLED", True), \
+                 mock.patch.object(llm_cache, "cache", return_value=c), \
+                 mock.patch.object(ia, "client", fake_client):
+                primeiro = ia._call_llm(ctx)
+                segundo = ia._call_llm(dict(ctx, texto_limpo="joao  silva"))
+            self.assertEqual(primeiro, segundo)
+            self.assertEqual(segundo["NOME"], "JOAO")
+            self.assertEqual(fake_client.chat.completions.create.call_count, 1)
+            self.assertEqual(c.metrics()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+import llm_client
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = mock.Mock(status_code=status_code, headers=headers or {})
+
+
+def _client(inner, clock, **limits):
+    return llm_client.RateLimitedClient(
+        inner,
+        limits={"m": {"rpm": limits.get("rpm", 60), "tpm": limits.get("tpm", 6000)}},
+        max_wait=limits.get("max_wait", 30.0),
+        max_retries=3,
+        sleep=clock.sleep,
+        clock=clock,
+    )
+
+
+class LLMClientTests(unittest.TestCase):
+    def test_enfileira_quando_rpm_esgota_e_recusa_pedido_maior_que_tpm(self):
+        clock = _Clock()
+        inner = mock.Mock()
+        c = _client(inner, clock, rpm=2, tpm=6000, max_wait=60.0)
+        for _ in range(3):
+            c.chat.completions.create(model="m", messages=[{"role": "user", "content": "oi"}], max_tokens=10)
+        self.assertEqual(inner.chat.completions.create.call_count, 3)
+        # a 3ª requisição esperou a reposição do bucket (2 rpm = 1 a cada 30 s)
+        self.assertAlmostEqual(clock.now, 30.0, delta=0.5)
+        m = c.metrics()["m"]
+        self.assertEqual(m["enfileiradas"], 1)
+        self.assertGreater(m["espera_ms"], 29000)
+
+        with self.assertRaises(llm_client.LLMRateLimitError) as ctx:
+            c.chat.completions.create(model="m", messages=[{"role": "user", "content": "x" * 40000}])
+        self.assertIn("413", str(ctx.exception))
+        self.assertIsInstance(ctx.exception, llm_client.LLMRequestTooLargeError)
+        self.assertEqual(c.metrics()["m"]["recusas"], 1)
+
+    def test_recusa_quando_espera_passa_do_limite(self):
+        clock = _Clock()
+        c = _client(mock.Mock(), clock, rpm=1, max_wait=5.0)
+        c.chat.completions.create(model="m", messages=[])
+        with self.assertRaises(llm_client.LLMRateLimitError) as ctx:
+            c.chat.completions.create(model="m", messages=[])
+        self.assertIn("429", str(ctx.exception))
+
+    def test_backoff_em_429_respeita_retry_after_e_nao_refaz_401(self):
+        clock = _Clock()
+        inner = mock.Mock()
+        ok = mock.Mock(usage=mock.Mock(total_tokens=50))
+        inner.chat.completions.create.side_effect = [_HTTPError(429, {"retry-after": "2"}), _HTTPError(503), ok]
+        c = _client(inner, clock)
+        self.assertIs(c.chat.completions.create(model="m", messages=[]), ok)
+        self.assertEqual(clock.sleeps[0], 2.0)
+        self.assertLessEqual(clock.sleeps[1], llm_client.BACKOFF_BASE_SECONDS * 2)
+        self.assertEqual(c.metrics()["m"]["retries"], 2)
+        self.assertEqual(c.metrics()["m"]["tokens_reais"], 50)
+
+        inner.chat.completions.create.side_effect = [_HTTPError(401)]
+        with self.assertRaises(_HTTPError):
+            c.chat.completions.create(model="m", messages=[])
+        self.assertEqual(c.metrics()["m"]["erros"], 1)
+
+    def test_tentativa_que_falha_devolve_os_tokens_estimados(self):
+        clock = _Clock()
+        inner = mock.Mock()
+        ok = mock.Mock(usage=None)
+        inner.chat.completions.create.side_effect = [_HTTPError(503), _HTTPError(503), ok]
+        c = _client(inner, clock, tpm=1000)
+        msg = [{"role": "user", "content": "x" * 2000}]  # ~500 + 256 tokens
+        self.assertIs(c.chat.completions.create(model="m", messages=msg), ok)
+        # sem devolução a 2ª tentativa já teria de esperar o bucket encher
+        self.assertEqual(c.metrics()["m"]["enfileiradas"], 0)
+        self.assertAlmostEqual(c.metrics()["m"]["saldo_tokens"], 1000 - 756, delta=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import avisos
+import persistence_writer
+
+
+class PersistenceWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "avisos.json")
+        self.writes = []
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def _record(self, path, obj):
+        self.writes.append((path, obj))
+
+    def test_sem_thread_grava_na_hora(self):
+        w = persistence_writer.PersistenceWriter()
+        w.submit(self.path, {"v": 1}, self._record)
+        self.assertEqual(self.writes, [(self.path, {"v": 1})])
+
+    def test_coalesce_snapshots_e_flush_sincrono_grava_so_o_ultimo(self):
+        w = persistence_writer.PersistenceWriter(interval_ms=60000)
+        w._thread = mock.Mock(is_alive=mock.Mock(return_value=True))
+        for v in range(5):
+            w.submit(self.path, {"v": v}, self._record)
+        self.assertEqual(w.pending_snapshot(self.path), {"v": 4})
+        self.assertEqual(self.writes, [])
+
+        self.assertEqual(w.flush(), 1)
+        self.assertEqual(self.writes, [(self.path, {"v": 4})])
+        self.assertEqual(w.stats["coalescidos"], 4)
+        self.assertIsNone(w.pending_snapshot(self.path))
+
+    def test_thread_grava_em_segundo_plano_e_leitura_ve_pendente(self):
+        w = persistence_writer.PersistenceWriter(interval_ms=10)
+        with mock.patch.object(persistence_writer, "_WRITER", w):
+            w.start()
+            try:
+                with w._io_lock:
+                    avisos.atomic_save(self.path, {"registros": [{"id": 1}]})
+                    # ainda não gravado: leitura devolve o snapshot pendente
+                    self.assertFalse(os.path.exists(self.path))
+                    self.assertEqual(avisos._read_json(self.path), {"registros": [{"id": 1}]})
+                deadline = time.monotonic() + 2
+                while not os.path.exists(self.path) and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(os.path.exists(self.path))
+            finally:
+                w.stop()
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"registros": [{"id": 1}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
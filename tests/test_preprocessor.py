@@ -1,7 +1,12 @@
+import json
+import re
 import unittest
+from pathlib import Path
 
 import preprocessor
 
+CASOS_PATH = Path(__file__).resolve().parent / "regression" / "data" / "v1" / "preprocessor_cases.json"
+
 
 class PreprocessorModuleTests(unittest.TestCase):
     def test_tokens_and_status_detection(self):
@@ -12,6 +17,16 @@ class PreprocessorModuleTests(unittest.TestCase):
         status, _ = preprocessor.detectar_status(txt)
         self.assertTrue(isinstance(status, str))
 
+    def test_status_varredura_unica(self):
+        self.assertEqual(
+            preprocessor.detectar_status("PRESTADOR DE SERVIÇO maria bloco2"),
+            ("PRESTADOR DE SERVIÇO", "maria bloco2"),
+        )
+        # "mor" de "mor-10" sai do texto, mas não é o token de status
+        self.assertEqual(preprocessor.detectar_status("mor-10 visitante"), ("VISITANTE", "-10"))
+        self.assertEqual(preprocessor.detectar_status("P.S carlos"), ("PRESTADOR DE SERVIÇO", "carlos"))
+        self.assertEqual(preprocessor.detectar_status("joao silva"), ("DESCONHECIDO", "joao silva"))
+
     def test_remover_status_and_extract(self):
         txt = "JOAO SILVA BL A AP 101 ABC1234 ONIX PRETO MORADOR NAO ATENDIDO"
         cleaned = preprocessor.remover_status(txt)
@@ -21,6 +36,68 @@ class PreprocessorModuleTests(unittest.TestCase):
         for k in ("NOME_RAW", "PLACA", "BLOCO", "APARTAMENTO", "MODELOS", "STATUS"):
             self.assertIn(k, data)
 
+    def test_indice_de_modelos_equivale_a_varrer_o_mapa(self):
+        def referencia(texto):
+            s = texto.upper()
+            for key, abrevs in preprocessor.VEICULOS_MAP.items():
+                for variante in [key, *abrevs]:
+                    if re.search(rf"\b{re.escape(variante.upper())}\b", s):
+                        return key
+            return None
+
+        casos = [
+            "JOAO ONIX LT PRETO", "HILUX S 10 PRATA", "S-10 BRANCA", "VISITANTE COR AZUL",
+            "UP BRANCO", "CARRO SEM MODELO", "GOL-POLO", "XS-10", "", "onix plus",
+        ]
+        for texto in casos:
+            self.assertEqual(preprocessor.detectar_modelo_canonico(texto), referencia(texto), texto)
+        self.assertEqual(preprocessor.modelos_da_variante("onx"), ("ONIX",))
+        self.assertEqual(preprocessor.modelos_da_variante("XYZ"), ())
+        self.assertEqual(preprocessor._map_to_canonical_model("jeta"), "JETTA")
+
+    def test_etiquetas_dos_tokens(self):
+        self.assertEqual(
+            preprocessor.etiquetar_tokens("Maria BL-3 AP 22 jeta preto feu3c84 visitante"),
+            [("Maria", "NOME"), ("BL-3", "BLOCO"), ("AP", "APARTAMENTO"), ("22", "OUTRO"),
+             ("jeta", "MODELO"), ("preto", "COR"), ("feu3c84", "PLACA"), ("visitante", "STATUS")],
+        )
+        # BLOCO2 também casa com o padrão de placa: a etiqueta é BLOCO, mas a placa continua valendo
+        data = preprocessor.extrair_tudo_consumo("maria bloco2 apto 33")
+        self.assertEqual((data["PLACA"], data["BLOCO"], data["NOME_RAW"]), ("BLOCO2", "2", "MARIA"))
+
+    def test_extracao_confere_com_amostra_de_referencia(self):
+        with open(CASOS_PATH, encoding="utf-8") as f:
+            casos = json.load(f)["casos"]
+        self.assertGreater(len(casos), 400)
+        for caso in casos:
+            self.assertEqual(preprocessor.extrair_tudo_consumo(caso["texto"]), caso["esperado"], caso["texto"])
+
+    def test_lote_entrega_em_ordem_igual_ao_um_a_um(self):
+        with open(CASOS_PATH, encoding="utf-8") as f:
+            textos = [c["texto"] for c in json.load(f)["casos"]]
+        esperado = [preprocessor.extrair_tudo_consumo(t) for t in textos]
+
+        stats = {}
+        self.assertEqual(list(preprocessor.extrair_tudo_consumo_many(iter(textos), stats=stats)), esperado)
+        self.assertEqual((stats["textos"], stats["modo"]), (len(textos), "sequencial"))
+
+        # poucos textos não abrem o pool
+        stats = {}
+        self.assertEqual(list(preprocessor.extrair_tudo_consumo_many(textos[:3], workers=2, stats=stats)), esperado[:3])
+        self.assertEqual(stats["modo"], "sequencial")
+
+        stats = {}
+        saida = preprocessor.extrair_tudo_consumo_many(textos, workers=2, chunksize=50, min_paralelo=100, stats=stats)
+        self.assertEqual(list(saida), esperado)
+        self.assertEqual((stats["textos"], stats["modo"], stats["workers"]), (len(textos), "processos", 2))
+
+        # parar no meio ainda registra a vazão do que saiu
+        stats = {}
+        gen = preprocessor.extrair_tudo_consumo_many(textos, stats=stats)
+        self.assertEqual([next(gen) for _ in range(5)], esperado[:5])
+        gen.close()
+        self.assertEqual(stats["textos"], 5)
+
 
 if __name__ == "__main__":
     unittest.main()
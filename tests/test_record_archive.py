@@ -0,0 +1,75 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import ia
+import record_archive
+import record_index
+import record_store
+
+
+class RecordArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "dadosend.json")
+        self.regs = [
+            {"ID": 1, "_entrada_id": 1, "NOME": "ANA", "DATA_HORA": "10/11/2025 08:00:00"},
+            {"ID": 2, "_entrada_id": 2, "NOME": "BRUNO", "DATA_HORA": "05/12/2025 09:00:00"},
+            {"ID": 3, "_entrada_id": 3, "NOME": "CARLA", "DATA_HORA": "20/01/2026 10:00:00"},
+            {"ID": 4, "_entrada_id": 4, "NOME": "DANI", "DATA_HORA": "02/02/2026 11:00:00"},
+            {"ID": 5, "_entrada_id": 5, "NOME": "SEM DATA"},
+        ]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": self.regs}, f)
+        self.now = datetime(2026, 2, 15, 12, 0, 0)
+
+    def tearDown(self):
+        record_index._INDEXES.clear()
+        record_archive._CHECKED_MONTH.clear()
+        self.td.cleanup()
+
+    def test_meses_fechados_viram_segmentos_e_arquivo_quente_encolhe(self):
+        moved = record_archive.archive_closed_months(self.path, now=self.now, keep_months=2)
+        self.assertEqual(moved, 2)
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            hot = json.load(f)["registros"]
+        self.assertEqual([r["ID"] for r in hot], [3, 4, 5])
+
+        manifest = record_archive.read_manifest(self.path)
+        self.assertEqual([s["mes"] for s in manifest["segmentos"]], ["2025-11", "2025-12"])
+        seg = os.path.join(record_archive.archive_dir(self.path), manifest["segmentos"][0]["arquivo"])
+        with open(seg, "rb") as f:
+            self.assertEqual(json.loads(gzip.decompress(f.read()))[0]["NOME"], "ANA")
+
+        full = record_store.load_document(self.path, include_archive=True)["registros"]
+        self.assertEqual([r["ID"] for r in full], [1, 2, 3, 4, 5])
+        self.assertEqual(len(ia.carregar(self.path, include_archive=True)["registros"]), 5)
+
+    def test_rearquivar_mesmos_registros_nao_duplica_segmento(self):
+        record_archive.archive_closed_months(self.path, now=self.now, keep_months=2)
+        # simula queda antes de regravar o arquivo quente: os registros voltam a aparecer
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": self.regs}, f)
+        record_archive.archive_closed_months(self.path, now=self.now, keep_months=2)
+
+        manifest = record_archive.read_manifest(self.path)
+        self.assertEqual(len(manifest["segmentos"]), 2)
+        self.assertEqual(len(record_archive.load_archived(self.path)), 2)
+
+    def test_maybe_archive_respeita_opt_in_e_roda_uma_vez_por_mes(self):
+        self.assertEqual(record_archive.maybe_archive(self.path, now=self.now), 0)
+        with mock.patch.object(record_archive, "ARCHIVE_ENABLED", True), \
+             mock.patch.object(record_archive, "KEEP_MONTHS", 1):
+            self.assertEqual(record_archive.maybe_archive(self.path, now=self.now), 3)
+            with mock.patch.object(record_archive, "archive_closed_months") as m_archive:
+                record_archive.maybe_archive(self.path, now=self.now)
+            m_archive.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
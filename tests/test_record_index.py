@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import ia
+import interfaceone
+import record_index
+
+
+class RecordIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "dadosend.json")
+        self._write([
+            {"ID": 3, "_entrada_id": 7, "NOME": "ANA", "BLOCO": "1", "APARTAMENTO": "10"},
+            {"ID": 5, "_entrada_id": 8, "NOME": "BRUNO", "BLOCO": "2", "APARTAMENTO": "20"},
+        ])
+
+    def tearDown(self):
+        record_index._INDEXES.clear()
+        self.td.cleanup()
+
+    def _write(self, regs):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": regs}, f)
+
+    def test_consultas_e_atualizacao_no_lugar(self):
+        idx = record_index.index_for(self.path)
+        idx.refresh()
+        self.assertEqual(idx.find_by_entrada_id(8)["NOME"], "BRUNO")
+        self.assertEqual(idx.next_id(), 6)
+        self.assertEqual(idx.person_id("ANA|1|10", interfaceone._identity_key), 3)
+
+        idx.add({"ID": 9, "_entrada_id": 11, "NOME": "CARLA", "BLOCO": "3", "APARTAMENTO": "30"})
+        self.assertEqual(idx.find_by_entrada_id("11")["ID"], 9)
+        self.assertEqual(idx.person_id("CARLA|3|30", interfaceone._identity_key), 9)
+        self.assertEqual(idx.next_id(), 10)
+
+    def test_assinatura_invalida_indice_quando_arquivo_muda_por_fora(self):
+        idx = record_index.index_for(self.path)
+        first = idx.refresh()
+        self.assertIs(idx.refresh(), first)
+
+        self._write([{"ID": 40, "_entrada_id": 1}])
+        regs = idx.refresh()
+        self.assertEqual(len(regs), 1)
+        self.assertIsNone(idx.find_by_entrada_id(7))
+        self.assertEqual(idx.next_id(), 41)
+
+    def test_ia_merge_por_entrada_id_usa_indice(self):
+        with mock.patch.object(ia, "SAIDA", self.path):
+            ia.append_or_update_saida({"COR": "PRATA"}, entrada_id=7)
+            ia.append_or_update_saida({"NOME": "DANI"}, entrada_id=99)
+        with open(self.path, "r", encoding="utf-8") as f:
+            regs = json.load(f)["registros"]
+        self.assertEqual(regs[0]["COR"], "PRATA")
+        self.assertEqual(regs[2]["ID"], 6)
+        self.assertEqual(regs[2]["_entrada_id"], 99)
+
+    def test_interfaceone_reaproveita_id_da_identidade(self):
+        with mock.patch.object(interfaceone, "DB_FILE", self.path), \
+             mock.patch.object(interfaceone, "_DB_LOCKFILE", self.path + ".lock"), \
+             mock.patch.object(interfaceone, "sync_suggestions", return_value=None):
+            self.assertTrue(interfaceone.append_record_to_db({"NOME": "ANA", "BLOCO": "1", "APARTAMENTO": "10"}))
+            self.assertTrue(interfaceone.append_record_to_db({"NOME": "EVA", "BLOCO": "4", "APARTAMENTO": "40"}))
+        with open(self.path, "r", encoding="utf-8") as f:
+            regs = json.load(f)["registros"]
+        self.assertEqual([r["ID"] for r in regs], [3, 5, 3, 6])
+
+
+if __name__ == "__main__":
+    unittest.main()
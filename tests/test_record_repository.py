@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import analises
+import ia
+import record_repository
+import record_store
+
+
+class RecordRepositoryTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.dadosend = os.path.join(self.td.name, "dadosend.json")
+        with open(self.dadosend, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "registros": [
+                        {"ID": 1, "_entrada_id": 1, "NOME": "ANA", "SOBRENOME": "SILVA", "BLOCO": "1", "APARTAMENTO": "10", "DATA_HORA": "01/02/2026 10:00:00"},
+                        {"ID": 2, "_entrada_id": 2, "NOME": "BRUNO", "SOBRENOME": "LIMA", "BLOCO": "2", "APARTAMENTO": "20", "DATA_HORA": "02/02/2026 10:00:00"},
+                    ]
+                },
+                f,
+            )
+        self.backend = mock.patch.object(record_repository, "BACKEND", "sqlite")
+        self.backend.start()
+        self.repo = record_repository.repository_for(self.dadosend)
+
+    def tearDown(self):
+        self.backend.stop()
+        self.repo.close()
+        record_repository._REPOS.clear()
+        self.td.cleanup()
+
+    def test_importa_json_existente_e_consulta_por_indices(self):
+        doc = record_store.load_document(self.dadosend)
+        self.assertEqual([r["ID"] for r in doc["registros"]], [1, 2])
+        self.assertEqual(self.repo.get_by_entrada_id(self.dadosend, 2)["NOME"], "BRUNO")
+        self.assertEqual(len(self.repo.find_by_identity(self.dadosend, "ana|silva|1|10")), 1)
+        self.assertEqual(self.repo.get_by_id(self.dadosend, 1)[0]["NOME"], "ANA")
+        self.assertEqual(self.repo.latest(self.dadosend)["ID"], 2)
+        self.assertTrue(os.path.exists(os.path.join(self.td.name, record_repository.DB_FILENAME)))
+
+    def test_recent_records_consulta_so_as_ultimas_linhas(self):
+        record_store.append_record(self.dadosend, {"ID": 3, "_entrada_id": 3, "NOME": "CARLA"})
+        with mock.patch.object(self.repo, "load_document", side_effect=AssertionError("carga completa")):
+            self.assertEqual([r["ID"] for r in record_store.recent_records(self.dadosend, 2)], [2, 3])
+            self.assertEqual(record_store.recent_records(self.dadosend, 0), [])
+
+    def test_save_text_anexa_entrada_sem_ler_nem_regravar_dadosinit(self):
+        import interfaceone
+
+        dadosinit = os.path.join(self.td.name, "dadosinit.json")
+        record_store.save_document(dadosinit, {"registros": [{"id": 5, "texto": "A", "processado": True}]})
+        with mock.patch.object(interfaceone, "_read_json", side_effect=AssertionError("leitura completa")), \
+             mock.patch.object(record_store, "save_document", side_effect=AssertionError("regravação")), \
+             mock.patch.object(interfaceone.id_sequence, "store_for",
+                               return_value=interfaceone.id_sequence.SequenceStore(os.path.join(self.td.name, "seq.json"))):
+            nid = interfaceone._compute_next_in_id(None, dadosinit)
+            interfaceone._append_input_record(dadosinit, {"id": nid, "texto": "B", "processado": False})
+        self.assertEqual(nid, 6)
+        self.assertEqual([r["id"] for r in record_store.load_document(dadosinit)["registros"]], [5, 6])
+
+    def test_diagnostico_e_startup_do_main_leem_o_repositorio(self):
+        import main
+        import runtime_status
+
+        dadosinit = os.path.join(self.td.name, "dadosinit.json")
+        with open(dadosinit, "w", encoding="utf-8") as f:
+            json.dump({"registros": [{"id": 3, "processado": True}]}, f)
+        fp0 = main._file_fingerprint(self.dadosend)
+        record_store.append_record(self.dadosend, {"ID": 3, "_entrada_id": 3, "NOME": "CARLA"})
+        # o JSON ficou parado; só a revisão do repositório mudou
+        self.assertNotEqual(main._file_fingerprint(self.dadosend), fp0)
+        self.assertEqual(main._file_fingerprint(self.dadosend), str(record_store.change_token(self.dadosend)))
+        self.assertEqual(runtime_status.detectar_conflitos_dados(self.td.name)["processed_without_saida"], [])
+
+        analises_path = os.path.join(self.td.name, "analises.json")
+        with mock.patch.object(main.json, "dump", side_effect=AssertionError("JSON direto")):
+            main.ensure_file(analises_path, {"registros": []})
+        self.assertFalse(os.path.exists(analises_path))
+        self.assertEqual(record_store.load_document(analises_path), {"registros": []})
+
+    def test_upsert_e_append_incrementam_revisao_sem_reescrever_json(self):
+        with open(self.dadosend, "rb") as f:
+            before = f.read()
+        rev0 = record_store.change_token(self.dadosend)
+        record_store.upsert_record(self.dadosend, {"ID": 2, "_entrada_id": 2, "NOME": "BRUNO", "COR": "PRATA"})
+        record_store.append_record(self.dadosend, {"ID": 3, "_entrada_id": 3, "NOME": "CARLA"})
+
+        regs = record_store.load_document(self.dadosend)["registros"]
+        self.assertEqual([r["ID"] for r in regs], [1, 2, 3])
+        self.assertEqual(regs[1]["COR"], "PRATA")
+        self.assertEqual(self.repo.max_id(self.dadosend), 3)
+        self.assertEqual(record_store.change_token(self.dadosend), rev0 + 2)
+        with open(self.dadosend, "rb") as f:
+            self.assertEqual(f.read(), before)
+
+    def test_modulos_leem_e_gravam_pelo_repositorio(self):
+        analises_path = os.path.join(self.td.name, "analises.json")
+        with mock.patch.object(ia, "SAIDA", self.dadosend), \
+             mock.patch.object(analises, "ENCOMENDASEND", os.path.join(self.td.name, "encomendasend.json")):
+            ia.append_or_update_saida({"NOME": "ANA", "SOBRENOME": "SILVA", "BLOCO": "1", "APARTAMENTO": "10"}, entrada_id=9)
+            analises.build_analises(self.dadosend, analises_path)
+
+        self.assertFalse(os.path.exists(analises_path))
+        out = record_store.load_document(analises_path)
+        grupo = [e for e in out["registros"] if e.get("identidade") == "ANA|SILVA|1|10"]
+        self.assertEqual(len(grupo), 1)
+        self.assertEqual(len(grupo[0]["registros"]), 2)
+        self.assertIn("encomendas_multiplas_bloco_apartamento", out)
+
+
+if __name__ == "__main__":
+    unittest.main()
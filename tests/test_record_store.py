@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import ia
+import record_store
+
+
+class RecordStoreJournalTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "dadosend.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": [{"ID": 1, "_entrada_id": 10, "NOME": "ANA"}]}, f)
+        record_store._SEQ.clear()
+
+    def tearDown(self):
+        record_store._SEQ.clear()
+        self.td.cleanup()
+
+    def test_append_nao_reescreve_snapshot_e_leitura_reconstroi_estado(self):
+        with open(self.path, "rb") as f:
+            before = f.read()
+        self.assertTrue(record_store.append_record(self.path, {"ID": 2, "NOME": "BRUNO"}))
+        self.assertTrue(record_store.upsert_record(self.path, {"ID": 1, "_entrada_id": 10, "NOME": "ANA", "COR": "PRETO"}))
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), before)
+        doc = record_store.load_document(self.path)
+        regs = doc["registros"]
+        self.assertEqual([r["ID"] for r in regs], [1, 2])
+        self.assertEqual(regs[0]["COR"], "PRETO")
+
+    def test_compactacao_incorpora_journal_sem_duplicar_apos_queda(self):
+        record_store.append_record(self.path, {"ID": 2})
+        journal = record_store.journal_path(self.path)
+        with open(journal, "r", encoding="utf-8") as f:
+            journal_raw = f.read()
+
+        self.assertTrue(record_store.compact(self.path))
+        self.assertFalse(os.path.exists(journal))
+
+        # simula queda entre gravar o snapshot e remover o journal
+        with open(journal, "w", encoding="utf-8") as f:
+            f.write(journal_raw)
+        regs = record_store.load_document(self.path)["registros"]
+        self.assertEqual([r["ID"] for r in regs], [1, 2])
+
+    def test_linha_parcial_no_journal_e_ignorada(self):
+        record_store.append_record(self.path, {"ID": 2})
+        with open(record_store.journal_path(self.path), "a", encoding="utf-8") as f:
+            f.write('{"seq": 9, "op": "app')
+        regs = record_store.load_document(self.path)["registros"]
+        self.assertEqual(len(regs), 2)
+
+    def test_compactacao_automatica_por_tamanho(self):
+        with mock.patch.object(record_store, "JOURNAL_COMPACT_BYTES", 1):
+            record_store.append_record(self.path, {"ID": 2})
+        self.assertFalse(os.path.exists(record_store.journal_path(self.path)))
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["registros"]), 2)
+
+    def test_ia_append_or_update_saida_em_modo_journal(self):
+        with mock.patch.object(ia, "SAIDA", self.path), \
+             mock.patch.object(record_store, "JOURNAL_ENABLED", True):
+            ia.append_or_update_saida({"NOME": "CARLA", "BLOCO": "1", "APARTAMENTO": "2"}, entrada_id=11)
+            ia.append_or_update_saida({"MODELO": "GOL"}, entrada_id=11)
+            regs = ia._load_saida()
+
+        self.assertTrue(os.path.exists(record_store.journal_path(self.path)))
+        self.assertEqual(len(regs), 2)
+        self.assertEqual(regs[1]["ID"], 2)
+        self.assertEqual(regs[1]["MODELO"], "GOL")
+
+    def test_apply_batch_grava_varias_operacoes_numa_escrita(self):
+        with mock.patch.object(record_store.os, "fsync") as m_fsync:
+            ok = record_store.apply_batch(self.path, [
+                ("append", {"ID": 2, "_entrada_id": 2}),
+                ("append", {"ID": 3, "_entrada_id": 3}),
+                ("upsert", {"ID": 2, "_entrada_id": 2, "COR": "AZUL"}),
+            ])
+        self.assertTrue(ok)
+        self.assertEqual(m_fsync.call_count, 1)
+        regs = record_store.load_document(self.path)["registros"]
+        self.assertEqual([r["ID"] for r in regs], [1, 2, 3])
+        self.assertEqual(regs[1]["COR"], "AZUL")
+
+    def test_leitores_dos_modulos_aplicam_journal_e_so_o_parse_tolerante_difere(self):
+        import analises
+        import avisos
+        import interfacetwo
+
+        self.assertTrue(record_store.append_record(self.path, {"ID": 2, "NOME": "BRUNO"}))
+        for leitor in (avisos._read_json, analises._read_json, interfacetwo._read_json_flexible):
+            self.assertEqual([r["ID"] for r in leitor(self.path)["registros"]], [1, 2], leitor.__module__)
+
+        # BOM: o parse estrito falha e cada módulo cai no seu fallback, ainda com o journal
+        with open(self.path, "w", encoding="utf-8-sig") as f:
+            json.dump({"registros": [{"ID": 1}]}, f)
+        self.assertEqual([r["ID"] for r in interfacetwo._read_json_flexible(self.path)["registros"]], [1, 2])
+        self.assertEqual([r["ID"] for r in avisos._read_json(self.path)["registros"]], [2])
+        with self.assertRaises(json.JSONDecodeError):
+            record_store.load_document(self.path)
+
+        os.remove(self.path)
+        os.remove(record_store.journal_path(self.path))
+        self.assertIsNone(avisos._read_json(self.path))
+        self.assertIsNone(analises._read_json(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import interfaceone
+import main
+import record_store
+import record_tail
+
+
+class RecordTailTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "dadosend.json")
+
+    def tearDown(self):
+        self.td.cleanup()
+
+    def test_snapshot_mantem_ponteiro_e_leitura_nao_carrega_arquivo(self):
+        record_store.save_document(self.path, {"registros": [
+            {"ID": 1, "NOME": "ANA", "BLOCO": "A", "APARTAMENTO": "1"},
+            {"ID": 7, "NOME": "BRUNO", "BLOCO": "B", "APARTAMENTO": "2"},
+            {"ID": 3, "NOME": "CARLA", "BLOCO": "C", "APARTAMENTO": "3"},
+        ]})
+        self.assertTrue(os.path.exists(record_tail.tail_path(self.path)))
+        with mock.patch.object(record_store, "load_document", side_effect=AssertionError("varreu")):
+            self.assertEqual(main._get_last_record_identity(self.path), "BRUNO||B|2")
+            self.assertEqual([r["ID"] for r in record_store.recent_records(self.path, 2)], [7, 3])
+
+    def test_journal_atualiza_ponteiro_incrementalmente(self):
+        record_store.save_document(self.path, {"registros": [{"ID": 1, "_entrada_id": 1, "NOME": "ANA"}]})
+        with mock.patch.object(record_store, "JOURNAL_ENABLED", True):
+            record_store.append_record(self.path, {"ID": 2, "_entrada_id": 2, "NOME": "BRUNO"})
+            record_store.upsert_record(self.path, {"ID": 2, "_entrada_id": 2, "NOME": "BRUNO", "SOBRENOME": "LIMA"})
+            with mock.patch.object(record_store, "load_document", side_effect=AssertionError("varreu")):
+                last = record_store.latest_record(self.path)
+        self.assertEqual(last["SOBRENOME"], "LIMA")
+
+    def test_escrita_externa_invalida_ponteiro_e_reconstroi(self):
+        record_store.save_document(self.path, {"registros": [{"ID": 1, "NOME": "ANA"}]})
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": [
+                {"NOME": "SEM ID", "DATA_HORA": "01/01/2026 10:00:00"},
+                {"NOME": "MAIS NOVO", "DATA_HORA": "02/01/2026 09:00:00"},
+                {"NOME": "ANTIGO", "DATA_HORA": "31/12/2025 23:00:00"},
+            ]}, f)
+        self.assertEqual(interfaceone._get_last_record_identity(self.path), "MAIS NOVO|||")
+        data = record_tail.read_valid(self.path, record_tail.signature(self.path, record_store.journal_path(self.path)))
+        self.assertEqual(data["ultimo"]["NOME"], "MAIS NOVO")
+
+
+if __name__ == "__main__":
+    unittest.main()
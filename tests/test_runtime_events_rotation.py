@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import runtime_status
+
+
+def _write_events(path, timestamps):
+    with open(path, "a", encoding="utf-8") as f:
+        for i, ts in enumerate(timestamps):
+            f.write(json.dumps({"timestamp": ts, "action": "t", "status": "OK", "stage": "s", "details": {"i": i}}) + "\n")
+
+
+class RuntimeEventsRotationTests(unittest.TestCase):
+    def setUp(self):
+        self._orig = (runtime_status.EVENTS_FILE, runtime_status.LAST_STATUS_FILE)
+        self.td = tempfile.TemporaryDirectory()
+        self.events = os.path.join(self.td.name, "events.jsonl")
+        runtime_status.EVENTS_FILE = self.events
+        runtime_status.LAST_STATUS_FILE = os.path.join(self.td.name, "last.json")
+
+    def tearDown(self):
+        runtime_status.EVENTS_FILE, runtime_status.LAST_STATUS_FILE = self._orig
+        self.td.cleanup()
+
+    def test_rotacao_por_tamanho_preserva_leitura_completa(self):
+        with mock.patch.object(runtime_status, "ROTATE_ENABLED", True), \
+                mock.patch.object(runtime_status, "SEGMENT_MAX_BYTES", 1024):
+            for i in range(60):
+                runtime_status.report_status("rot", "OK", stage="loop", details={"i": i})
+
+        with open(runtime_status.index_path(self.events), "r", encoding="utf-8") as f:
+            segs = json.load(f)["segmentos"]
+        self.assertGreaterEqual(len(segs), 2)
+        self.assertTrue(all(s["eventos"] > 0 and s["marcos"] for s in segs))
+
+        evs = runtime_status.read_runtime_events(self.events)
+        self.assertEqual([e["details"]["i"] for e in evs], list(range(60)))
+
+    def test_rotacao_por_dia_e_leitura_por_janela(self):
+        _write_events(self.events, ["2026-03-01 10:00:00", "2026-03-01 23:59:59"])
+        with mock.patch.object(runtime_status, "_now_iso", return_value="2026-03-02 08:00:00"):
+            runtime_status.report_status("rot", "OK", stage="novo_dia")
+
+        segs = runtime_status._load_index(self.events)
+        self.assertEqual(len(segs), 1)
+        self.assertEqual((segs[0]["inicio"], segs[0]["fim"]), ("2026-03-01 10:00:00", "2026-03-01 23:59:59"))
+
+        hoje = runtime_status.read_runtime_events(self.events, since="2026-03-02", until="2026-03-02")
+        self.assertEqual([e["stage"] for e in hoje], ["novo_dia"])
+        ontem = runtime_status.read_runtime_events(self.events, until="2026-03-01")
+        self.assertEqual(len(ontem), 2)
+        self.assertEqual(len(runtime_status.read_runtime_events(self.events)), 3)
+
+        # segmento fora da janela nem é aberto
+        real_open = open
+        abertos = []
+
+        def _spy(path, *args, **kwargs):
+            abertos.append(os.path.basename(str(path)))
+            return real_open(path, *args, **kwargs)
+
+        with mock.patch("builtins.open", side_effect=_spy):
+            runtime_status.read_runtime_events(self.events, since="2026-03-02 00:00:00")
+        self.assertNotIn(segs[0]["arquivo"], abertos)
+
+    def test_segmento_orfao_entra_no_indice(self):
+        _write_events(self.events, ["2026-03-01 10:00:00"])
+        entry = runtime_status.rotate_events(self.events)
+        self.assertIsNotNone(entry)
+        os.remove(runtime_status.index_path(self.events))
+        _write_events(os.path.join(self.td.name, "events.20260101-000000.jsonl"), ["2026-01-01 00:00:00"])
+
+        segs = runtime_status._load_index(self.events)
+        self.assertEqual([s["inicio"] for s in segs], ["2026-01-01 00:00:00", "2026-03-01 10:00:00"])
+        self.assertTrue(os.path.exists(runtime_status.index_path(self.events)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import analises
+import record_store
+import snapshot_cache
+
+
+class SnapshotCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.td = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.td.name, "dadosend.json")
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": [{"ID": 1, "NOME": "ANA"}, {"ID": 2, "NOME": "BRUNO"}]}, f)
+        self.enabled = mock.patch.object(snapshot_cache, "CACHE_ENABLED", True)
+        self.enabled.start()
+
+    def tearDown(self):
+        self.enabled.stop()
+        self.td.cleanup()
+
+    def test_cache_fresco_evita_parse_do_json(self):
+        self.assertTrue(snapshot_cache.rebuild(self.path))
+        self.assertTrue(snapshot_cache.is_fresh(self.path, kind=dict))
+        with mock.patch.object(record_store.json, "load", side_effect=AssertionError("parse")), \
+             mock.patch.object(analises.json, "loads", side_effect=AssertionError("parse")):
+            self.assertEqual(len(record_store.load_document(self.path)["registros"]), 2)
+            self.assertEqual(analises._read_json(self.path)["registros"][1]["NOME"], "BRUNO")
+
+    def test_escrita_atualiza_o_cache_sem_novo_parse(self):
+        novo = {"registros": [{"ID": 9, "NOME": "CARLA"}]}
+        analises._write_document(self.path, novo)
+        self.assertTrue(snapshot_cache.is_fresh(self.path, kind=dict))
+        record_store.save_document(self.path, {"registros": novo["registros"] + [{"ID": 10}]})
+        with mock.patch.object(record_store.json, "load", side_effect=AssertionError("parse")):
+            self.assertEqual([r["ID"] for r in record_store.load_document(self.path)["registros"]], [9, 10])
+
+    def test_arquivo_tocado_cai_no_parse_que_regrava_o_cache(self):
+        snapshot_cache.rebuild(self.path)
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+        self.assertIsNone(snapshot_cache.load(self.path))
+        self.assertEqual(len(record_store.load_document(self.path)["registros"]), 2)
+        self.assertTrue(snapshot_cache.is_fresh(self.path))
+
+    def test_store_com_stat_antigo_nao_grava(self):
+        st = os.stat(self.path)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"registros": []}, f)
+        self.assertFalse(snapshot_cache.store(self.path, {"registros": [{"ID": 1}]}, st))
+        self.assertIsNone(snapshot_cache.load(self.path))
+
+    def test_falha_ao_gravar_cache_vai_para_report_status(self):
+        with mock.patch.object(snapshot_cache, "_write", side_effect=OSError("disco cheio")), \
+             mock.patch.object(snapshot_cache, "report_status") as m_status:
+            self.assertFalse(snapshot_cache.rebuild(self.path))
+        m_status.assert_called_once()
+        self.assertEqual(m_status.call_args[1]["stage"], "store_failed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,8 @@ import os
 import tempfile
 import unittest
 
+import record_archive
+import record_store
 import runtime_status
 
 
@@ -68,6 +70,17 @@ class TelemetryAnalysisTests(unittest.TestCase):
             rel = runtime_status.gerar_relatorio_diagnostico_diario(td, events)
             self.assertIn("suggestions", rel)
 
+    def test_conflitos_consideram_historico_arquivado(self):
+        with tempfile.TemporaryDirectory() as td:
+            entrada = os.path.join(td, "dadosinit.json")
+            saida = os.path.join(td, "dadosend.json")
+            record_store.save_document(entrada, {"registros": [{"id": 2, "processado": True}]})
+            record_store.save_document(saida, {"registros": []})
+            # a saída do registro 2 já foi para o histórico
+            record_archive.archive_records(saida, [{"_entrada_id": 2, "data_hora": "01/01/2026 10:00:00"}])
+            conflitos = runtime_status.detectar_conflitos_dados(td)
+            self.assertEqual(conflitos["processed_without_saida"], [])
+
 
 if __name__ == "__main__":
     unittest.main()
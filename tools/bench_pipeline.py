@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Benchmark do pipeline save_text -> ia.processar -> dadosend com o Groq falso.
+
+Roda tudo num diretório temporário (nada toca os JSON reais): cada texto entra
+por ``interfaceone.save_text`` como na portaria, o worker do ia processa com
+``tools/fake_groq.FakeGroq`` no lugar do cliente real e o tempo de cada
+registro vai do início do save_text até o group commit que grava a saída da IA
+no dadosend. Reporta registros/s, p50/p95/máximo de latência ponta a ponta e
+as métricas do cliente falso (e do ``llm_client`` com ``--rate-limited``).
+
+Exemplo::
+
+    python tools/bench_pipeline.py --records 200 --latency lognormal:300:0.4 \\
+        --in-flight 4 --batch 5 --errors 429=0.03
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+if str(ROOT / "tools") not in sys.path:
+    sys.path.insert(0, str(ROOT / "tools"))
+
+NOMES = ["JOAO SILVA", "MARIA SOUZA", "ANA LIMA", "PEDRO COSTA", "CARLOS ALVES", "JULIA ROCHA", "LUCAS MENDES", "BRUNO DIAS"]
+MODELOS = ["GOL", "ONIX", "HB20", "CIVIC", "COROLLA", "KWID", "SANDERO", "JETTA"]
+CORES = ["PRETO", "BRANCO", "PRATA", "VERMELHO", "CINZA", "AZUL"]
+STATUS = ["VISITANTE", "MORADOR", "PRESTADOR", ""]
+
+
+def gerar_textos(n: int, seed: int = 7) -> list[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        placa = "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(3)) + str(rng.randint(1000, 9999))
+        partes = [
+            rng.choice(STATUS),
+            rng.choice(NOMES),
+            f"BL{rng.randint(1, 12)}",
+            f"AP{rng.randint(101, 408)}",
+            rng.choice(MODELOS),
+            rng.choice(CORES),
+            placa,
+        ]
+        out.append(" ".join(p for p in partes if p))
+    return out
+
+
+class _Entry:
+    def __init__(self, text):
+        self._text = text
+
+    def get(self):
+        return self._text
+
+    def delete(self, *_args, **_kwargs):
+        self._text = ""
+
+    def after(self, _ms, fn):
+        fn()
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    arr = sorted(valores)
+    idx = int(max(0, min(len(arr) - 1, round(p * (len(arr) - 1)))))
+    return arr[idx]
+
+
+def run_benchmark(args) -> dict:
+    import fake_groq
+    import ia
+    import interfaceone
+    import llm_client
+    import runtime_status
+
+    fake = fake_groq.FakeGroq(
+        latency=args.latency,
+        errors=fake_groq.parse_errors(args.errors),
+        seed=args.seed,
+        timeout_s=args.timeout_s,
+    )
+    client = llm_client.wrap(fake) if args.rate_limited else fake
+    textos = gerar_textos(args.records, args.seed)
+
+    inicio: dict = {}
+    fim: dict = {}
+    guard = threading.Lock()
+    todos = threading.Event()
+    atual = {"t0": 0.0}
+
+    real_start = interfaceone._start_ia_pipeline
+    real_commit = ia._commit_saida_batch
+
+    def start_spy(source, entrada_id=None):
+        with guard:
+            inicio[entrada_id] = atual["t0"]
+        return real_start(source, entrada_id=entrada_id)
+
+    def commit_spy(pending):
+        ids = [eid for _r, _d, eid in pending]
+        marcados = real_commit(pending)
+        if marcados:
+            agora = time.perf_counter()
+            with guard:
+                for eid in ids:
+                    fim.setdefault(eid, agora)
+                if len(fim) >= args.records:
+                    todos.set()
+        return marcados
+
+    with tempfile.TemporaryDirectory() as td, ExitStack() as stack:
+        arquivos = {
+            "dadosinit.json": None, "dadosend.json": None, "encomendasinit.json": None,
+            "encomendasend.json": None, "fila_revisao.json": None,
+        }
+        for nome in arquivos:
+            arquivos[nome] = os.path.join(td, nome)
+            with open(arquivos[nome], "w", encoding="utf-8") as f:
+                json.dump({"registros": []}, f)
+        stack.enter_context(mock.patch.multiple(
+            runtime_status,
+            EVENTS_FILE=os.path.join(td, "runtime_events.jsonl"),
+            LAST_STATUS_FILE=os.path.join(td, "runtime_last_status.json"),
+        ))
+        worker = ia.PipelineWorker()
+
+        stack.enter_context(mock.patch.multiple(
+            interfaceone,
+            IN_FILE=arquivos["dadosinit.json"],
+            DB_FILE=arquivos["dadosend.json"],
+            ENCOMENDAS_IN_FILE=arquivos["encomendasinit.json"],
+            ENCOMENDAS_DB_FILE=arquivos["encomendasend.json"],
+            REVIEW_QUEUE_FILE=arquivos["fila_revisao.json"],
+            _DB_LOCKFILE=arquivos["dadosend.json"] + ".lock",
+            HAS_IA_MODULE=True,
+            ia_module=ia,
+            _start_ia_pipeline=start_spy,
+            classificar_destino_texto=lambda *_a, **_k: {"destino": "dados", "score": 2.0, "ambiguo": False},
+            sync_suggestions=lambda *a, **k: None,
+        ))
+        stack.enter_context(mock.patch.multiple(
+            ia,
+            ENTRADA=arquivos["dadosinit.json"],
+            SAIDA=arquivos["dadosend.json"],
+            ENCOMENDAS_ENTRADA=arquivos["encomendasinit.json"],
+            ENCOMENDAS_SAIDA=arquivos["encomendasend.json"],
+            LOCK_FILE=os.path.join(td, "process.lock"),
+            client=client,
+            LLM_MAX_IN_FLIGHT=args.in_flight,
+            LLM_BATCH_SIZE=args.batch,
+            FAST_PATH_ENABLED=args.fast_path,
+            _commit_saida_batch=commit_spy,
+            _PIPELINE_WORKER=worker,
+            log_forense=lambda *a, **k: None,
+        ))
+        stack.enter_context(mock.patch.object(ia, "is_chat_mode_active", return_value=False))
+
+        intervalo = 1.0 / args.rate if args.rate > 0 else 0.0
+        t_bench = time.perf_counter()
+        for i, texto in enumerate(textos):
+            if intervalo:
+                alvo = t_bench + i * intervalo
+                espera = alvo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            atual["t0"] = time.perf_counter()
+            interfaceone.save_text(entry_widget=_Entry(texto))
+        todos.wait(args.deadline_s)
+        t_fim = time.perf_counter()
+        worker.stop()
+
+    latencias_ms = [(fim[eid] - inicio[eid]) * 1000.0 for eid in fim if eid in inicio]
+    ultimo = max(fim.values()) if fim else t_fim
+    duracao = max(1e-9, ultimo - t_bench)
+    return {
+        "registros": args.records,
+        "concluidos": len(latencias_ms),
+        "duracao_s": round(duracao, 3),
+        "registros_por_s": round(len(latencias_ms) / duracao, 2),
+        "latencia_ms": {
+            "p50": round(_percentil(latencias_ms, 0.50), 1),
+            "p95": round(_percentil(latencias_ms, 0.95), 1),
+            "max": round(max(latencias_ms), 1) if latencias_ms else 0.0,
+        },
+        "config": {
+            "latency": args.latency, "errors": args.errors, "in_flight": args.in_flight,
+            "batch": args.batch, "fast_path": args.fast_path, "rate": args.rate,
+            "rate_limited": args.rate_limited,
+        },
+        "fake_groq": fake.stats,
+        "llm_client": llm_client.metrics(client),
+        "fast_path": ia.fast_path_metrics() if args.fast_path else {},
+        "worker": worker.metrics(),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do pipeline com Groq falso.")
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=0.0, help="chegadas por segundo (0 = o mais rápido possível)")
+    parser.add_argument("--latency", default="lognormal:250:0.4")
+    parser.add_argument("--errors", default="", help='ex.: "429=0.05,timeout=0.01"')
+    parser.add_argument("--timeout-s", type=float, default=2.0)
+    parser.add_argument("--in-flight", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--fast-path", action="store_true")
+    parser.add_argument("--rate-limited", action="store_true", help="passa o fake pelo llm_client (RPM/TPM + backoff)")
+    parser.add_argument("--deadline-s", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json-out", default="")
+    args = parser.parse_args(argv)
+
+    out = run_benchmark(args)
+    text = json.dumps(out, ensure_ascii=False, indent=2)
+    print(text)
+    if args.json_out:
+        Path(args.json_out).write_text(text + "\n", encoding="utf-8")
+    return 0 if out["concluidos"] == out["registros"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Micro-benchmark do preprocessor sobre o corpus ``combinacoes.txt``.
+
+``--modo fuzzy`` (padrão) coleta os candidatos que ``extrair_tudo_consumo``
+realmente manda para ``_map_to_canonical_model`` e compara, candidato a
+candidato, a varredura linear antiga (``_edit_distance`` contra toda chave e
+abreviação de VEICULOS_MAP) com o índice de deleções (``fuzzy_index``):
+tempo por consulta, speedup e divergências (deve ser zero).
+
+``--modo lote`` mede a vazão (textos/s) de ``extrair_tudo_consumo`` um a um
+contra ``extrair_tudo_consumo_many`` no processo atual e, com ``--workers`` > 1,
+no pool de processos; as saídas do lote precisam ser iguais às do um a um.
+
+Exemplos::
+
+    python tools/bench_preprocessor.py --limite 5000
+    python tools/bench_preprocessor.py --modo lote --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import preprocessor as P  # noqa: E402
+
+
+def carregar_corpus(path: Path, limite: int = 0) -> List[str]:
+    linhas = [ln.strip() for ln in path.read_text(encoding="utf-8").splitlines() if ln.strip()]
+    return linhas[:limite] if limite > 0 else linhas
+
+
+def _linear_fuzzy(cand_norm: str) -> Optional[str]:
+    """Etapa de distância de edição como era antes do índice (referência do benchmark)."""
+    best_key = None
+    best_dist = None
+    for vn, key in P._MODELO_NORMAIS_TODOS:
+        d = P._edit_distance(cand_norm, vn)
+        if best_dist is None or d < best_dist:
+            best_dist = d; best_key = key
+    return best_key if best_dist is not None and best_dist <= 1 else None
+
+
+def _indexed_fuzzy(cand_norm: str) -> Optional[str]:
+    hit = P._MODELO_FUZZY.nearest(cand_norm, 1)
+    return hit[2] if hit is not None else None
+
+
+def coletar_candidatos(textos: List[str]) -> List[str]:
+    """Candidatos (normalizados) que chegam à etapa fuzzy de ``_map_to_canonical_model``."""
+    vistos: List[str] = []
+    original = P._map_to_canonical_model
+
+    def espiao(candidate):
+        cand_norm = P._normalize_token(candidate)
+        if cand_norm and cand_norm not in P._MODELO_POR_NORMAL and not any(
+            cand_norm in kn or kn in cand_norm for kn, _key in P._MODELO_NORMAIS_CHAVE
+        ):
+            vistos.append(cand_norm)
+        return original(candidate)
+
+    P._map_to_canonical_model = espiao
+    try:
+        for t in textos:
+            P.extrair_tudo_consumo(t)
+    finally:
+        P._map_to_canonical_model = original
+    return vistos
+
+
+def _cronometrar(fn, entradas: List[str]):
+    t0 = time.perf_counter()
+    saidas = [fn(x) for x in entradas]
+    return time.perf_counter() - t0, saidas
+
+
+def bench_fuzzy(textos: List[str]) -> dict:
+    candidatos = coletar_candidatos(textos)
+    unicos = list(dict.fromkeys(candidatos))
+    t_lin, out_lin = _cronometrar(_linear_fuzzy, unicos)
+    t_idx, out_idx = _cronometrar(_indexed_fuzzy, unicos)
+    n = max(1, len(unicos))
+    return {
+        "textos": len(textos),
+        "chamadas_fuzzy": len(candidatos),
+        "candidatos_unicos": len(unicos),
+        "vocabulario": len(P._MODELO_FUZZY),
+        "linear_us_por_consulta": round(t_lin / n * 1e6, 1),
+        "indice_us_por_consulta": round(t_idx / n * 1e6, 1),
+        "speedup": round(t_lin / t_idx, 1) if t_idx > 0 else None,
+        "divergencias": sum(1 for a, b in zip(out_lin, out_idx) if a != b),
+    }
+
+
+def bench_lote(textos: List[str], workers: int, chunksize: int) -> dict:
+    t0 = time.perf_counter()
+    referencia = [P.extrair_tudo_consumo(t) for t in textos]
+    dt = time.perf_counter() - t0
+    out = {
+        "textos": len(textos),
+        "um_a_um": {"segundos": round(dt, 3), "textos_por_s": round(len(textos) / dt, 1) if dt > 0 else 0.0},
+    }
+    rodadas = [("lote", 1)] + ([("lote_processos", workers)] if workers > 1 else [])
+    divergencias = 0
+    for nome, n in rodadas:
+        stats: dict = {}
+        saida = list(P.extrair_tudo_consumo_many(textos, workers=n, chunksize=chunksize, min_paralelo=1, stats=stats))
+        divergencias += sum(1 for a, b in zip(referencia, saida) if a != b) + abs(len(referencia) - len(saida))
+        out[nome] = stats
+    out["divergencias"] = divergencias
+    return out
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmark do preprocessor em combinacoes.txt.")
+    parser.add_argument("--corpus", default=str(ROOT / "combinacoes.txt"))
+    parser.add_argument("--limite", type=int, default=0, help="usa só as N primeiras linhas (0 = todas)")
+    parser.add_argument("--modo", choices=("fuzzy", "lote"), default="fuzzy")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos do modo lote")
+    parser.add_argument("--chunksize", type=int, default=500, help="textos por bloco enviado ao pool")
+    args = parser.parse_args(argv)
+
+    textos = carregar_corpus(Path(args.corpus), args.limite)
+    if args.modo == "lote":
+        out = bench_lote(textos, args.workers, args.chunksize)
+    else:
+        out = bench_fuzzy(textos)
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    return 0 if not out.get("divergencias") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Substituto local do Groq para benchmarks e testes de carga sem a API real.
+
+Dois modos:
+
+- em processo: ``FakeGroq(...)`` tem a mesma interface usada pelo projeto
+  (``client.chat.completions.create(...)``) e pode ir direto em ``ia.client``;
+- servidor HTTP: ``python tools/fake_groq.py serve --port 8765`` responde em
+  ``POST /openai/v1/chat/completions`` no formato da API, para apontar o SDK
+  real com ``Groq(base_url="http://127.0.0.1:8765")``.
+
+Latência configurável (``fixed:MS``, ``uniform:MIN_MS:MAX_MS``,
+``normal:MEDIA_MS:DESVIO_MS``, ``lognormal:MEDIANA_MS:SIGMA``), injeção de
+erros por probabilidade (``401``, ``413``, ``429``, ``500``, ``503``,
+``timeout``) e respostas: o padrão gera JSON plausível a partir do próprio
+prompt (objeto para o prompt de registro, array para o prompt em lote, texto
+livre para o chat); ``respostas`` aceita uma lista fixa ou uma função.
+``stream=True`` devolve os pedaços por palavra (SSE no modo servidor).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Union
+
+ERROR_MESSAGES = {
+    "401": "Error code: 401 - invalid_api_key",
+    "413": "Error code: 413 - Request too large: tokens per minute (TPM) limit",
+    "429": "Error code: 429 - rate_limit_exceeded: Rate limit reached",
+    "500": "Error code: 500 - internal_server_error",
+    "503": "Error code: 503 - service unavailable (overloaded)",
+}
+
+
+class FakeAPIError(Exception):
+    """Erro HTTP simulado, com ``status_code`` e ``response.headers`` como o SDK."""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class LatencyModel:
+    """Sorteia latências (segundos) a partir de uma especificação textual."""
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        parts = str(spec or "fixed:0").split(":")
+        self.kind = parts[0].strip().lower()
+        try:
+            self.params = [float(p) for p in parts[1:]]
+        except ValueError:
+            raise ValueError(f"latência inválida: {spec!r}")
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"distribuição desconhecida: {self.kind!r}")
+
+    def sample(self) -> float:
+        p = self.params + [0.0, 0.0]
+        if self.kind == "fixed":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = self.rng.gauss(p[0], p[1])
+        else:
+            ms = p[0] * math.exp(self.rng.gauss(0.0, p[1] or 0.5))
+        return max(0.0, ms) / 1000.0
+
+
+def parse_errors(spec: str) -> Dict[str, float]:
+    """``"429=0.05,timeout=0.01"`` -> ``{"429": 0.05, "timeout": 0.01}``."""
+    out: Dict[str, float] = {}
+    for item in str(spec or "").split(","):
+        if not item.strip():
+            continue
+        key, _, prob = item.partition("=")
+        out[key.strip().lower()] = float(prob or 0)
+    return out
+
+
+_BATCH_LINE = re.compile(r"^\[([^\]]+)\]\s*(.*)$")
+
+
+def _guess_fields(texto: str) -> Dict[str, str]:
+    toks = [t for t in re.findall(r"[A-Za-zÀ-ÿ]+", texto or "") if len(t) > 2]
+    return {
+        "NOME": toks[0].upper() if toks else "-",
+        "SOBRENOME": toks[1].upper() if len(toks) > 1 else "-",
+        "MODELO": "-",
+        "COR": "-",
+    }
+
+
+def default_responder(kwargs: Dict[str, Any]) -> str:
+    """Resposta padrão derivada do prompt (registro, lote ou chat)."""
+    messages = kwargs.get("messages") or []
+    prompt = str((messages[-1] or {}).get("content") if messages else "")
+    if "array JSON" in prompt:
+        itens = []
+        for line in prompt.splitlines():
+            m = _BATCH_LINE.match(line.strip())
+            if m and not m.group(1).lstrip().startswith("{"):
+                itens.append(dict(ENTRADA_ID=m.group(1), **_guess_fields(m.group(2))))
+        return json.dumps(itens, ensure_ascii=False)
+    if "\nTexto:\n" in prompt:
+        texto = prompt.split("\nTexto:\n", 1)[1].split("\n\n", 1)[0]
+        return json.dumps(_guess_fields(texto), ensure_ascii=False)
+    return "Resposta simulada do servidor local.\nEVIDENCIAS_USADAS: nenhuma (fake_groq)."
+
+
+def _stream_chunks(chunk_id: str, model: Any, content: str):
+    """Iterador no formato do ``stream=True`` do SDK: um pedaço por palavra."""
+    for piece in re.findall(r"\S+\s*|\s+", content):
+        delta = SimpleNamespace(role="assistant", content=piece)
+        yield SimpleNamespace(id=chunk_id, model=model, choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+    yield SimpleNamespace(id=chunk_id, model=model, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=None), finish_reason="stop")])
+
+
+Responder = Union[Callable[[Dict[str, Any]], str], List[str], None]
+
+
+class FakeGroq:
+    """Cliente em processo compatível com ``client.chat.completions.create``."""
+
+    def __init__(self, *, latency: str = "fixed:0", errors: Optional[Dict[str, float]] = None,
+                 respostas: Responder = None, seed: Optional[int] = None, timeout_s: float = 0.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.errors = dict(errors or {})
+        self.respostas = respostas
+        self.timeout_s = timeout_s
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._canned_idx = 0
+        self.stats = {"chamadas": 0, "erros": {}, "em_voo": 0, "max_em_voo": 0, "tokens": 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _pick_error(self) -> Optional[str]:
+        roll = self.rng.random()
+        acc = 0.0
+        for kind, prob in self.errors.items():
+            acc += prob
+            if roll < acc:
+                return kind
+        return None
+
+    def _content(self, kwargs: Dict[str, Any]) -> str:
+        if callable(self.respostas):
+            return self.respostas(kwargs)
+        if isinstance(self.respostas, list) and self.respostas:
+            with self._lock:
+                content = self.respostas[self._canned_idx % len(self.respostas)]
+                self._canned_idx += 1
+            return content
+        return default_responder(kwargs)
+
+    def create(self, **kwargs: Any) -> Any:
+        with self._lock:
+            self.stats["chamadas"] += 1
+            self.stats["em_voo"] += 1
+            self.stats["max_em_voo"] = max(self.stats["max_em_voo"], self.stats["em_voo"])
+            error = self._pick_error()
+            delay = self.latency.sample()
+        try:
+            if error == "timeout":
+                self._sleep(self.timeout_s or delay)
+            else:
+                self._sleep(delay)
+            if error:
+                with self._lock:
+                    self.stats["erros"][error] = self.stats["erros"].get(error, 0) + 1
+                if error == "timeout":
+                    raise TimeoutError("Request timed out.")
+                raise FakeAPIError(int(error), ERROR_MESSAGES.get(error, f"Error code: {error}"),
+                                   retry_after=1 if error == "429" else None)
+            content = self._content(kwargs)
+            prompt_chars = sum(len(str(m.get("content") or "")) for m in kwargs.get("messages") or [] if isinstance(m, dict))
+            usage = SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4,
+                                    total_tokens=prompt_chars // 4 + len(content) // 4)
+            with self._lock:
+                self.stats["tokens"] += usage.total_tokens
+            if kwargs.get("stream"):
+                # a latência sorteada vira o tempo até o primeiro pedaço
+                return _stream_chunks(f"fake-{self.stats['chamadas']}", kwargs.get("model"), content)
+            message = SimpleNamespace(role="assistant", content=content)
+            return SimpleNamespace(
+                id=f"fake-{self.stats['chamadas']}",
+                model=kwargs.get("model"),
+                choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                usage=usage,
+            )
+        finally:
+            with self._lock:
+                self.stats["em_voo"] -= 1
+
+
+# ---------------------------------------------------------------- servidor HTTP
+def _make_handler(fake: FakeGroq):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_args):
+            return
+
+        def _send(self, code: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_stream(self, chunks):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.close_connection = True
+            for ch in chunks:
+                c = ch.choices[0]
+                payload = {
+                    "id": ch.id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": ch.model,
+                    "choices": [{"index": 0, "delta": {"content": c.delta.content} if c.delta.content else {}, "finish_reason": c.finish_reason}],
+                }
+                self.wfile.write(b"data: " + json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                kwargs = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": {"message": "invalid json"}})
+                return
+            try:
+                resp = fake.create(**kwargs)
+            except FakeAPIError as e:
+                self._send(e.status_code, {"error": {"message": str(e)}}, dict(e.response.headers))
+                return
+            except TimeoutError:
+                # o cliente já desistiu; fecha a conexão sem resposta
+                self.close_connection = True
+                return
+            if kwargs.get("stream"):
+                self._send_stream(resp)
+                return
+            self._send(200, {
+                "id": resp.id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": resp.model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": resp.choices[0].message.content}, "finish_reason": "stop"}],
+                "usage": vars(resp.usage),
+            })
+
+    return Handler
+
+
+def serve(fake: FakeGroq, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Sobe o servidor numa thread daemon e devolve a instância (``shutdown()`` para parar)."""
+    httpd = ThreadingHTTPServer((host, port), _make_handler(fake))
+    threading.Thread(target=httpd.serve_forever, name="fake-groq", daemon=True).start()
+    return httpd
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Servidor Groq falso para benchmarks locais.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_serve = sub.add_parser("serve", help="sobe o servidor HTTP compatível com /openai/v1/chat/completions")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8765)
+    p_serve.add_argument("--latency", default="lognormal:250:0.4")
+    p_serve.add_argument("--errors", default="", help='ex.: "429=0.05,timeout=0.01"')
+    p_serve.add_argument("--timeout-s", type=float, default=30.0)
+    p_serve.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    fake = FakeGroq(latency=args.latency, errors=parse_errors(args.errors), seed=args.seed, timeout_s=args.timeout_s)
+    httpd = serve(fake, args.host, args.port)
+    print(f"[fake_groq] ouvindo em http://{args.host}:{httpd.server_address[1]} (latência {args.latency})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        httpd.shutdown()
+    print(json.dumps(fake.stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())